@@ -0,0 +1,244 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from distributed_analysis import WORK_QUEUE_DIR, WorkQueue
+from form_analysis import analyze_video, load_pose_model
+from multi_person import analyze_group_video
+from progressive_analysis import analyze_video_progressive
+from stage_profiler import write_trace
+from video_export import export_annotated_video
+from workout_segmentation import analyze_workout_video
+
+
+# ---------- Configuration ----------
+# Overridable per deployment through environment variables.
+
+MAX_WORKERS = int(os.environ.get("TRAINR_ANALYSIS_WORKERS", "2"))
+MAX_PENDING_JOBS = int(os.environ.get("TRAINR_MAX_PENDING_JOBS", "8"))
+JOBS_DIR = os.environ.get("TRAINR_JOBS_DIR", os.path.join(tempfile.gettempdir(), "trainr-jobs"))
+PERSIST_INTERVAL = 1.0  # seconds between progress writes to disk
+FINISHED_JOBS_IN_MEMORY = 64  # older finished records are dropped from memory; get() reloads them from disk
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by submit() when MAX_PENDING_JOBS jobs are already queued or running."""
+
+
+# ---------- Job Manager ----------
+
+class AnalysisJobManager:
+    """
+    Runs video analyses on a bounded thread pool.
+
+    submit() returns a job id immediately; get() returns a snapshot of the job record
+    (status, progress, partial counts, summary). Records are written to JOBS_DIR as
+    JSON so a page reload, a new browser session, or a server restart can pick the job
+    up again by id. Jobs interrupted by a restart are queued again if their video still exists.
+    Each worker thread loads its own model because YOLO predictors are not thread-safe.
+    warm_up() loads one model in the background ahead of the first job.
+    With a work queue directory (TRAINR_WORK_QUEUE), standard single-person analyses are
+    handed to distributed_analysis workers and the thread only waits for their result;
+    profiled jobs stay local, since the profile times this process's pipeline.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_workers=MAX_WORKERS, max_pending=MAX_PENDING_JOBS,
+                 model_loader=load_pose_model, work_queue_dir=WORK_QUEUE_DIR):
+        self.jobs_dir = jobs_dir
+        self.max_pending = max_pending
+        self.model_loader = model_loader
+        self.work_queue = WorkQueue(work_queue_dir) if work_queue_dir else None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._previews = {}
+        self._local = threading.local()
+        self._spare_models = []
+        self._warm_up_thread = None
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._recover()
+
+    def submit(self, video_path, exercise, settings):
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            if active >= self.max_pending:
+                raise JobQueueFull(f"{active} analyses already in progress, try again shortly.")
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                "id": job_id,
+                "exercise": exercise,
+                "video_path": video_path,
+                "settings": dict(settings),
+                "status": "queued",
+                "progress": {"fraction": 0.0},
+                "summary": None,
+                "error": None,
+                "created_at": time.time(),
+                "updated_at": time.time(),
+            }
+            self._jobs[job_id] = job
+            self._persist(job)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def warm_up(self):
+        """Starts loading a model (and the ML imports behind it) in a background thread; idempotent."""
+        with self._lock:
+            if self._warm_up_thread is not None:
+                return
+            self._warm_up_thread = threading.Thread(target=self._load_spare_model, name="analysis-warm-up", daemon=True)
+        self._warm_up_thread.start()
+
+    def _load_spare_model(self):
+        try:
+            model = self.model_loader()
+        except Exception:
+            return  # the first job loads the model itself and reports the error
+        with self._lock:
+            self._spare_models.append(model)
+
+    def _worker_model(self):
+        model = getattr(self._local, "model", None)
+        if model is None:
+            # Adopt the warmed-up model if it is ready; it then belongs to this worker thread only.
+            with self._lock:
+                model = self._spare_models.pop() if self._spare_models else None
+            if model is None:
+                model = self.model_loader()
+            self._local.model = model
+        return model
+
+    def get(self, job_id):
+        """Snapshot of the job record, or None for an unknown id."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._load(job_id)
+                if job is None:
+                    return None
+                self._jobs[job_id] = job
+                self._evict_finished()
+            return json.loads(json.dumps(job))
+
+    def preview(self, job_id):
+        """Latest RGB preview frame of a running job (kept in memory only, dropped when the job ends)."""
+        return self._previews.get(job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            self._persist(job)
+        last_persist = time.time()
+
+        def on_progress(progress, preview):
+            nonlocal last_persist
+            if preview is not None:
+                self._previews[job_id] = preview
+            with self._lock:
+                job["progress"] = progress
+                job["updated_at"] = time.time()
+                if job["updated_at"] - last_persist >= PERSIST_INTERVAL:
+                    self._persist(job)
+                    last_persist = job["updated_at"]
+
+        try:
+            if job["exercise"] == "workout":
+                summary = analyze_workout_video(job["video_path"], job["settings"], self._worker_model(), on_progress)
+            elif job["settings"].get("export_video"):
+                summary = export_annotated_video(job["video_path"], job["exercise"], job["settings"],
+                                                 self._worker_model(), self.export_path(job_id), on_progress)
+            elif job["settings"].get("multi_person"):
+                summary = analyze_group_video(job["video_path"], job["exercise"], job["settings"],
+                                              self._worker_model(), on_progress)
+            elif job["settings"].get("progressive"):
+                summary = analyze_video_progressive(job["video_path"], job["exercise"], job["settings"],
+                                                    self._worker_model(), on_progress)
+            elif self.work_queue is not None and not job["settings"].get("profile"):
+                summary = self.work_queue.run(job_id, job["video_path"], job["exercise"], job["settings"],
+                                              on_progress)
+            else:
+                summary = analyze_video(job["video_path"], job["exercise"], job["settings"],
+                                        self._worker_model(), on_progress, self.seek_index_path(job_id))
+        except Exception as exc:
+            with self._lock:
+                job["status"] = "failed"
+                job["error"] = str(exc)
+                self._persist(job)
+                self._finished(job_id)
+            return
+
+        with self._lock:
+            job["status"] = "done"
+            job["summary"] = summary
+            job["progress"]["fraction"] = 1.0
+            job["finished_at"] = time.time()
+            self._persist(job)
+            self._finished(job_id)
+        if "profile" in summary:
+            write_trace(self.trace_path(job_id), summary["profile"], job_id=job_id,
+                        exercise=job["exercise"], settings=job["settings"], video_fps=summary["fps"])
+
+    def _finished(self, job_id):
+        # Called with self._lock held once a job is done or failed.
+        self._previews.pop(job_id, None)
+        self._evict_finished()
+
+    def _evict_finished(self):
+        # Called with self._lock held; the records stay on disk.
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:-FINISHED_JOBS_IN_MEMORY]:
+            del self._jobs[job_id]
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def export_path(self, job_id):
+        """Annotated MP4 of a job run with settings["export_video"]."""
+        return os.path.join(self.jobs_dir, f"{job_id}.mp4")
+
+    def seek_index_path(self, job_id):
+        """Seek index of the job's video (written by standard analyses, built on demand otherwise)."""
+        return os.path.join(self.jobs_dir, f"{job_id}.seek.npz")
+
+    def trace_path(self, job_id):
+        """Profiling trace of a job run with settings["profile"] (written when the job finishes)."""
+        return os.path.join(self.jobs_dir, f"{job_id}.trace.json")
+
+    def _persist(self, job):
+        job["updated_at"] = time.time()
+        tmp_path = self._path(job["id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def _load(self, job_id):
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _recover(self):
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            job = self._load(name[:-len(".json")])
+            if job is None or job["status"] not in ("queued", "running"):
+                continue
+            if not os.path.exists(job["video_path"]):
+                job["status"] = "failed"
+                job["error"] = "Server restarted and the uploaded video is no longer available."
+                self._persist(job)
+                continue
+            job["status"] = "queued"
+            job["progress"] = {"fraction": 0.0}
+            self._jobs[job["id"]] = job
+            self._persist(job)
+            self._executor.submit(self._run, job["id"])
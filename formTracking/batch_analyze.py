@@ -0,0 +1,219 @@
+"""
+Headless batch analysis: scores a folder (or list) of videos for one exercise without
+Streamlit and writes one JSON result per video plus summary.csv and reps.csv.
+
+    python batch_analyze.py uploads/2024-05-01 --exercise squat --out results/
+    python batch_analyze.py a.mp4 b.mp4 --exercise pushup --flare-threshold 70 --workers 4
+
+Runs are resumable: a video whose result file is already done for the same file size,
+modification time, exercise and settings is skipped, so an interrupted overnight run
+can simply be started again.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from form_analysis import DEFAULT_SETTINGS, EXERCISES, analyze_video, load_pose_model
+
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v", ".webm")
+SUMMARY_FIELDS = ["video", "exercise", "status", "good_count", "bad_count", "total_reps",
+                  "total_time", "good_align_time", "frames_processed", "skipped_time", "error"]
+REP_FIELDS = ["video", "exercise", "rep", "start_frame", "bottom_frame", "end_frame",
+              "start_time", "end_time", "valid", "counted", "metric"]
+
+
+# ---------- Inputs and Results ----------
+
+def find_videos(inputs):
+    """Expands directories (recursively) into their video files; explicit files are kept as given."""
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                videos.extend(os.path.join(root, name) for name in names
+                              if name.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos.append(path)
+    return sorted(dict.fromkeys(os.path.abspath(v) for v in videos))
+
+
+def result_path(out_dir, video_path, exercise):
+    """Per-video result file; the path hash keeps same-named videos from different folders apart."""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    digest = hashlib.sha1(video_path.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(out_dir, "videos", f"{stem}-{digest}.{exercise}.json")
+
+
+def source_info(video_path):
+    stat = os.stat(video_path)
+    return {"path": video_path, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_result(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_up_to_date(result, video_path, exercise, settings):
+    return (
+        result is not None
+        and result.get("status") == "done"
+        and result.get("exercise") == exercise
+        and result.get("settings") == settings
+        and result.get("source") == source_info(video_path)
+    )
+
+
+def is_readable(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return cap.isOpened() and cap.grab()
+    finally:
+        cap.release()
+
+
+def write_result(path, result):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+# ---------- Worker Processes ----------
+
+_worker_model = None
+
+
+def _init_worker(weights):
+    global _worker_model
+    _worker_model = load_pose_model(weights)
+
+
+def analyze_one(video_path, exercise, settings, out_path):
+    """Worker body: analyses one video and writes its result file. Failures are recorded, not raised."""
+    result = {
+        "video": video_path,
+        "exercise": exercise,
+        "settings": settings,
+        "source": source_info(video_path),
+        "started_at": time.time(),
+    }
+    try:
+        if not is_readable(video_path):
+            raise ValueError("could not decode any frames")
+        result["summary"] = analyze_video(video_path, exercise, settings, _worker_model)
+        result["status"] = "done"
+    except Exception as exc:
+        result["status"] = "failed"
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["finished_at"] = time.time()
+    write_result(out_path, result)
+    return result
+
+
+# ---------- Reports ----------
+
+def write_reports(out_dir, results):
+    """summary.csv (one row per video) and reps.csv (one row per rep) for this run's videos."""
+    with open(os.path.join(out_dir, "summary.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            row = dict(result.get("summary") or {})
+            row.update(video=result["video"], exercise=result["exercise"],
+                       status=result["status"], error=result.get("error", ""))
+            writer.writerow(row)
+
+    with open(os.path.join(out_dir, "reps.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REP_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            summary = result.get("summary") or {}
+            fps = summary.get("fps") or 30.0
+            for rep in summary.get("reps", []):
+                row = dict(rep, video=result["video"], exercise=result["exercise"])
+                row["start_time"] = round(rep["start_frame"] / fps, 3)
+                row["end_time"] = round(rep["end_frame"] / fps, 3)
+                writer.writerow(row)
+
+
+# ---------- CLI ----------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Video files and/or directories to scan")
+    parser.add_argument("--exercise", required=True, choices=EXERCISES)
+    parser.add_argument("--out", default="trainr-results", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument("--weights", default="yolov8n-pose.pt")
+    parser.add_argument("--flare-threshold", type=int, default=DEFAULT_SETTINGS["flare_threshold"])
+    parser.add_argument("--depth-threshold", type=int, default=DEFAULT_SETTINGS["depth_threshold"])
+    parser.add_argument("--align-threshold", type=int, default=DEFAULT_SETTINGS["align_threshold"])
+    parser.add_argument("--stride-scale", type=int, default=DEFAULT_SETTINGS["stride_scale"])
+    parser.add_argument("--roi-tracking", action="store_true", help="Track the person and infer on a crop")
+    parser.add_argument("--no-skip-idle", action="store_true", help="Run inference on idle stretches too")
+    parser.add_argument("--profile", action="store_true", help="Record per-stage timings in each result")
+    parser.add_argument("--force", action="store_true", help="Re-analyse videos that already have results")
+    args = parser.parse_args()
+
+    settings = {
+        "flare_threshold": args.flare_threshold,
+        "depth_threshold": args.depth_threshold,
+        "align_threshold": args.align_threshold,
+        "stride_scale": args.stride_scale,
+        "roi_tracking": args.roi_tracking,
+        "skip_idle": not args.no_skip_idle,
+        "profile": args.profile,
+        # Videos already run in parallel; a decoder process per video would oversubscribe the CPU.
+        "decode_process": False,
+    }
+    videos = find_videos(args.inputs)
+    if not videos:
+        parser.error("no videos found")
+    os.makedirs(os.path.join(args.out, "videos"), exist_ok=True)
+
+    results = {}
+    pending = []
+    for video in videos:
+        path = result_path(args.out, video, args.exercise)
+        existing = load_result(path)
+        if not args.force and is_up_to_date(existing, video, args.exercise, settings):
+            results[video] = existing
+        else:
+            pending.append((video, path))
+    print(f"{len(videos)} videos, {len(results)} already done, {len(pending)} to analyse")
+
+    if pending:
+        workers = max(1, min(args.workers, len(pending)))
+        # Each worker runs its own model; split the cores between them instead of letting
+        # every process start a full-size thread pool.
+        os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(args.weights,)) as pool:
+            futures = {pool.submit(analyze_one, video, args.exercise, settings, path): video
+                       for video, path in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                video = futures[future]
+                result = future.result()
+                results[video] = result
+                status = result["status"] if result["status"] == "done" else f"FAILED ({result['error']})"
+                print(f"[{done}/{len(pending)}] {os.path.basename(video)}: {status}", flush=True)
+
+    ordered = [results[video] for video in videos]
+    write_reports(args.out, ordered)
+    failed = sum(1 for result in ordered if result["status"] != "done")
+    print(f"Wrote {os.path.join(args.out, 'summary.csv')} and reps.csv ({failed} failed)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
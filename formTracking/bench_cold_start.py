@@ -0,0 +1,75 @@
+"""
+Cold-start cost of the Streamlit app: wall time of the first script run and peak RSS
+for each page, each measured in a fresh interpreter, plus whether the ML stack got imported.
+
+    python bench_cold_start.py
+    python bench_cold_start.py --runs 5 --pages landing workout_schedule
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unified_form_tracker.py")
+PAGES = ["landing", "workout_schedule", "exercise"]
+HEAVY_MODULES = ["ultralytics", "torch", "cv2"]
+
+
+def _measure_page(page):
+    """Child process body: one cold script run of `page`; prints a JSON line."""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP, default_timeout=120)
+    if page != "landing":
+        app.session_state["page"] = page
+        app.session_state["exercise"] = "squat"
+    app.run()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "page": page,
+        "seconds": elapsed,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "errors": [str(e.value) for e in app.exception],
+        "loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def measure(page, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, __file__, "--child", page],
+                             capture_output=True, text=True, check=True, cwd=os.path.dirname(APP))
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--child", choices=PAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _measure_page(args.child)
+        return
+
+    print(f"{'page':>17} | {'first run':>10} | {'peak RSS':>9} | heavy modules loaded")
+    for page in args.pages:
+        samples = measure(page, args.runs)
+        for sample in samples:
+            if sample["errors"]:
+                print(f"{page}: script raised {sample['errors'][0]}", file=sys.stderr)
+        seconds = statistics.median(s["seconds"] for s in samples)
+        rss = statistics.median(s["max_rss_mb"] for s in samples)
+        print(f"{page:>17} | {seconds:8.2f} s | {rss:6.0f} MB | {', '.join(samples[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
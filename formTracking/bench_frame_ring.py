@@ -0,0 +1,88 @@
+"""
+Per-frame handoff cost between processes: pickled frames through a multiprocessing
+Queue versus SharedFrameRing slots with metadata-only messages.
+
+    python bench_frame_ring.py --frames 300
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+from frame_ring import SharedFrameRing
+
+
+SIZES = {"480p": (480, 854, 3), "720p": (720, 1280, 3), "1080p": (1080, 1920, 3)}
+
+
+def _queue_producer(q, shape, frames):
+    frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+    for i in range(frames):
+        frame[0, 0, 0] = i % 255  # each frame is "new", as a decoder would produce
+        q.put(frame)
+    q.put(None)
+
+
+def _ring_producer(ring, shape, frames):
+    frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+    for i in range(frames):
+        frame[0, 0, 0] = i % 255
+        slot, view = ring.acquire(shape)
+        view[...] = frame  # stands in for decoding or resizing into the slot
+        ring.publish(slot, i, shape)
+    ring.finish()
+
+
+def bench_queue(ctx, shape, frames):
+    q = ctx.Queue(maxsize=8)
+    proc = ctx.Process(target=_queue_producer, args=(q, shape, frames))
+    proc.start()
+    checksum = 0
+    start = time.perf_counter()
+    while True:
+        frame = q.get()
+        if frame is None:
+            break
+        checksum += int(frame[::64, ::64, 0].sum())
+    elapsed = time.perf_counter() - start
+    proc.join()
+    return elapsed / frames
+
+
+def bench_ring(ctx, shape, frames):
+    ring = SharedFrameRing(slots=8, max_shape=shape, ctx=ctx)
+    proc = ctx.Process(target=_ring_producer, args=(ring, shape, frames))
+    proc.start()
+    checksum = 0
+    start = time.perf_counter()
+    while True:
+        item = ring.get()
+        if item is None:
+            break
+        slot, _, frame_shape, _ = item
+        frame = ring.view(slot, frame_shape)
+        checksum += int(frame[::64, ::64, 0].sum())
+        del frame
+        ring.release(slot)
+    elapsed = time.perf_counter() - start
+    proc.join()
+    ring.close()
+    return elapsed / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'size':>6} | {'pickled queue':>16} | {'shared ring':>14} | speedup")
+    for name in args.sizes:
+        shape = SIZES[name]
+        queue_cost = bench_queue(ctx, shape, args.frames)
+        ring_cost = bench_ring(ctx, shape, args.frames)
+        print(f"{name:>6} | {queue_cost * 1e3:11.3f} ms/f | {ring_cost * 1e3:9.3f} ms/f | {queue_cost / ring_cost:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+"""
+Distributed analysis: a work queue in one directory on shared storage (an SQLite database
+plus copies of the submitted videos) that any number of worker processes, on any number
+of machines, pull frame-range tasks from.
+
+    python distributed_analysis.py worker --queue /mnt/shared/trainr-queue
+    python distributed_analysis.py submit --queue /mnt/shared/trainr-queue --exercise squat a.mp4 b.mp4
+    python distributed_analysis.py status --queue /mnt/shared/trainr-queue
+
+The app sends its analyses here when TRAINR_WORK_QUEUE points at the queue directory.
+Each job is split into segments of SEGMENT_SECONDS; a worker leases one segment at a
+time and stores the main person's keypoints for every frame on the analysis stride.
+A worker that finds no free segment steals the back half of the largest segment still
+being worked on. When the last segment finishes, the keypoints are replayed in frame
+order through the exercise's rep counter, so the result is the same whichever worker
+analysed which frames. Idle skipping and ROI tracking depend on the frames before, so a
+worker warms them up on the few frames before its range without storing them (see
+process_task), and planks reuse the previous pose over skipped frames when the samples
+are merged. The last segment runs to the end of the video, however many frames the
+container reports. Decoding in a separate process (decode_process) is a local option
+and is not used by workers.
+
+The shared filesystem must support POSIX locks for SQLite (local disks and most NFS
+setups do).
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+import numpy as np
+from form_analysis import DEFAULT_SETTINGS, EXERCISES, FRAME_STRIDE, THRESHOLD_KEYS, load_pose_model
+from motion_gate import MotionGatedModel
+from pose_backends import PersonROITracker, main_person_keypoints
+from progressive_analysis import replay
+from video_io import VideoFrameReader
+
+
+# ---------- Configuration ----------
+
+WORK_QUEUE_DIR = os.environ.get("TRAINR_WORK_QUEUE")
+SEGMENT_SECONDS = 20.0
+LEASE_SECONDS = 60.0  # a segment whose worker has not checked in for this long is handed out again
+HEARTBEAT_SECONDS = 2.0
+MIN_STEAL_FRAMES = 8  # analysed frames; smaller remainders are left to their worker
+MAX_TASK_FAILURES = 3  # a segment that raises this many times fails its job
+POLL_SECONDS = 1.0
+# run() fails a job that no worker has held a live lease on or stored frames for in this
+# long (no worker running, or all of them dead); longer than LEASE_SECONDS so a dead
+# worker's lease expires first.
+WORKER_TIMEOUT_SECONDS = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    video_path TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    stride INTEGER NOT NULL,
+    fps REAL NOT NULL,
+    frame_count INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    summary TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    start_frame INTEGER NOT NULL,
+    end_frame INTEGER NOT NULL,
+    next_frame INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, job_id);
+CREATE TABLE IF NOT EXISTS samples (
+    job_id TEXT NOT NULL,
+    frame_idx INTEGER NOT NULL,
+    keypoints BLOB,
+    gated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, frame_idx)
+);
+"""
+# Columns added since the first release, for queue databases created before them.
+_ADDED_COLUMNS = [("samples", "gated", "INTEGER NOT NULL DEFAULT 0"),
+                  ("tasks", "failures", "INTEGER NOT NULL DEFAULT 0")]
+
+
+# ---------- Work Queue ----------
+
+class WorkQueue:
+    """
+    SQLite-backed queue of frame-range tasks.
+
+    A task covers the stride-aligned frames start_frame <= f < end_frame; next_frame is the
+    first one not yet stored. Tasks are "pending", "leased" (worker + lease_until) or "done".
+    Every state change runs in an IMMEDIATE transaction, so concurrent workers never lease
+    the same range, and stored samples are keyed by frame, so a range analysed twice (after
+    an expired lease or a steal) just overwrites identical rows.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        self.videos_dir = os.path.join(queue_dir, "videos")
+        os.makedirs(self.videos_dir, exist_ok=True)
+        self.db_path = os.path.join(queue_dir, "queue.sqlite3")
+        db = sqlite3.connect(self.db_path, timeout=60)
+        db.executescript(_SCHEMA)
+        for table, column, definition in _ADDED_COLUMNS:
+            if column not in {row[1] for row in db.execute(f"PRAGMA table_info({table})")}:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Transaction(db)
+
+    # ----- submitting -----
+
+    def submit(self, video_path, exercise, settings, job_id=None, segment_seconds=SEGMENT_SECONDS):
+        """Copies the video into the queue directory and splits the job into segments; returns the job id."""
+        if exercise not in EXERCISES:
+            raise ValueError(f"Unknown exercise: {exercise}")
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        job_id = job_id or uuid.uuid4().hex[:12]
+        reader = VideoFrameReader(video_path)
+        if reader.analysis_size == (0, 0):
+            raise ValueError(f"could not read {video_path}")
+        stride = FRAME_STRIDE[exercise] * int(settings["stride_scale"])
+        shared_path = os.path.join(self.videos_dir, job_id + os.path.splitext(video_path)[1])
+        shutil.copyfile(video_path, shared_path)
+
+        # Segments are cut from the reported frame count, which can be short or missing (0); the
+        # last one ends past it and its worker reads on to the end of the video (process_task).
+        last_frame = reader.frame_count // stride * stride
+        segment = max(1, int(round(segment_seconds * reader.fps / stride))) * stride
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, video_path, exercise, settings, stride, fps, frame_count, status, "
+                       "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'running', ?)",
+                       (job_id, shared_path, exercise, json.dumps(settings), stride, reader.fps,
+                        reader.frame_count, time.time()))
+            db.executemany("INSERT INTO tasks (job_id, start_frame, end_frame, next_frame, status) "
+                           "VALUES (?, ?, ?, ?, 'pending')",
+                           [(job_id, start, min(start + segment, last_frame + stride), start)
+                            for start in range(stride, last_frame + 1, segment) or [stride]])
+        return job_id
+
+    def job(self, job_id):
+        """Job record with progress (frames stored / frames on the stride) and the summary once done."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            stored = db.execute("SELECT COUNT(*) FROM samples WHERE job_id = ?", (job_id,)).fetchone()[0]
+            workers = db.execute("SELECT COUNT(DISTINCT worker) FROM tasks WHERE job_id = ? AND status = 'leased' "
+                                 "AND lease_until >= ?", (job_id, time.time())).fetchone()[0]
+        job = dict(row)
+        job["settings"] = json.loads(job["settings"])
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        total = job["frame_count"] // job["stride"]
+        if job["status"] != "running":
+            fraction = 1.0
+        else:
+            fraction = min(1.0, stored / total) if total else 0.0
+        job["progress"] = {"fraction": fraction, "frames_stored": stored, "workers": workers}
+        return job
+
+    def job_ids(self):
+        with self._connect() as db:
+            return [row["id"] for row in db.execute("SELECT id FROM jobs ORDER BY created_at")]
+
+    def remove(self, job_id):
+        """Deletes a finished job's samples and video copy (its jobs row and summary are kept)."""
+        with self._connect() as db:
+            row = db.execute("SELECT video_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            db.execute("DELETE FROM samples WHERE job_id = ?", (job_id,))
+        if row is not None and os.path.exists(row["video_path"]):
+            os.remove(row["video_path"])
+
+    def run(self, job_id, video_path, exercise, settings, on_progress=None):
+        """
+        Submits (unless a job with this id is already queued, e.g. after a restart), waits for
+        the workers and returns the summary. on_progress(progress, None) is called while waiting.
+        Fails the job after WORKER_TIMEOUT_SECONDS without any worker activity.
+        """
+        if self.job(job_id) is None:
+            self.submit(video_path, exercise, settings, job_id=job_id)
+        last_stored, last_active = None, time.monotonic()
+        while True:
+            job = self.job(job_id)
+            if job["status"] == "done":
+                self.remove(job_id)
+                return job["summary"]
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            stored = job["progress"]["frames_stored"]
+            if job["progress"]["workers"] or stored != last_stored:
+                last_stored, last_active = stored, time.monotonic()
+            elif time.monotonic() - last_active >= WORKER_TIMEOUT_SECONDS:
+                error = (f"No analysis worker made progress for {WORKER_TIMEOUT_SECONDS:.0f} s; "
+                         f"start one with: python distributed_analysis.py worker --queue {self.queue_dir}")
+                self.fail_job(job_id, error)
+                self.remove(job_id)
+                raise RuntimeError(error)
+            if on_progress is not None:
+                on_progress(dict(job["progress"], frame_count=job["frame_count"]), None)
+            time.sleep(POLL_SECONDS)
+
+    # ----- working -----
+
+    def claim(self, worker):
+        """
+        Leases a segment to `worker`: a pending one, one whose lease expired, or the back half
+        of the largest segment another worker is still on. Returns the task (with its job's
+        video, exercise, settings and stride) or None when there is nothing to do.
+        """
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT tasks.id FROM tasks JOIN jobs ON jobs.id = tasks.job_id "
+                             "WHERE jobs.status = 'running' AND (tasks.status = 'pending' OR "
+                             "(tasks.status = 'leased' AND tasks.lease_until < ?)) "
+                             "ORDER BY jobs.created_at, tasks.start_frame LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                task_id = row["id"]
+                db.execute("UPDATE tasks SET status = 'leased', worker = ?, lease_until = ? WHERE id = ?",
+                           (worker, now + LEASE_SECONDS, task_id))
+            else:
+                task_id = self._steal(db, worker, now)
+                if task_id is None:
+                    return None
+            return dict(db.execute("SELECT tasks.*, jobs.video_path, jobs.exercise, jobs.settings, jobs.stride, "
+                                   "jobs.fps, jobs.frame_count FROM tasks JOIN jobs ON jobs.id = tasks.job_id WHERE tasks.id = ?",
+                                   (task_id,)).fetchone())
+
+    def _steal(self, db, worker, now):
+        victim = db.execute("SELECT tasks.*, jobs.stride FROM tasks JOIN jobs ON jobs.id = tasks.job_id "
+                            "WHERE tasks.status = 'leased' AND tasks.lease_until >= ? AND tasks.worker != ? "
+                            "ORDER BY (tasks.end_frame - tasks.next_frame) / jobs.stride DESC LIMIT 1",
+                            (now, worker)).fetchone()
+        if victim is None:
+            return None
+        stride = victim["stride"]
+        remaining = (victim["end_frame"] - victim["next_frame"] + stride - 1) // stride
+        if remaining < 2 * MIN_STEAL_FRAMES:
+            return None
+        split = victim["next_frame"] + remaining // 2 * stride
+        db.execute("UPDATE tasks SET end_frame = ? WHERE id = ?", (split, victim["id"]))
+        cursor = db.execute("INSERT INTO tasks (job_id, start_frame, end_frame, next_frame, status, worker, "
+                            "lease_until) VALUES (?, ?, ?, ?, 'leased', ?, ?)",
+                            (victim["job_id"], split, victim["end_frame"], split, worker, now + LEASE_SECONDS))
+        return cursor.lastrowid
+
+    def heartbeat(self, task, samples):
+        """
+        Stores samples [(frame_idx, keypoints or None, gated)], where gated marks a frame the
+        motion gate skipped, records progress and renews the lease.
+        Returns the task's current end_frame (it shrinks when another worker steals part of
+        the range), or None when the lease was lost and the worker should drop the task.
+        """
+        next_frame = samples[-1][0] + task["stride"] if samples else task["next_frame"]
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM tasks WHERE id = ?", (task["id"],)).fetchone()
+            if row["worker"] != task["worker"] or row["status"] != "leased":
+                return None
+            self._store(db, task["job_id"], samples)
+            db.execute("UPDATE tasks SET next_frame = ?, lease_until = ? WHERE id = ?",
+                       (max(next_frame, row["next_frame"]), time.time() + LEASE_SECONDS, task["id"]))
+            return row["end_frame"]
+
+    def complete(self, task, samples):
+        """Stores the last samples and closes the task; the last task of a job also merges it."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM tasks WHERE id = ?", (task["id"],)).fetchone()
+            if row["worker"] != task["worker"] or row["status"] != "leased":
+                return
+            self._store(db, task["job_id"], samples)
+            db.execute("UPDATE tasks SET status = 'done', next_frame = end_frame, lease_until = NULL "
+                       "WHERE id = ?", (task["id"],))
+            unfinished = db.execute("SELECT COUNT(*) FROM tasks WHERE job_id = ? AND status != 'done'",
+                                    (task["job_id"],)).fetchone()[0]
+            if unfinished == 0:
+                self._merge(db, task["job_id"])
+
+    def fail(self, task, error):
+        """
+        Records a failed attempt at a task. The task is released for another try (a lock
+        timeout or a decode error on one worker can be transient); after MAX_TASK_FAILURES
+        attempts the whole job fails (an unreadable video fails on every worker alike).
+        Returns True when the job was failed.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM tasks WHERE id = ?", (task["id"],)).fetchone()
+            if row is None or row["worker"] != task["worker"] or row["status"] != "leased":
+                return False  # the lease was lost meanwhile; its new holder carries on
+            failures = row["failures"] + 1
+            if failures < MAX_TASK_FAILURES:
+                db.execute("UPDATE tasks SET status = 'pending', worker = NULL, lease_until = NULL, failures = ? "
+                           "WHERE id = ?", (failures, task["id"]))
+                return False
+        self.fail_job(task["job_id"], f"{error} (segment failed {failures} times)")
+        return True
+
+    def fail_job(self, job_id, error):
+        """Marks a job failed and closes its tasks so no worker picks them up."""
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                       (error, time.time(), job_id))
+            db.execute("UPDATE tasks SET status = 'done' WHERE job_id = ?", (job_id,))
+
+    @staticmethod
+    def _store(db, job_id, samples):
+        db.executemany("INSERT OR REPLACE INTO samples (job_id, frame_idx, keypoints, gated) VALUES (?, ?, ?, ?)",
+                       [(job_id, frame_idx, None if kpts is None else np.asarray(kpts, np.float32).tobytes(), gated)
+                        for frame_idx, kpts, gated in samples])
+
+    @staticmethod
+    def _merge(db, job_id):
+        job = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        settings = json.loads(job["settings"])
+        rows = db.execute("SELECT frame_idx, keypoints, gated FROM samples WHERE job_id = ? ORDER BY frame_idx",
+                          (job_id,)).fetchall()
+        samples = {row["frame_idx"]: None if row["keypoints"] is None
+                   else np.frombuffer(row["keypoints"], np.float32).reshape(17, 2) for row in rows}
+        skipped = sum(row["gated"] for row in rows)
+        if job["exercise"] == "plank":
+            # The gate's reuse_last, done here because the previous pose may be in another segment.
+            previous = None
+            for row in rows:
+                if row["gated"]:
+                    samples[row["frame_idx"]] = previous
+                previous = samples[row["frame_idx"]]
+        workers = db.execute("SELECT COUNT(DISTINCT worker) FROM tasks WHERE job_id = ?", (job_id,)).fetchone()[0]
+        tasks = db.execute("SELECT COUNT(*) FROM tasks WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+        counter = replay(job["exercise"], settings, samples, job["fps"])
+        summary = dict(counter.counts(), reps=counter.reps)
+        for key in THRESHOLD_KEYS[job["exercise"]]:
+            summary[key] = settings[key]
+        distributed = {"workers": workers, "tasks": tasks}
+        if settings.get("decode_process"):
+            distributed["ignored_settings"] = ["decode_process"]
+        summary.update(exercise=job["exercise"], frames_processed=len(samples), fps=job["fps"],
+                       distributed=distributed)
+        if settings.get("skip_idle"):
+            # Same figures as MotionGatedModel.stats, summed over the workers' gates.
+            inferred = len(samples) - skipped
+            summary.update(skipped_time=skipped * job["stride"] / job["fps"],
+                           inference_speedup=len(samples) / inferred if inferred else 1.0)
+        db.execute("UPDATE jobs SET status = 'done', summary = ?, finished_at = ? WHERE id = ?",
+                   (json.dumps(summary), time.time(), job_id))
+
+
+class _Transaction:
+    """`with` block around one IMMEDIATE transaction (write lock taken up front); closes the connection."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        self.db.close()
+
+
+# ---------- Worker ----------
+
+def process_task(work_queue, task, model):
+    """
+    Analyses the task's frames until its (possibly shrinking) end, checking in every
+    HEARTBEAT_SECONDS; a task ending past the job's reported frame count runs to the end
+    of the video. With skip_idle, the motion gate is first fed the idle_after + 1 frames
+    before the task, so it skips the same frames as a single run over the whole video.
+    With roi_tracking, the frame just before the task is detected to set the crop window,
+    so crops match a single run up to detection jitter.
+    """
+    reader = VideoFrameReader(task["video_path"], stride=task["stride"])
+    if reader.analysis_size == (0, 0):
+        work_queue.fail(task, f"could not read {task['video_path']}")
+        return
+    settings = json.loads(task["settings"])
+    stride, start = task["stride"], task["next_frame"]
+    roi = PersonROITracker(model) if settings.get("roi_tracking") else None
+    pose_model = model if roi is None else roi
+    warm_up = 1 if roi is not None else 0
+    gate = None
+    if settings.get("skip_idle"):
+        # Planks reuse the previous pose over skipped frames, but that is done in _merge.
+        gate = pose_model = MotionGatedModel(pose_model)
+        warm_up = gate.idle_after + 1
+    first = max(stride, start - warm_up * stride)
+    if gate is not None:
+        gate.position = first // stride - 1
+
+    def frames():
+        for frame_idx in itertools.count(first, stride):
+            if frame_idx >= task["end_frame"] and task["end_frame"] <= task["frame_count"]:
+                return
+            yield frame_idx
+
+    samples = []
+    last_beat = time.monotonic()
+    for frame_idx, frame in reader.read_frames(frames()):
+        if frame_idx < start:
+            if gate is not None:
+                gate.warm_up(frame)
+            if roi is not None and frame_idx == start - stride:
+                roi(frame, verbose=False)
+            continue
+        skipped = gate.skipped if gate is not None else 0
+        kpts = main_person_keypoints(pose_model(frame, verbose=False))
+        samples.append((frame_idx, kpts, gate is not None and gate.skipped > skipped))
+        if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+            end_frame = work_queue.heartbeat(task, samples)
+            if end_frame is None:
+                reader.release()
+                return
+            task["end_frame"] = end_frame
+            task["next_frame"] = samples[-1][0] + stride
+            samples = []
+            last_beat = time.monotonic()
+    work_queue.complete(task, samples)
+
+
+def run_worker(work_queue, model, worker=None, exit_when_idle=False):
+    """Claims and processes tasks until interrupted (or until the queue is empty with exit_when_idle)."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        task = work_queue.claim(worker)
+        if task is None:
+            if exit_when_idle:
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+        try:
+            process_task(work_queue, task, model)
+        except Exception as exc:
+            # Release the segment for a retry; a video that keeps breaking the pipeline fails its job.
+            try:
+                work_queue.fail(task, str(exc))
+            except sqlite3.Error:
+                pass  # the lease expires and the segment is handed out again
+
+
+# ---------- CLI ----------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queue", default=WORK_QUEUE_DIR, help="Queue directory (default: $TRAINR_WORK_QUEUE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Process tasks")
+    worker.add_argument("--weights", default="yolov8n-pose.pt")
+    worker.add_argument("--exit-when-idle", action="store_true", help="Stop once no task is left")
+    submit = commands.add_parser("submit", help="Queue videos and print their job ids")
+    submit.add_argument("videos", nargs="+")
+    submit.add_argument("--exercise", required=True, choices=EXERCISES)
+    submit.add_argument("--flare-threshold", type=int, default=DEFAULT_SETTINGS["flare_threshold"])
+    submit.add_argument("--depth-threshold", type=int, default=DEFAULT_SETTINGS["depth_threshold"])
+    submit.add_argument("--align-threshold", type=int, default=DEFAULT_SETTINGS["align_threshold"])
+    submit.add_argument("--stride-scale", type=int, default=DEFAULT_SETTINGS["stride_scale"])
+    submit.add_argument("--roi-tracking", action="store_true", help="Track the person and infer on a crop")
+    submit.add_argument("--no-skip-idle", action="store_true", help="Run inference on idle stretches too")
+    status = commands.add_parser("status", help="Print job states and results")
+    status.add_argument("job_ids", nargs="*")
+    args = parser.parse_args()
+    if not args.queue:
+        parser.error("no queue directory (pass --queue or set TRAINR_WORK_QUEUE)")
+    work_queue = WorkQueue(args.queue)
+
+    if args.command == "worker":
+        run_worker(work_queue, load_pose_model(args.weights), exit_when_idle=args.exit_when_idle)
+    elif args.command == "submit":
+        settings = {"flare_threshold": args.flare_threshold, "depth_threshold": args.depth_threshold,
+                    "align_threshold": args.align_threshold, "stride_scale": args.stride_scale,
+                    "roi_tracking": args.roi_tracking, "skip_idle": not args.no_skip_idle}
+        for video in args.videos:
+            print(work_queue.submit(video, args.exercise, settings), video)
+    else:
+        for job_id in args.job_ids or work_queue.job_ids():
+            job = work_queue.job(job_id)
+            if job is None:
+                print(f"{job_id}: unknown", file=sys.stderr)
+                continue
+            result = {k: v for k, v in (job["summary"] or {}).items() if k != "reps"}
+            print(f"{job_id} {job['exercise']:>6} {job['status']:>7} {job['progress']['fraction']:6.1%} "
+                  f"{json.dumps(result) if result else job['error'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+import os
+import cv2
+import numpy as np
+from frame_ring import RingVideoReader
+from motion_gate import MotionGatedModel
+from pose_backends import PersonROITracker, RemotePoseModel, main_person_keypoints
+from rep_counters import PlankTimer, PullupRepCounter, PushupRepCounter, SquatRepCounter
+from seek_index import build_seek_index
+from stage_profiler import StageProfiler
+from video_io import VideoFrameReader
+
+
+# ---------- Helper Functions ----------
+
+def calculate_angle(a, b, c):
+    """
+    Calculates the angle at point b (vertex) formed by a and c.
+    """
+    a = np.array(a)
+    b = np.array(b)
+    c = np.array(c)
+
+    ba = a - b
+    bc = c - b
+
+    norm_ba = np.linalg.norm(ba)
+    norm_bc = np.linalg.norm(bc)
+
+    if norm_ba == 0 or norm_bc == 0:
+        return 0.0
+
+    cosine_angle = np.dot(ba, bc) / (norm_ba * norm_bc)
+    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+
+    angle = np.arccos(cosine_angle)
+    return np.degrees(angle)
+
+
+# ---------- Pull-up Functions ----------
+
+def get_pose_details_pullup(results):
+    """
+    Extracts keypoints for pull-up analysis.
+    Returns: head_y, shoulder_y, keypoints dict
+    """
+    person_kpts = main_person_keypoints(results)
+    if person_kpts is None:
+        return None, None, None
+
+    def get_pt(idx):
+        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
+            return person_kpts[idx]
+        return None
+
+    # COCO keypoint indices: 0=nose, 5=l_shoulder, 6=r_shoulder, 7=l_elbow, 8=r_elbow, 11=l_hip, 12=r_hip
+    keypoints = {
+        "nose": get_pt(0),
+        "l_sh": get_pt(5), "r_sh": get_pt(6),
+        "l_el": get_pt(7), "r_el": get_pt(8),
+        "l_hip": get_pt(11), "r_hip": get_pt(12)
+    }
+
+    # Calculate head Y (use nose as proxy for chin/head position)
+    # Calculate shoulder Y (average of both shoulders)
+    head_y = None
+    if keypoints["nose"] is not None:
+        head_y = float(keypoints["nose"][1])
+    
+    shoulder_y = None
+    shoulder_coords = []
+    if keypoints["l_sh"] is not None:
+        shoulder_coords.append(keypoints["l_sh"][1])
+    if keypoints["r_sh"] is not None:
+        shoulder_coords.append(keypoints["r_sh"][1])
+    
+    if shoulder_coords:
+        shoulder_y = float(np.mean(shoulder_coords))
+
+    return head_y, shoulder_y, keypoints
+
+
+def draw_debug_overlay_pullup(frame, kpts, head_y, shoulder_y):
+    """
+    Draws visualization overlay showing head position relative to shoulders.
+    """
+    # Draw shoulder line
+    if kpts['l_sh'] is not None and kpts['r_sh'] is not None:
+        cv2.line(frame, tuple(kpts['l_sh'].astype(int)), tuple(kpts['r_sh'].astype(int)), (255, 255, 0), 2)
+    
+    # Draw head position indicator
+    if kpts['nose'] is not None and shoulder_y is not None:
+        # Draw line from nose to shoulder level
+        nose_pos = tuple(kpts['nose'].astype(int))
+        shoulder_x = int((kpts['l_sh'][0] + kpts['r_sh'][0]) / 2) if kpts['l_sh'] is not None and kpts['r_sh'] is not None else nose_pos[0]
+        shoulder_pos = (shoulder_x, int(shoulder_y))
+        
+        # Color based on position
+        head_above_shoulder = head_y < shoulder_y  # Lower Y = higher in image
+        line_color = (0, 255, 0) if head_above_shoulder else (0, 0, 255)  # Green if above, red if below
+        
+        cv2.line(frame, nose_pos, shoulder_pos, line_color, 2)
+        cv2.circle(frame, nose_pos, 5, (0, 255, 255), -1)
+    
+    # Text overlay
+    if head_y is not None and shoulder_y is not None:
+        head_above_shoulder = head_y < shoulder_y  # Lower Y = higher in image
+        status = "CHIN ABOVE BAR" if head_above_shoulder else "CHIN BELOW BAR"
+        color = (0, 255, 0) if head_above_shoulder else (0, 0, 255)
+        cv2.putText(frame, status, (10, 30), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    
+    return frame
+
+
+# ---------- Push-up Functions ----------
+
+def get_pose_details_pushup(results):
+    """
+    Extracts keypoints and torso Y.
+    """
+    person_kpts = main_person_keypoints(results)
+    if person_kpts is None:
+        return None, None
+
+    def get_pt(idx):
+        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
+            return person_kpts[idx]
+        return None
+
+    keypoints = {
+        "l_sh": get_pt(5), "r_sh": get_pt(6),
+        "l_el": get_pt(7), "r_el": get_pt(8),
+        "l_hip": get_pt(11), "r_hip": get_pt(12)
+    }
+
+    # Calculate Torso Y (average of shoulders and hips)
+    y_coords = []
+    for k in keypoints.values():
+        if k is not None:
+            y_coords.append(k[1])
+
+    if not y_coords:
+        return None, None
+
+    torso_y = float(np.mean(y_coords))
+    return torso_y, keypoints
+
+
+def pushup_flare_angle(kpts):
+    """Mean shoulder (hip-shoulder-elbow) angle over the visible sides, 0 if neither side is usable."""
+    left_angle = right_angle = 0
+    if kpts['l_sh'] is not None and kpts['l_hip'] is not None and kpts['l_el'] is not None:
+        left_angle = calculate_angle(kpts['l_hip'], kpts['l_sh'], kpts['l_el'])
+    if kpts['r_sh'] is not None and kpts['r_hip'] is not None and kpts['r_el'] is not None:
+        right_angle = calculate_angle(kpts['r_hip'], kpts['r_sh'], kpts['r_el'])
+    valid_angles = [a for a in [left_angle, right_angle] if a > 10]
+    return float(np.mean(valid_angles)) if valid_angles else 0
+
+
+def draw_debug_overlay_pushup(frame, kpts, angle, threshold):
+    """
+    Draws the torso-to-arm lines and the calculated angle on the frame.
+    """
+    # Color based on threshold
+    color = (0, 255, 0) if angle < threshold else (0, 0, 255)  # Green if good, Red if bad
+
+    # Draw Left Side (if visible)
+    if kpts['l_sh'] is not None and kpts['l_hip'] is not None and kpts['l_el'] is not None:
+        cv2.line(frame, tuple(kpts['l_sh'].astype(int)), tuple(kpts['l_hip'].astype(int)), (255, 255, 0), 2)  # Torso
+        cv2.line(frame, tuple(kpts['l_sh'].astype(int)), tuple(kpts['l_el'].astype(int)), color, 3)  # Arm
+
+    # Draw Right Side (if visible)
+    if kpts['r_sh'] is not None and kpts['r_hip'] is not None and kpts['r_el'] is not None:
+        cv2.line(frame, tuple(kpts['r_sh'].astype(int)), tuple(kpts['r_hip'].astype(int)), (255, 255, 0), 2)
+        cv2.line(frame, tuple(kpts['r_sh'].astype(int)), tuple(kpts['r_el'].astype(int)), color, 3)
+
+    # Text overlay
+    cv2.putText(frame, f"Angle: {int(angle)} deg", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    return frame
+
+
+# ---------- Squat Functions ----------
+# COCO: 11=l_hip, 12=r_hip, 13=l_knee, 14=r_knee, 15=l_ankle, 16=r_ankle
+
+def get_pose_details_squat(results):
+    """
+    Extracts keypoints for squat analysis.
+    Returns: hip_y, knee_angle_deg, keypoints dict.
+    knee_angle is the average of left/right hip-knee-ankle angle (lower = deeper squat).
+    """
+    person_kpts = main_person_keypoints(results)
+    if person_kpts is None:
+        return None, None, None
+
+    def get_pt(idx):
+        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
+            return person_kpts[idx]
+        return None
+
+    keypoints = {
+        "l_hip": get_pt(11), "r_hip": get_pt(12),
+        "l_knee": get_pt(13), "r_knee": get_pt(14),
+        "l_ankle": get_pt(15), "r_ankle": get_pt(16),
+    }
+
+    hip_y = None
+    hip_coords = [keypoints["l_hip"], keypoints["r_hip"]]
+    hip_coords = [p for p in hip_coords if p is not None]
+    if hip_coords:
+        hip_y = float(np.mean([p[1] for p in hip_coords]))
+
+    knee_angles = []
+    if keypoints["l_hip"] is not None and keypoints["l_knee"] is not None and keypoints["l_ankle"] is not None:
+        knee_angles.append(calculate_angle(keypoints["l_hip"], keypoints["l_knee"], keypoints["l_ankle"]))
+    if keypoints["r_hip"] is not None and keypoints["r_knee"] is not None and keypoints["r_ankle"] is not None:
+        knee_angles.append(calculate_angle(keypoints["r_hip"], keypoints["r_knee"], keypoints["r_ankle"]))
+    knee_angle = float(np.mean(knee_angles)) if knee_angles else None
+
+    return hip_y, knee_angle, keypoints
+
+
+def draw_debug_overlay_squat(frame, kpts, knee_angle, depth_threshold):
+    """Draw knee angles and depth cue for squat."""
+    color = (0, 255, 0) if (knee_angle is not None and knee_angle <= depth_threshold) else (0, 0, 255)
+
+    if kpts["l_hip"] is not None and kpts["l_knee"] is not None and kpts["l_ankle"] is not None:
+        cv2.line(frame, tuple(kpts["l_hip"].astype(int)), tuple(kpts["l_knee"].astype(int)), (255, 255, 0), 2)
+        cv2.line(frame, tuple(kpts["l_knee"].astype(int)), tuple(kpts["l_ankle"].astype(int)), (255, 255, 0), 2)
+    if kpts["r_hip"] is not None and kpts["r_knee"] is not None and kpts["r_ankle"] is not None:
+        cv2.line(frame, tuple(kpts["r_hip"].astype(int)), tuple(kpts["r_knee"].astype(int)), (255, 255, 0), 2)
+        cv2.line(frame, tuple(kpts["r_knee"].astype(int)), tuple(kpts["r_ankle"].astype(int)), (255, 255, 0), 2)
+
+    if knee_angle is not None:
+        cv2.putText(frame, f"Knee: {int(knee_angle)} deg", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    return frame
+
+
+# ---------- Plank Functions ----------
+# Alignment: angle at hip (shoulder-hip-ankle). Good plank = straight line = ~180°. Works from any camera angle.
+
+def _plank_midpoints(kpts):
+    """Get mid shoulder, mid hip, mid ankle from keypoints dict."""
+    sh = None
+    if kpts["l_sh"] is not None and kpts["r_sh"] is not None:
+        sh = (kpts["l_sh"] + kpts["r_sh"]) / 2
+    elif kpts["l_sh"] is not None:
+        sh = kpts["l_sh"]
+    elif kpts["r_sh"] is not None:
+        sh = kpts["r_sh"]
+    hip = None
+    if kpts["l_hip"] is not None and kpts["r_hip"] is not None:
+        hip = (kpts["l_hip"] + kpts["r_hip"]) / 2
+    elif kpts["l_hip"] is not None:
+        hip = kpts["l_hip"]
+    elif kpts["r_hip"] is not None:
+        hip = kpts["r_hip"]
+    ankle = None
+    if kpts["l_ankle"] is not None and kpts["r_ankle"] is not None:
+        ankle = (kpts["l_ankle"] + kpts["r_ankle"]) / 2
+    elif kpts["l_ankle"] is not None:
+        ankle = kpts["l_ankle"]
+    elif kpts["r_ankle"] is not None:
+        ankle = kpts["r_ankle"]
+    return sh, hip, ankle
+
+
+def get_pose_details_plank(results):
+    """
+    Extracts keypoints for plank analysis.
+    Returns: hip_angle_deg, keypoints dict.
+    hip_angle: angle at the hip (shoulder-hip-ankle). Straight line = 180°. Sag or pike deviates from 180°.
+    This is independent of camera position.
+    """
+    person_kpts = main_person_keypoints(results)
+    if person_kpts is None:
+        return None, None
+
+    def get_pt(idx):
+        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
+            return person_kpts[idx]
+        return None
+
+    keypoints = {
+        "l_sh": get_pt(5), "r_sh": get_pt(6),
+        "l_hip": get_pt(11), "r_hip": get_pt(12),
+        "l_ankle": get_pt(15), "r_ankle": get_pt(16),
+    }
+
+    sh, hip, ankle = _plank_midpoints(keypoints)
+    hip_angle = None
+    if sh is not None and hip is not None and ankle is not None:
+        hip_angle = float(calculate_angle(sh, hip, ankle))
+
+    return hip_angle, keypoints
+
+
+def draw_debug_overlay_plank(frame, kpts, hip_angle, tolerance):
+    """Draw shoulder-hip-ankle line. Good = angle within tolerance of 180°."""
+    good = hip_angle is not None and abs(hip_angle - 180.0) <= tolerance
+    color = (0, 255, 0) if good else (0, 0, 255)
+
+    sh, hip, ankle = _plank_midpoints(kpts)
+    if sh is not None and hip is not None:
+        cv2.line(frame, tuple(sh.astype(int)), tuple(hip.astype(int)), color, 3)
+    if hip is not None and ankle is not None:
+        cv2.line(frame, tuple(hip.astype(int)), tuple(ankle.astype(int)), color, 3)
+
+    if hip_angle is not None:
+        cv2.putText(frame, f"Hip angle: {int(hip_angle)} deg", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    return frame
+
+
+# ---------- Counting From Stored Keypoints ----------
+
+def feed_rep_counter(exercise, counter, frame_idx, results):
+    """
+    Feeds one frame's pose results to a rep counter built by rep_counters.make_rep_counter,
+    applying the same visibility rules as the analysis loops. Returns the rep event or None.
+    """
+    if exercise == "pullup":
+        head_y, shoulder_y, kpts = get_pose_details_pullup(results)
+        if head_y is None or shoulder_y is None or kpts is None:
+            return None
+        return counter.update(frame_idx, head_y, shoulder_y)
+    if exercise == "pushup":
+        torso_y, kpts = get_pose_details_pushup(results)
+        if torso_y is None:
+            return None
+        return counter.update(frame_idx, torso_y, pushup_flare_angle(kpts))
+    if exercise == "squat":
+        hip_y, knee_angle, _ = get_pose_details_squat(results)
+        if hip_y is None:
+            return None
+        return counter.update(frame_idx, hip_y, knee_angle)
+    hip_angle, _ = get_pose_details_plank(results)
+    return counter.update(frame_idx, hip_angle)
+
+
+# ---------- Video Analysis ----------
+# Streamlit-free versions of the per-exercise analysis loops, shared by the app's
+# background jobs. on_progress(progress, preview) is called after every processed
+# frame; preview is an RGB display frame every DISPLAY_EVERY frames, otherwise None.
+
+EXERCISES = ("pullup", "pushup", "squat", "plank")
+FRAME_STRIDE = {"pullup": 6, "pushup": 6, "squat": 6, "plank": 4}
+# Settings each exercise's summary echoes back.
+THRESHOLD_KEYS = {"pullup": (), "pushup": ("flare_threshold",), "squat": ("depth_threshold",),
+                  "plank": ("align_threshold",)}
+DISPLAY_EVERY = 4
+
+DEFAULT_SETTINGS = {
+    "flare_threshold": 75,
+    "depth_threshold": 100,
+    "align_threshold": 25,
+    "roi_tracking": False,
+    "skip_idle": True,
+    # Multiplies FRAME_STRIDE; smoothing and percentile calibration keep rep counts stable at 2-3x.
+    "stride_scale": 1,
+    # Decode in a separate process and hand frames over through shared memory.
+    "decode_process": os.environ.get("TRAINR_DECODE_PROCESS") == "1",
+    # Time each pipeline stage and add the profile to the summary.
+    "profile": False,
+    # Write an annotated MP4 instead (video_export.export_annotated_video, run by analysis_jobs).
+    "export_video": False,
+    # Track and count everyone in view (multi_person.analyze_group_video, run by analysis_jobs).
+    "multi_person": False,
+    # Provisional totals from a sparse pass, then refine (progressive_analysis, run by analysis_jobs).
+    "progressive": False,
+}
+
+
+def load_pose_model(weights="yolov8n-pose.pt"):
+    """
+    Loads the YOLO pose model used by every analyser.
+    When TRAINR_POSE_SERVER is set (unix:/path or host:port), returns a client for
+    pose_server.py instead, so all sessions share one batched model.
+    """
+    address = os.environ.get("TRAINR_POSE_SERVER")
+    if address:
+        return RemotePoseModel(address)
+    # Imported here so that importing this module does not pull in torch.
+    from ultralytics import YOLO
+
+    return YOLO(weights)
+
+
+class _ProgressReporter:
+    """Throttles preview frames and forwards progress to the caller."""
+
+    def __init__(self, reader, on_progress, profiler):
+        self.reader = reader
+        self.on_progress = on_progress
+        self.profiler = profiler
+        self.processed_count = 0
+
+    def __call__(self, frame_idx, counts, debug_frame):
+        self.processed_count += 1
+        if self.on_progress is None:
+            return
+        preview = None
+        if self.processed_count % DISPLAY_EVERY == 1 or self.processed_count == 1:
+            with self.profiler.stage("display"):
+                preview = self.reader.to_display(debug_frame)
+            self.profiler.count("displayed")
+        frame_count = self.reader.frame_count
+        progress = dict(counts)
+        progress["frame_idx"] = frame_idx
+        progress["frame_count"] = frame_count
+        progress["fraction"] = min(1.0, frame_idx / frame_count) if frame_count else 0.0
+        self.on_progress(progress, preview)
+
+
+def analyze_video(video_path, exercise, settings, model, on_progress=None, seek_index_path=None):
+    """
+    Runs the analysis for one exercise over a video and returns the summary dict.
+    settings: thresholds from the sidebar (see DEFAULT_SETTINGS).
+    seek_index_path: where to save a seek_index.SeekIndex built from this pass's frame timestamps.
+    """
+    if exercise not in EXERCISES:
+        raise ValueError(f"Unknown exercise: {exercise}")
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    profiler = StageProfiler(enabled=settings["profile"])
+    pose_model = profiler.timed_model(model)
+    if settings["roi_tracking"]:
+        pose_model = PersonROITracker(pose_model)
+    gate = None
+    if settings["skip_idle"]:
+        # Planks are supposed to be still: keep scoring the last pose instead of dropping frames.
+        gate = pose_model = MotionGatedModel(pose_model, reuse_last=(exercise == "plank"))
+    reader_cls = RingVideoReader if settings["decode_process"] else VideoFrameReader
+    reader = reader_cls(video_path, stride=FRAME_STRIDE[exercise] * int(settings["stride_scale"]))
+    report = _ProgressReporter(reader, on_progress, profiler)
+    analyzer = {
+        "pullup": _analyze_pullup,
+        "pushup": _analyze_pushup,
+        "squat": _analyze_squat,
+        "plank": _analyze_plank,
+    }[exercise]
+    try:
+        summary = analyzer(reader, pose_model, settings, report, profiler)
+    finally:
+        reader.release()
+    if seek_index_path is not None:
+        build_seek_index(video_path, reader.fps, reader.frame_count,
+                         getattr(reader, "timestamps", ())).save(seek_index_path)
+    summary["exercise"] = exercise
+    summary["frames_processed"] = report.processed_count
+    summary["fps"] = reader.fps
+    if gate is not None:
+        summary.update(gate.stats(reader.fps, reader.stride))
+    if profiler.enabled:
+        summary["profile"] = profiler.report()
+    return summary
+
+
+def _analyze_pullup(reader, pose_model, settings, report, profiler):
+    counter = PullupRepCounter(fps=reader.fps)
+
+    for frame_idx, frame in profiler.iterate(reader):
+        results = pose_model(frame, verbose=False)
+        with profiler.stage("pose_details"):
+            head_y, shoulder_y, kpts = get_pose_details_pullup(results)
+
+        if head_y is None or shoulder_y is None or kpts is None:
+            continue
+
+        counter.update(frame_idx, head_y, shoulder_y)
+        with profiler.stage("overlay"):
+            debug_frame = draw_debug_overlay_pullup(frame, kpts, head_y, shoulder_y)
+        report(frame_idx, counter.counts(), debug_frame)
+
+    return dict(counter.counts(), reps=counter.reps)
+
+
+def _analyze_pushup(reader, pose_model, settings, report, profiler):
+    flare_threshold = settings["flare_threshold"]
+    counter = PushupRepCounter(flare_threshold, fps=reader.fps)
+
+    for frame_idx, frame in profiler.iterate(reader):
+        results = pose_model(frame, verbose=False)
+        with profiler.stage("pose_details"):
+            current_y, kpts = get_pose_details_pushup(results)
+            current_flare = pushup_flare_angle(kpts) if kpts is not None else 0
+
+        if current_y is None:
+            continue
+
+        counter.update(frame_idx, current_y, current_flare)
+        with profiler.stage("overlay"):
+            debug_frame = draw_debug_overlay_pushup(frame, kpts, current_flare, flare_threshold)
+        report(frame_idx, counter.counts(), debug_frame)
+
+    return dict(counter.counts(), flare_threshold=flare_threshold, reps=counter.reps)
+
+
+def _analyze_squat(reader, pose_model, settings, report, profiler):
+    depth_threshold = settings["depth_threshold"]
+    counter = SquatRepCounter(depth_threshold, fps=reader.fps)
+
+    for frame_idx, frame in profiler.iterate(reader):
+        results = pose_model(frame, verbose=False)
+        with profiler.stage("pose_details"):
+            hip_y, knee_angle, kpts = get_pose_details_squat(results)
+
+        if hip_y is None:
+            continue
+
+        counter.update(frame_idx, hip_y, knee_angle)
+        with profiler.stage("overlay"):
+            debug_frame = draw_debug_overlay_squat(frame, kpts, knee_angle, depth_threshold)
+        report(frame_idx, counter.counts(), debug_frame)
+
+    return dict(counter.counts(), depth_threshold=depth_threshold, reps=counter.reps)
+
+
+def _analyze_plank(reader, pose_model, settings, report, profiler):
+    align_threshold = settings["align_threshold"]
+    timer = PlankTimer(align_threshold, fps=reader.fps)
+
+    for frame_idx, frame in profiler.iterate(reader):
+        results = pose_model(frame, verbose=False)
+        with profiler.stage("pose_details"):
+            hip_angle, kpts = get_pose_details_plank(results)
+        timer.update(frame_idx, hip_angle)
+
+        debug_frame = frame
+        if kpts is not None:
+            with profiler.stage("overlay"):
+                debug_frame = draw_debug_overlay_plank(frame, kpts, hip_angle, align_threshold)
+        report(frame_idx, timer.counts(), debug_frame)
+
+    return dict(timer.counts(), align_threshold=align_threshold)
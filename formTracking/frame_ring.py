@@ -0,0 +1,268 @@
+import multiprocessing as mp
+import queue
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+
+# ---------- Shared-Memory Frame Ring ----------
+
+class SharedFrameRing:
+    """
+    Fixed-size frame slots in one shared-memory block, for handing decoded frames
+    from a decoder process to an inference process without pickling pixels.
+
+    Only small metadata tuples cross process boundaries:
+      free  queue: slot ids the producer may write into
+      ready queue: (slot, frame_idx, shape, timestamp) of published frames, None = end of stream
+    Producer: slot, view = ring.acquire(shape); fill view; ring.publish(slot, frame_idx, shape)
+    Consumer: item = ring.get(); ...use ring.view(slot, shape)...; ring.release(slot)
+
+    The creating process owns the block and must call close() (which unlinks it).
+    Ring objects pickle by name, so they can be passed to multiprocessing workers.
+    """
+
+    def __init__(self, slots=8, max_shape=(1080, 1920, 3), ctx=None):
+        ctx = ctx or mp.get_context("spawn")
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+        self._owner = True
+        self.free = ctx.Queue()
+        self.ready = ctx.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shm"] = self._shm.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        try:
+            self._shm = shared_memory.SharedMemory(name=state["_shm"], track=False)
+        except TypeError:
+            # Python < 3.13 always registers with the resource tracker, which spawned
+            # workers share with the owner, so the owner's unlink still cleans up once.
+            self._shm = shared_memory.SharedMemory(name=state["_shm"])
+
+    def view(self, slot, shape):
+        """uint8 array of `shape` backed by the slot's memory (no copy)."""
+        size = int(np.prod(shape))
+        if size > self.slot_bytes:
+            raise ValueError(f"frame {tuple(shape)} does not fit a {self.max_shape} slot")
+        offset = slot * self.slot_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+
+    def acquire(self, shape, timeout=None):
+        """Blocks until a slot is free; returns (slot, writable view)."""
+        slot = self.free.get(timeout=timeout)
+        return slot, self.view(slot, shape)
+
+    def publish(self, slot, frame_idx, shape, timestamp=None):
+        self.ready.put((slot, frame_idx, tuple(shape), time.time() if timestamp is None else timestamp))
+
+    def finish(self):
+        """Signals end of stream to the consumer."""
+        self.ready.put(None)
+
+    def get(self, timeout=None):
+        """Next (slot, frame_idx, shape, timestamp) tuple, or None at end of stream."""
+        return self.ready.get(timeout=timeout)
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # frame views are still referenced; the mapping goes away with them
+        if self._owner:
+            self._shm.unlink()
+
+
+# ---------- Decoder Workers ----------
+
+def decode_video_to_ring(ring, path, analysis_size, stride):
+    """Decoder process body: decodes a video at the analysis size straight into ring slots."""
+    from video_io import VideoFrameReader
+
+    pending = []
+
+    def alloc(shape):
+        slot, view = ring.acquire(shape)
+        pending.append(slot)
+        return view
+
+    reader = VideoFrameReader(path, analysis_size=analysis_size, stride=stride, alloc=alloc)
+    try:
+        for frame_idx, frame in reader:
+            ring.publish(pending.pop(), frame_idx, frame.shape)
+    finally:
+        # A slot acquired for a read that hit end of stream goes back to the pool.
+        for slot in pending:
+            ring.release(slot)
+        ring.finish()
+
+
+def capture_to_ring(ring, source, stop_event=None, open_capture=None):
+    """
+    Capture process body for live sources (device index or stream URL).
+    Frames are decoded by OpenCV directly into the slot when the slot already has the
+    camera's shape; the first frame decides the shape.
+    open_capture(source), if given, opens the capture instead of cv2.VideoCapture (for
+    example to negotiate the camera's format); it must be picklable.
+    """
+    import cv2
+
+    cap = open_capture(source) if open_capture is not None else cv2.VideoCapture(source)
+    shape = None
+    frame_idx = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if shape is None:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                shape = frame.shape
+                slot, view = ring.acquire(shape)
+                view[...] = frame
+            else:
+                try:
+                    slot, view = ring.acquire(shape, timeout=1.0)
+                except queue.Empty:
+                    continue
+                ok, frame = cap.read(view)
+                if not ok:
+                    ring.release(slot)
+                    break
+                if frame is not view:
+                    view[...] = frame
+            frame_idx += 1
+            ring.publish(slot, frame_idx, shape)
+    finally:
+        cap.release()
+        ring.finish()
+
+
+def ring_frames(ring, proc):
+    """
+    Consumer loop shared by the ring readers: yields (frame_idx, view) and hands the
+    previous slot back to the producer when the next frame is requested.
+    Raises RuntimeError if the producer process dies without finishing the stream.
+    """
+    held = None
+    while True:
+        try:
+            item = ring.get(timeout=1.0)
+        except queue.Empty:
+            if not proc.is_alive():
+                raise RuntimeError(f"frame producer exited with code {proc.exitcode}")
+            continue
+        if held is not None:
+            ring.release(held)
+            held = None
+        if item is None:
+            return
+        slot, frame_idx, shape, _ = item
+        held = slot
+        yield frame_idx, ring.view(slot, shape)
+
+
+class RingCapture:
+    """
+    Live capture (device index or stream URL) running in its own process.
+    Iterating yields BGR frames that are views into shared memory, valid until the next frame.
+    Few slots keep the backlog (and so the display lag) short when inference is slower than the camera.
+    """
+
+    def __init__(self, source, slots=3, max_shape=(1080, 1920, 3), open_capture=None):
+        self.source = source
+        self.open_capture = open_capture
+        self.slots = slots
+        self.max_shape = max_shape
+        self._ring = None
+        self._proc = None
+        self._stop = None
+
+    def __iter__(self):
+        ctx = mp.get_context("spawn")
+        self._ring = SharedFrameRing(slots=self.slots, max_shape=self.max_shape, ctx=ctx)
+        self._stop = ctx.Event()
+        self._proc = ctx.Process(target=capture_to_ring, args=(self._ring, self.source, self._stop, self.open_capture),
+                                 daemon=True)
+        self._proc.start()
+        try:
+            for _, frame in ring_frames(self._ring, self._proc):
+                yield frame
+        finally:
+            self.release()
+
+    def release(self):
+        if self._proc is not None:
+            self._stop.set()
+            self._proc.join(timeout=2.0)
+            if self._proc.is_alive():
+                self._proc.terminate()
+                self._proc.join()
+            self._proc = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+
+class RingVideoReader:
+    """
+    VideoFrameReader that decodes in a separate process and hands frames over through
+    a SharedFrameRing. Same interface as VideoFrameReader, but each yielded frame is a
+    view into shared memory that is recycled on the next iteration. Copy it to keep it.
+    """
+
+    def __init__(self, path, analysis_size=640, display_size=480, stride=1, slots=6):
+        from video_io import VideoFrameReader
+
+        # The probe reader supplies fps, sizes and to_display without decoding the whole file.
+        self._probe = VideoFrameReader(path, analysis_size=analysis_size, display_size=display_size, stride=stride)
+        self.path = path
+        self.stride = self._probe.stride
+        self.fps = self._probe.fps
+        self.frame_count = self._probe.frame_count
+        self.source_size = self._probe.source_size
+        self.analysis_size = self._probe.analysis_size
+        self.analysis_max_side = analysis_size
+        self.slots = slots
+        self._ring = None
+        self._proc = None
+
+    def __iter__(self):
+        if self.analysis_size == (0, 0):
+            return
+        w, h = self.analysis_size
+        ctx = mp.get_context("spawn")
+        self._ring = SharedFrameRing(slots=self.slots, max_shape=(h, w, 3), ctx=ctx)
+        self._proc = ctx.Process(
+            target=decode_video_to_ring,
+            args=(self._ring, self.path, self.analysis_max_side, self.stride),
+            daemon=True,
+        )
+        self._proc.start()
+        try:
+            yield from ring_frames(self._ring, self._proc)
+        finally:
+            self.release()
+
+    def to_display(self, frame):
+        return self._probe.to_display(frame)
+
+    def release(self):
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.join()
+            self._proc = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
@@ -0,0 +1,188 @@
+import bisect
+import math
+from collections import deque
+import numpy as np
+
+
+# ---------- Temporal Smoothing ----------
+
+class OneEuroFilter:
+    """
+    One Euro filter (Casiez et al., CHI 2012) for a scalar signal with irregular timestamps.
+
+    A low-pass filter whose cutoff rises with the signal's speed: slow drifts and single
+    jittery detections are smoothed hard, while fast movement (the middle of a rep) passes
+    with little lag. Timestamps are in seconds, so it works for any frame stride.
+    min_cutoff (Hz) sets smoothing at rest; beta scales how fast the cutoff opens with speed.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.t_prev = None
+        self.x_prev = None
+        self.dx_prev = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def state_dict(self):
+        return {"t_prev": self.t_prev, "x_prev": self.x_prev, "dx_prev": self.dx_prev}
+
+    def load_state_dict(self, state):
+        self.t_prev = state["t_prev"]
+        self.x_prev = state["x_prev"]
+        self.dx_prev = state["dx_prev"]
+
+    def __call__(self, t, x):
+        if x is None:
+            return None
+        if self.t_prev is None or t <= self.t_prev:
+            self.t_prev, self.x_prev, self.dx_prev = t, x, 0.0
+            return x
+
+        dt = t - self.t_prev
+        dx = (x - self.x_prev) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = a_d * dx + (1 - a_d) * self.dx_prev
+
+        cutoff = self.min_cutoff + self.beta * abs(dx_hat)
+        a = self._alpha(cutoff, dt)
+        x_hat = a * x + (1 - a) * self.x_prev
+
+        self.t_prev, self.x_prev, self.dx_prev = t, x_hat, dx_hat
+        return x_hat
+
+
+# ---------- Range Calibration ----------
+
+class PercentileRange:
+    """
+    Robust replacement for the running min/max used to auto-calibrate rep thresholds.
+
+    low/high are the given percentiles of the last `window` samples, so a handful of bad
+    detections cannot stretch the range the way a single outlier stretches min/max, and an
+    early outlier ages out instead of skewing the rest of the video. Memory is bounded by
+    the window; each update is a binary search plus a small in-place insert/remove.
+    """
+
+    def __init__(self, low_pct=5.0, high_pct=95.0, window=300):
+        self.low_pct = low_pct
+        self.high_pct = high_pct
+        self.window = window
+        self._recent = deque()
+        self._sorted = []
+        self.low = None
+        self.high = None
+
+    def _percentile(self, pct):
+        pos = (len(self._sorted) - 1) * pct / 100.0
+        lo = int(pos)
+        hi = min(lo + 1, len(self._sorted) - 1)
+        return self._sorted[lo] + (self._sorted[hi] - self._sorted[lo]) * (pos - lo)
+
+    def update(self, x):
+        x = float(x)
+        self._recent.append(x)
+        bisect.insort(self._sorted, x)
+        if len(self._recent) > self.window:
+            old = self._recent.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self.low = self._percentile(self.low_pct)
+        self.high = self._percentile(self.high_pct)
+        return self.low, self.high
+
+    @property
+    def span(self):
+        return 0.0 if self.low is None else self.high - self.low
+
+    def state_dict(self):
+        return {"recent": list(self._recent), "low": self.low, "high": self.high}
+
+    def load_state_dict(self, state):
+        self._recent = deque(state["recent"])
+        self._sorted = sorted(self._recent)
+        self.low = state["low"]
+        self.high = state["high"]
+
+
+# ---------- Per-Person Arrays ----------
+# Array versions of the filters above for multi-person analysis: one row per tracked
+# person, updated for every person seen in a frame with a single set of numpy operations.
+# Rows that are not in `mask` keep their state. resize() adds rows for new people.
+
+class OneEuroFilterArray:
+    """OneEuroFilter over a vector of independent signals sharing one timestamp."""
+
+    def __init__(self, size=0, min_cutoff=1.0, beta=0.01, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.t_prev = np.full(size, np.nan)
+        self.x_prev = np.full(size, np.nan)
+        self.dx_prev = np.zeros(size)
+
+    def resize(self, size):
+        extra = size - len(self.t_prev)
+        if extra > 0:
+            self.t_prev = np.concatenate([self.t_prev, np.full(extra, np.nan)])
+            self.x_prev = np.concatenate([self.x_prev, np.full(extra, np.nan)])
+            self.dx_prev = np.concatenate([self.dx_prev, np.zeros(extra)])
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, t, x, mask):
+        """Filters x[mask] at time t; returns the filtered values (NaN outside mask)."""
+        out = np.full(len(x), np.nan)
+        restart = mask & ~(self.t_prev < t)  # first sample, or time went backwards
+        self.t_prev[restart], self.x_prev[restart], self.dx_prev[restart] = t, x[restart], 0.0
+        out[restart] = x[restart]
+
+        step = mask & ~restart
+        if step.any():
+            dt = t - self.t_prev[step]
+            dx = (x[step] - self.x_prev[step]) / dt
+            a_d = self._alpha(self.d_cutoff, dt)
+            dx_hat = a_d * dx + (1 - a_d) * self.dx_prev[step]
+            a = self._alpha(self.min_cutoff + self.beta * np.abs(dx_hat), dt)
+            x_hat = a * x[step] + (1 - a) * self.x_prev[step]
+            self.t_prev[step], self.x_prev[step], self.dx_prev[step] = t, x_hat, dx_hat
+            out[step] = x_hat
+        return out
+
+
+class PercentileRangeArray:
+    """PercentileRange per row: low/high percentiles of each row's last `window` samples."""
+
+    def __init__(self, size=0, low_pct=5.0, high_pct=95.0, window=300):
+        self.low_pct = low_pct
+        self.high_pct = high_pct
+        self.window = window
+        self.samples = np.full((size, window), np.nan)
+        self.pos = np.zeros(size, dtype=np.int64)
+
+    def resize(self, size):
+        extra = size - len(self.samples)
+        if extra > 0:
+            self.samples = np.concatenate([self.samples, np.full((extra, self.window), np.nan)])
+            self.pos = np.concatenate([self.pos, np.zeros(extra, dtype=np.int64)])
+
+    def update(self, x, mask):
+        """Adds x[mask]; returns (low, high) arrays (NaN outside mask)."""
+        low = np.full(len(x), np.nan)
+        high = np.full(len(x), np.nan)
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            self.samples[rows, self.pos[rows] % self.window] = x[rows]
+            self.pos[rows] += 1
+            low[rows], high[rows] = np.nanpercentile(self.samples[rows], [self.low_pct, self.high_pct], axis=1)
+        return low, high
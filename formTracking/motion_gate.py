@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+
+# ---------- Motion Pre-filter ----------
+
+class MotionGatedModel:
+    """
+    Wraps a pose model and skips inference on idle stretches of video.
+
+    Every sampled frame is shrunk to a 64 px wide grayscale thumbnail and compared
+    with the previous sample; the score is the fraction of thumbnail pixels that
+    changed by more than `pixel_delta`. After `idle_after` consecutive samples below
+    `threshold` the clip counts as idle and inference is skipped until motion returns
+    (idle samples whose position in the video is a multiple of `refresh_every` are still
+    inferred, as a refresh). The first still samples are always inferred, so the pause at
+    the top or bottom of a rep is never missed.
+
+    Whether a sample is skipped depends only on the idle_after + 1 samples before it. A
+    run that starts mid-video sets `position` to the number of samples before its first
+    one and feeds the preceding idle_after + 1 samples to warm_up(); it then skips exactly
+    the frames a run from the start would skip.
+
+    Skipped frames return an empty result, which the analysers treat like a frame with
+    nobody detected. With reuse_last=True (planks, where holding still is the point)
+    they return the last inferred result instead.
+    """
+
+    def __init__(self, model, threshold=0.01, pixel_delta=12, idle_after=3, refresh_every=25,
+                 reuse_last=False, width=64):
+        self.model = model
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.idle_after = idle_after
+        self.refresh_every = refresh_every
+        self.reuse_last = reuse_last
+        self.width = width
+        self.sampled = 0
+        self.inferred = 0
+        self.position = 0  # samples seen since the start of the video, warm-up included
+        self._prev = None
+        self._still_samples = 0
+        self._last_results = []
+
+    @property
+    def skipped(self):
+        return self.sampled - self.inferred
+
+    def motion_score(self, frame):
+        """Fraction of thumbnail pixels that changed since the previous sample (1.0 for the first)."""
+        h = max(1, int(round(frame.shape[0] * self.width / frame.shape[1])))
+        small = cv2.cvtColor(cv2.resize(frame, (self.width, h), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        prev, self._prev = self._prev, small
+        if prev is None:
+            return 1.0
+        return float(np.count_nonzero(cv2.absdiff(small, prev) > self.pixel_delta)) / small.size
+
+    def _observe(self, frame):
+        self.position += 1
+        if self.motion_score(frame) < self.threshold:
+            self._still_samples = min(self._still_samples + 1, self.idle_after + 1)
+        else:
+            self._still_samples = 0
+
+    def warm_up(self, frame):
+        """Feeds a sample from before the analysed range: updates the motion state, infers nothing."""
+        self._observe(frame)
+
+    def __call__(self, frame, **kwargs):
+        self.sampled += 1
+        self._observe(frame)
+        if self._still_samples > self.idle_after and self.position % self.refresh_every != 0:
+            return self._last_results if self.reuse_last else []
+
+        self.inferred += 1
+        self._last_results = self.model(frame, **kwargs)
+        return self._last_results
+
+    def stats(self, fps, stride):
+        """Skipped video time (seconds) and the inference speedup over running every sample."""
+        return {
+            "skipped_time": self.skipped * stride / fps,
+            "inference_speedup": self.sampled / self.inferred if self.inferred else 1.0,
+        }
@@ -0,0 +1,448 @@
+import cv2
+import numpy as np
+from form_analysis import DEFAULT_SETTINGS, DISPLAY_EVERY, EXERCISES, FRAME_STRIDE, THRESHOLD_KEYS
+from frame_ring import RingVideoReader
+from keypoint_filters import OneEuroFilterArray, PercentileRangeArray
+from motion_gate import MotionGatedModel
+from pose_backends import pose_arrays
+from video_io import VideoFrameReader
+
+
+# ---------- Identity Tracking ----------
+
+def box_iou(a, b):
+    """Pairwise IoU of (M, 4) and (N, 4) xyxy boxes -> (M, N)."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class IoUTracker:
+    """
+    Greedy IoU association of person boxes between analysed frames.
+    Ids are consecutive integers, so they double as row indices into per-person state
+    arrays. A track survives `max_missed` frames without a match (occlusion, a missed
+    detection) before its id is retired.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=10):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.boxes = np.zeros((0, 4))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.next_id = 0
+
+    def update(self, xyxy):
+        """Returns the track id of each detection in xyxy."""
+        det_ids = np.full(len(xyxy), -1, dtype=np.int64)
+        matched_tracks = np.zeros(len(self.ids), dtype=bool)
+        if len(self.ids) and len(xyxy):
+            iou = box_iou(self.boxes, xyxy)
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, d = divmod(int(flat), len(xyxy))
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if matched_tracks[t] or det_ids[d] >= 0:
+                    continue
+                matched_tracks[t] = True
+                det_ids[d] = self.ids[t]
+                self.boxes[t] = xyxy[d]
+
+        self.missed[matched_tracks] = 0
+        self.missed[~matched_tracks] += 1
+        keep = self.missed <= self.max_missed
+        self.boxes, self.ids, self.missed = self.boxes[keep], self.ids[keep], self.missed[keep]
+
+        new = det_ids < 0
+        det_ids[new] = np.arange(self.next_id, self.next_id + new.sum())
+        self.next_id += int(new.sum())
+        self.boxes = np.concatenate([self.boxes, xyxy[new]])
+        self.ids = np.concatenate([self.ids, det_ids[new]])
+        self.missed = np.concatenate([self.missed, np.zeros(new.sum(), dtype=np.int64)])
+        return det_ids
+
+
+# ---------- Vectorized Pose Signals ----------
+# (N, 17, 2) keypoints for every detected person -> one value per person, NaN when the
+# joints are not visible. Same definitions as the get_pose_details_* helpers.
+
+def _visible(xy):
+    return (xy != 0).all(axis=2)
+
+
+def _mean_y(xy, visible, idx):
+    ys = np.where(visible[:, idx], xy[:, idx, 1], 0.0)
+    count = visible[:, idx].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, ys.sum(axis=1) / count, np.nan)
+
+
+def _midpoint(xy, visible, left, right):
+    pair = xy[:, [left, right]]
+    seen = visible[:, [left, right]]
+    count = seen.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mid = (pair * seen[:, :, None]).sum(axis=1) / count[:, None]
+    mid[count == 0] = np.nan
+    return mid
+
+
+def _angles(a, b, c):
+    """Angle at b in degrees for (N, 2) point arrays; NaN where a point is missing or degenerate."""
+    ba, bc = a - b, c - b
+    norms = np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = np.clip((ba * bc).sum(axis=1) / norms, -1.0, 1.0)
+    angle = np.degrees(np.arccos(cosine))
+    angle[norms == 0] = np.nan
+    return angle
+
+
+def _side_angles(xy, visible, triples):
+    """Per-person mean of the given joint-triple angles over the sides where all three joints are visible."""
+    total = np.zeros(len(xy))
+    count = np.zeros(len(xy))
+    for a, b, c in triples:
+        angle = _angles(xy[:, a], xy[:, b], xy[:, c])
+        ok = visible[:, [a, b, c]].all(axis=1) & ~np.isnan(angle)
+        total += np.where(ok, angle, 0.0)
+        count += ok
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan), count
+
+
+def pose_signals(exercise, xy):
+    """Dict of per-person signal arrays for the exercise's state machine."""
+    visible = _visible(xy)
+    if exercise == "pullup":
+        head_y = np.where(visible[:, 0], xy[:, 0, 1], np.nan)
+        return {"head_y": head_y, "shoulder_y": _mean_y(xy, visible, [5, 6])}
+    if exercise == "pushup":
+        torso_y = _mean_y(xy, visible, [5, 6, 7, 8, 11, 12])
+        # Same as pushup_flare_angle: sides at 10 degrees or less do not count.
+        left = _angles(xy[:, 11], xy[:, 5], xy[:, 7])
+        right = _angles(xy[:, 12], xy[:, 6], xy[:, 8])
+        sides = np.stack([left, right], axis=1)
+        ok = np.stack([visible[:, [11, 5, 7]].all(axis=1), visible[:, [12, 6, 8]].all(axis=1)], axis=1)
+        ok &= np.nan_to_num(sides) > 10
+        count = ok.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            flare = np.where(count > 0, np.where(ok, sides, 0.0).sum(axis=1) / count, 0.0)
+        return {"torso_y": torso_y, "flare": flare}
+    if exercise == "squat":
+        knee_angle, _ = _side_angles(xy, visible, [(11, 13, 15), (12, 14, 16)])
+        return {"hip_y": _mean_y(xy, visible, [11, 12]), "knee_angle": knee_angle}
+    shoulder = _midpoint(xy, visible, 5, 6)
+    hip = _midpoint(xy, visible, 11, 12)
+    ankle = _midpoint(xy, visible, 15, 16)
+    return {"hip_angle": _angles(shoulder, hip, ankle)}
+
+
+# ---------- Vectorized Rep State Machines ----------
+# Array versions of the rep_counters state machines: row i holds track i. One update()
+# advances every person seen in the frame with masked numpy operations; the thresholds,
+# smoothing and calibration match the single-person counters.
+
+class _GroupCounter:
+    _FIELDS = {}  # name -> (dtype, initial value)
+
+    def __init__(self, fps, window=300):
+        self.fps = fps
+        self.size = 0
+        self.filters = {}
+        self.calib = PercentileRangeArray(window=window)
+        for name, (dtype, value) in self._FIELDS.items():
+            setattr(self, name, np.full(0, value, dtype=dtype))
+        self.frames_seen = np.zeros(0, dtype=np.int64)
+
+    def _filter(self, name):
+        if name not in self.filters:
+            self.filters[name] = OneEuroFilterArray(self.size)
+        return self.filters[name]
+
+    def resize(self, size):
+        if size <= self.size:
+            return
+        extra = size - self.size
+        for name, (dtype, value) in self._FIELDS.items():
+            setattr(self, name, np.concatenate([getattr(self, name), np.full(extra, value, dtype=dtype)]))
+        self.frames_seen = np.concatenate([self.frames_seen, np.zeros(extra, dtype=np.int64)])
+        for f in self.filters.values():
+            f.resize(size)
+        self.calib.resize(size)
+        self.size = size
+
+    def _scatter(self, ids, values):
+        """Per-detection values -> per-track array (NaN for tracks not in this frame)."""
+        out = np.full(self.size, np.nan)
+        out[ids] = values
+        return out
+
+    def _smooth(self, name, frame_idx, values, mask):
+        return self._filter(name)(frame_idx / self.fps, values, mask)
+
+
+class GroupPullupCounter(_GroupCounter):
+    _FIELDS = {"up": (bool, False), "chin_above_bar": (bool, False),
+               "good_count": (np.int64, 0), "total_reps": (np.int64, 0)}
+
+    def update(self, frame_idx, ids, signals):
+        self.resize(int(ids.max()) + 1 if len(ids) else 0)
+        head_y = self._scatter(ids, signals["head_y"])
+        shoulder_y = self._scatter(ids, signals["shoulder_y"])
+        m = ~np.isnan(head_y) & ~np.isnan(shoulder_y)
+        self.frames_seen += m
+        head_y = self._smooth("head", frame_idx, head_y, m)
+        shoulder_y = self._smooth("shoulder", frame_idx, shoulder_y, m)
+        low, high = self.calib.update(head_y, m)
+        span = high - low
+        top = np.where(span > 0, low + 0.3 * span, low)
+        bottom = np.where(span > 0, low + 0.7 * span, high)
+
+        start = m & ~self.up & (head_y < top)
+        self.up |= start
+        self.chin_above_bar &= ~start
+        active = m & self.up
+        self.chin_above_bar |= active & (head_y < shoulder_y)
+        done = active & (head_y > bottom)
+        self.up &= ~done
+        self.total_reps += done
+        self.good_count += done & self.chin_above_bar
+        return done
+
+    def people(self):
+        return [{"good_count": int(g), "total_reps": int(t)} for g, t in zip(self.good_count, self.total_reps)]
+
+
+class GroupPushupCounter(_GroupCounter):
+    _FIELDS = {"down": (bool, False), "good_count": (np.int64, 0), "bad_count": (np.int64, 0)}
+    MAX_REP_SAMPLES = 64  # flare samples kept per rep for the median (a rep is a few dozen samples at most)
+
+    def __init__(self, flare_threshold, fps, window=300):
+        super().__init__(fps, window)
+        self.flare_threshold = flare_threshold
+        self.rep_angles = np.full((0, self.MAX_REP_SAMPLES), np.nan)
+        self.rep_samples = np.zeros(0, dtype=np.int64)
+
+    def resize(self, size):
+        extra = size - self.size
+        if extra > 0:
+            self.rep_angles = np.concatenate([self.rep_angles, np.full((extra, self.MAX_REP_SAMPLES), np.nan)])
+            self.rep_samples = np.concatenate([self.rep_samples, np.zeros(extra, dtype=np.int64)])
+        super().resize(size)
+
+    def update(self, frame_idx, ids, signals):
+        self.resize(int(ids.max()) + 1 if len(ids) else 0)
+        torso_y = self._scatter(ids, signals["torso_y"])
+        flare = self._scatter(ids, signals["flare"])
+        m = ~np.isnan(torso_y)
+        self.frames_seen += m
+        torso_y = self._smooth("torso", frame_idx, torso_y, m)
+        low, high = self.calib.update(torso_y, m)
+        span = high - low
+
+        start = m & ~self.down & (torso_y > low + 0.6 * span)
+        self.down |= start
+        self.rep_angles[start] = np.nan
+        self.rep_samples[start] = 0
+        active = m & self.down
+        rows = np.flatnonzero(active & (flare > 0))
+        self.rep_angles[rows, self.rep_samples[rows] % self.MAX_REP_SAMPLES] = flare[rows]
+        self.rep_samples[rows] += 1
+
+        done = active & (torso_y < low + 0.3 * span)
+        self.down &= ~done
+        scored = np.flatnonzero(done & (self.rep_samples > 0))
+        if len(scored):
+            bad = np.nanmedian(self.rep_angles[scored], axis=1) > self.flare_threshold
+            self.bad_count[scored[bad]] += 1
+            self.good_count[scored[~bad]] += 1
+        return done
+
+    def people(self):
+        return [{"good_count": int(g), "bad_count": int(b)} for g, b in zip(self.good_count, self.bad_count)]
+
+
+class GroupSquatCounter(_GroupCounter):
+    _FIELDS = {"down": (bool, False), "bottom_angle": (float, np.inf),
+               "good_count": (np.int64, 0), "total_reps": (np.int64, 0), "shallow_reps": (np.int64, 0)}
+
+    def __init__(self, depth_threshold, fps, window=300):
+        super().__init__(fps, window)
+        self.depth_threshold = depth_threshold
+
+    def update(self, frame_idx, ids, signals):
+        self.resize(int(ids.max()) + 1 if len(ids) else 0)
+        hip_y = self._scatter(ids, signals["hip_y"])
+        knee_angle = self._scatter(ids, signals["knee_angle"])
+        m = ~np.isnan(hip_y)
+        self.frames_seen += m
+        hip_y = self._smooth("hip", frame_idx, hip_y, m)
+        low, high = self.calib.update(hip_y, m)
+        span = high - low
+
+        start = m & ~self.down & (hip_y > low + 0.55 * span)
+        self.down |= start
+        self.bottom_angle[start] = np.inf
+        active = m & self.down
+        knee_ok = active & (np.nan_to_num(knee_angle) > 10)
+        self.bottom_angle[knee_ok] = np.minimum(self.bottom_angle[knee_ok], knee_angle[knee_ok])
+
+        done = active & (hip_y < low + 0.35 * span)
+        self.down &= ~done
+        scored = done & np.isfinite(self.bottom_angle)
+        deep = scored & (self.bottom_angle <= self.depth_threshold)
+        self.total_reps += deep
+        self.good_count += deep
+        self.shallow_reps += scored & ~deep
+        return done
+
+    def people(self):
+        return [{"good_count": int(g), "total_reps": int(t), "shallow_reps": int(s)}
+                for g, t, s in zip(self.good_count, self.total_reps, self.shallow_reps)]
+
+
+class GroupPlankTimer(_GroupCounter):
+    _FIELDS = {"total_time": (float, 0.0), "good_align_time": (float, 0.0)}
+
+    def __init__(self, align_threshold, fps, window=300):
+        super().__init__(fps, window)
+        self.align_threshold = align_threshold
+        self.last_frame = 0
+
+    def update(self, frame_idx, ids, signals):
+        self.resize(int(ids.max()) + 1 if len(ids) else 0)
+        elapsed = (frame_idx - self.last_frame) / self.fps
+        self.last_frame = frame_idx
+        hip_angle = self._scatter(ids, signals["hip_angle"])
+        present = np.zeros(self.size, dtype=bool)
+        present[ids] = True
+        self.frames_seen += present
+        self.total_time += present * elapsed
+        self.good_align_time += (np.abs(np.nan_to_num(hip_angle) - 180.0) <= self.align_threshold) * elapsed
+        return np.zeros(self.size, dtype=bool)
+
+    def people(self):
+        return [{"total_time": float(t), "good_align_time": float(g)}
+                for t, g in zip(self.total_time, self.good_align_time)]
+
+
+def make_group_counter(exercise, settings, fps):
+    if exercise == "pullup":
+        return GroupPullupCounter(fps)
+    if exercise == "pushup":
+        return GroupPushupCounter(settings["flare_threshold"], fps)
+    if exercise == "squat":
+        return GroupSquatCounter(settings["depth_threshold"], fps)
+    return GroupPlankTimer(settings["align_threshold"], fps)
+
+
+def form_score(exercise, person):
+    """Share of good reps (or of hold time in good alignment), None before the first rep."""
+    if exercise == "plank":
+        total, good = person["total_time"], person["good_align_time"]
+    elif exercise == "pushup":
+        total, good = person["good_count"] + person["bad_count"], person["good_count"]
+    elif exercise == "squat":
+        total, good = person["total_reps"] + person["shallow_reps"], person["good_count"]
+    else:
+        total, good = person["total_reps"], person["good_count"]
+    return round(good / total, 3) if total else None
+
+
+# ---------- Group Video Analysis ----------
+
+def draw_group_overlay(frame, xyxy, ids, people, exercise):
+    """Box and running count per tracked person."""
+    for box, pid in zip(xyxy.astype(int), ids):
+        person = people[pid]
+        if exercise == "plank":
+            label = f"#{pid + 1} {person['good_align_time']:.0f}s/{person['total_time']:.0f}s"
+        elif exercise == "pushup":
+            label = f"#{pid + 1} good {person['good_count']} bad {person['bad_count']}"
+        else:
+            label = f"#{pid + 1} good {person['good_count']}/{person['total_reps']}"
+        cv2.rectangle(frame, tuple(box[:2]), tuple(box[2:]), (255, 255, 0), 2)
+        cv2.putText(frame, label, (box[0], max(15, box[1] - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+    return frame
+
+
+def analyze_group_video(video_path, exercise, settings, model, on_progress=None, min_conf=0.5, min_frames=5):
+    """
+    Multi-person version of analyze_video: one inference pass per analysed frame, every
+    person kept, identities linked by IoUTracker and all tracks advanced together.
+    The summary's "people" list holds per-person counts and a form score; tracks seen in
+    fewer than `min_frames` analysed frames (passers-by, false detections) are dropped.
+    Top-level counts are totals over people, so progress and summaries keep their keys.
+    """
+    if exercise not in EXERCISES:
+        raise ValueError(f"Unknown exercise: {exercise}")
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    pose_model = model
+    gate = None
+    if settings["skip_idle"]:
+        # Idle frames hand back the last detections, so the tracker keeps everyone's identity
+        # through a rest between sets instead of retiring every track after max_missed frames.
+        gate = pose_model = MotionGatedModel(model, reuse_last=True)
+    reader_cls = RingVideoReader if settings["decode_process"] else VideoFrameReader
+    reader = reader_cls(video_path, stride=FRAME_STRIDE[exercise] * int(settings["stride_scale"]))
+    tracker = IoUTracker()
+    counter = make_group_counter(exercise, settings, reader.fps)
+    processed = 0
+
+    try:
+        for frame_idx, frame in reader:
+            arrays = pose_arrays(pose_model(frame, verbose=False))
+            if arrays is None:
+                xy, conf, xyxy = np.zeros((0, 17, 2)), np.zeros(0), np.zeros((0, 4))
+            else:
+                xy, conf, xyxy = arrays
+                keep = conf >= min_conf
+                xy, xyxy = xy[keep], xyxy[keep]
+            ids = tracker.update(np.asarray(xyxy, dtype=float))
+            counter.update(frame_idx, ids, pose_signals(exercise, np.asarray(xy, dtype=float)))
+            processed += 1
+
+            if on_progress is not None:
+                people = counter.people()
+                preview = None
+                if processed % DISPLAY_EVERY == 1:
+                    preview = reader.to_display(draw_group_overlay(frame, xyxy, ids, people, exercise))
+                progress = _totals(exercise, people)
+                progress["people"] = int(len(ids))
+                progress["frame_idx"] = frame_idx
+                progress["frame_count"] = reader.frame_count
+                progress["fraction"] = min(1.0, frame_idx / reader.frame_count) if reader.frame_count else 0.0
+                on_progress(progress, preview)
+    finally:
+        reader.release()
+
+    people = []
+    for pid, person in enumerate(counter.people()):
+        if counter.frames_seen[pid] < min_frames:
+            continue
+        person.update(person=pid + 1, frames_seen=int(counter.frames_seen[pid]),
+                      form_score=form_score(exercise, person))
+        people.append(person)
+    summary = _totals(exercise, people)
+    for key in THRESHOLD_KEYS[exercise]:
+        summary[key] = settings[key]
+    summary.update(exercise=exercise, people=people, frames_processed=processed, fps=reader.fps)
+    if gate is not None:
+        summary.update(gate.stats(reader.fps, reader.stride))
+    return summary
+
+
+_TOTAL_KEYS = {"pullup": ("good_count", "total_reps"), "pushup": ("good_count", "bad_count"),
+               "squat": ("good_count", "total_reps"), "plank": ("total_time", "good_align_time")}
+
+
+def _totals(exercise, people):
+    """Group-wide counts under the single-person keys: rep counts add up, plank times take the longest hold."""
+    if exercise == "plank":
+        return {key: max((person[key] for person in people), default=0.0) for key in _TOTAL_KEYS[exercise]}
+    return {key: sum(person[key] for person in people) for key in _TOTAL_KEYS[exercise]}
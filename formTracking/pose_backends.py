@@ -0,0 +1,246 @@
+import json
+import socket
+import struct
+import threading
+import numpy as np
+
+
+# ---------- Pose Results ----------
+
+class PoseDetections:
+    """
+    Numpy-backed pose result for one frame.
+    xy: (N, 17, 2) COCO keypoints, conf: (N,) person scores, xyxy: (N, 4) boxes.
+    Backends that post-process ultralytics output (ROI crops, remote inference)
+    return a list holding one of these in place of the ultralytics results.
+    """
+
+    def __init__(self, xy, conf, xyxy):
+        self.xy = np.asarray(xy, dtype=np.float32).reshape(-1, 17, 2)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.conf)
+
+
+def _as_numpy(values):
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def pose_arrays(results):
+    """
+    Returns (xy, conf, xyxy) numpy arrays for the first result, or None when nobody was detected.
+    Accepts ultralytics results or a list holding a PoseDetections.
+    """
+    if results is None or len(results) == 0:
+        return None
+
+    r = results[0]
+    if isinstance(r, PoseDetections):
+        if len(r) == 0:
+            return None
+        return r.xy, r.conf, r.xyxy
+
+    if r.keypoints is None or r.keypoints.xy is None:
+        return None
+
+    xy = _as_numpy(r.keypoints.xy)
+    if xy.shape[0] == 0:
+        return None
+
+    dets = r.boxes
+    if dets is None or len(dets) == 0:
+        return None
+
+    return xy, _as_numpy(dets.conf), _as_numpy(dets.xyxy)
+
+
+def main_person_keypoints(results):
+    """Keypoints (17, 2) of the highest-confidence person, or None."""
+    arrays = pose_arrays(results)
+    if arrays is None:
+        return None
+    xy, conf, _ = arrays
+    return xy[int(conf.argmax())]
+
+
+def keypoints_as_results(kpts):
+    """Wraps one person's (17, 2) keypoints (or None) as a result the get_pose_details_* helpers accept."""
+    if kpts is None:
+        return []
+    return [PoseDetections(kpts[None], [1.0], [[0, 0, 0, 0]])]
+
+
+# ---------- Person ROI Tracking ----------
+
+class PersonROITracker:
+    """
+    Wraps a pose model so follow-up frames run on a crop around the athlete.
+
+    After a confident full-frame detection, the next inference runs on the last
+    bounding box padded by `pad` (fraction of box size) at `crop_imgsz`, and the
+    keypoints are shifted back to full-frame coordinates. When the crop loses the
+    person, the same frame is re-run on the full frame and tracking restarts.
+    Call it exactly like the model: `results = tracker(frame, verbose=False)`.
+    """
+
+    def __init__(self, model, min_conf=0.5, pad=0.35, crop_imgsz=320, min_crop=96):
+        self.model = model
+        self.min_conf = min_conf
+        self.pad = pad
+        self.crop_imgsz = crop_imgsz
+        self.min_crop = min_crop
+        self.roi = None
+        self.crop_frames = 0
+        self.full_frames = 0
+
+    def reset(self):
+        self.roi = None
+
+    def __call__(self, frame, **kwargs):
+        kwargs.setdefault("verbose", False)
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            crop = frame[y0:y1, x0:x1]
+            results = self.model(crop, imgsz=self.crop_imgsz, **kwargs)
+            arrays = pose_arrays(results)
+            if arrays is not None and float(arrays[1].max()) >= self.min_conf:
+                xy, conf, xyxy = arrays
+                detections = self._to_full_frame(xy, conf, xyxy, x0, y0)
+                self._update_roi(detections.xyxy[int(detections.conf.argmax())], frame.shape)
+                self.crop_frames += 1
+                return [detections]
+            # Person lost inside the crop: fall back to the full frame below.
+            self.roi = None
+
+        results = self.model(frame, **kwargs)
+        self.full_frames += 1
+        arrays = pose_arrays(results)
+        if arrays is not None and float(arrays[1].max()) >= self.min_conf:
+            _, conf, xyxy = arrays
+            self._update_roi(xyxy[int(conf.argmax())], frame.shape)
+        return results
+
+    def _to_full_frame(self, xy, conf, xyxy, x0, y0):
+        xy = np.array(xy, dtype=np.float32)
+        # Undetected keypoints are reported as (0, 0); keep them at zero after the shift.
+        missing = (xy[..., 0] == 0) | (xy[..., 1] == 0)
+        xy[..., 0] += x0
+        xy[..., 1] += y0
+        xy[missing] = 0
+        xyxy = np.array(xyxy, dtype=np.float32)
+        xyxy[:, [0, 2]] += x0
+        xyxy[:, [1, 3]] += y0
+        return PoseDetections(xy, conf, xyxy)
+
+    def _update_roi(self, box, frame_shape):
+        frame_h, frame_w = frame_shape[:2]
+        bx0, by0, bx1, by1 = [float(v) for v in box]
+        pad_x = max((bx1 - bx0) * self.pad, self.min_crop / 2)
+        pad_y = max((by1 - by0) * self.pad, self.min_crop / 2)
+        x0 = int(max(0, bx0 - pad_x))
+        y0 = int(max(0, by0 - pad_y))
+        x1 = int(min(frame_w, bx1 + pad_x))
+        y1 = int(min(frame_h, by1 + pad_y))
+        # A crop covering most of the frame saves nothing; stay on the full frame.
+        if (x1 - x0) * (y1 - y0) > 0.8 * frame_w * frame_h:
+            self.roi = None
+        else:
+            self.roi = (x0, y0, x1, y1)
+
+
+# ---------- Remote Pose Inference ----------
+# Wire format shared with pose_server.py. Every message is a 4-byte big-endian header
+# length, a JSON header, then header["nbytes"] bytes of raw payload.
+
+def parse_address(address):
+    """'unix:/path/to.sock' -> (AF_UNIX, path); 'host:port' -> (AF_INET, (host, port))."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def send_message(sock, header, payload=b""):
+    header = dict(header, nbytes=len(payload))
+    data = json.dumps(header).encode()
+    sock.sendall(struct.pack("!I", len(data)) + data)
+    if len(payload):
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if k == 0:
+            raise ConnectionError("pose server closed the connection")
+        got += k
+    return buf
+
+
+def recv_message(sock):
+    (size,) = struct.unpack("!I", _recv_exact(sock, 4))
+    header = json.loads(bytes(_recv_exact(sock, size)))
+    payload = _recv_exact(sock, header["nbytes"]) if header["nbytes"] else bytearray()
+    return header, payload
+
+
+def encode_detections(detections):
+    payload = b"".join([detections.xy.tobytes(), detections.conf.tobytes(), detections.xyxy.tobytes()])
+    return {"n": len(detections)}, payload
+
+
+def decode_detections(header, payload):
+    n = header["n"]
+    values = np.frombuffer(payload, dtype=np.float32)
+    xy = values[:n * 34]
+    conf = values[n * 34:n * 35]
+    xyxy = values[n * 35:n * 39]
+    return PoseDetections(xy, conf, xyxy)
+
+
+class RemotePoseModel:
+    """
+    Drop-in replacement for the YOLO model that sends frames to pose_server.py.
+    `model(frame, verbose=False)` returns [PoseDetections]. Each calling thread keeps
+    its own connection, so one instance can be shared by the analysis worker pool.
+    """
+
+    def __init__(self, address, timeout=30.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        family, addr = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(addr)
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        return sock
+
+    def __call__(self, frame, verbose=False, imgsz=None):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        header = {"shape": list(frame.shape), "imgsz": imgsz}
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                send_message(sock, header, memoryview(frame).cast("B"))
+                reply, payload = recv_message(sock)
+                break
+            except (ConnectionError, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt == 1:
+                    raise
+        if reply.get("error"):
+            raise RuntimeError(f"pose server error: {reply['error']}")
+        return [decode_detections(reply, payload)]
@@ -0,0 +1,176 @@
+"""
+Local pose inference server.
+
+Owns a single yolov8n-pose model and serves keypoints to every Streamlit session
+(and any other local client) over a Unix socket or localhost TCP. Frames arriving
+from concurrent connections within a short window are run as one batch.
+
+    python pose_server.py --listen unix:/tmp/trainr-pose.sock
+    TRAINR_POSE_SERVER=unix:/tmp/trainr-pose.sock streamlit run unified_form_tracker.py
+"""
+import argparse
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import numpy as np
+from pose_backends import PoseDetections, encode_detections, parse_address, pose_arrays, recv_message, send_message
+
+
+# ---------- Dynamic Batching ----------
+
+class _Request:
+    __slots__ = ("frame", "imgsz", "result", "error", "done")
+
+    def __init__(self, frame, imgsz):
+        self.frame = frame
+        self.imgsz = imgsz
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingPoseModel:
+    """
+    Collects single-frame requests from many threads into batched model calls.
+    A batch closes when it holds max_batch frames or max_wait_ms after its first frame arrived.
+    Frames that asked for different input sizes (e.g. ROI crops) are batched separately.
+    """
+
+    def __init__(self, model, max_batch=16, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.frames = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="pose-batcher", daemon=True)
+        self._thread.start()
+
+    def infer(self, frame, imgsz=None):
+        request = _Request(frame, imgsz)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.imgsz, []).append(request)
+            for imgsz, requests in groups.items():
+                self._run(imgsz, requests)
+
+    def _run(self, imgsz, requests):
+        kwargs = {"verbose": False}
+        if imgsz:
+            kwargs["imgsz"] = imgsz
+        try:
+            results = self.model([r.frame for r in requests], **kwargs)
+            for request, result in zip(requests, results):
+                arrays = pose_arrays([result])
+                if arrays is None:
+                    request.result = PoseDetections(np.zeros((0, 17, 2)), np.zeros(0), np.zeros((0, 4)))
+                else:
+                    request.result = PoseDetections(*arrays)
+        except Exception as exc:
+            for request in requests:
+                request.error = exc
+        self.batches += 1
+        self.frames += len(requests)
+        for request in requests:
+            request.done.set()
+
+
+# ---------- Socket Server ----------
+
+class _PoseRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                frame = np.frombuffer(payload, dtype=np.uint8).reshape(header["shape"])
+                detections = batcher.infer(frame, header.get("imgsz"))
+                reply, out = encode_detections(detections)
+            except Exception as exc:
+                reply, out = {"n": 0, "error": str(exc)}, b""
+            try:
+                send_message(self.request, reply, out)
+            except OSError:
+                return
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().server_bind()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(address, batcher):
+    """Creates a threaded socket server for 'unix:/path' or 'host:port' bound to the batcher."""
+    family, addr = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(addr):
+            os.unlink(addr)
+        server = _UnixServer(addr, _PoseRequestHandler)
+    else:
+        server = _TCPServer(addr, _PoseRequestHandler)
+    server.batcher = batcher
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve YOLO pose keypoints to local analysis sessions.")
+    parser.add_argument("--listen", default="unix:/tmp/trainr-pose.sock",
+                        help="unix:/path/to.sock or host:port (default: %(default)s)")
+    parser.add_argument("--weights", default="yolov8n-pose.pt")
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="How long the first frame of a batch waits for company")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    batcher = BatchingPoseModel(YOLO(args.weights), max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    server = make_server(args.listen, batcher)
+    print(f"Pose server listening on {args.listen} (batch <= {args.max_batch}, wait {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.listen.startswith("unix:") and os.path.exists(args.listen[len("unix:"):]):
+            os.unlink(args.listen[len("unix:"):])
+        if batcher.batches:
+            print(f"Served {batcher.frames} frames in {batcher.batches} batches "
+                  f"(avg {batcher.frames / batcher.batches:.1f} frames/batch)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import bisect
+import math
+from form_analysis import (
+    DEFAULT_SETTINGS, DISPLAY_EVERY, EXERCISES, FRAME_STRIDE, THRESHOLD_KEYS,
+    analyze_video, feed_rep_counter, get_pose_details_plank, get_pose_details_pullup, get_pose_details_pushup, get_pose_details_squat,
+)
+from pose_backends import PersonROITracker, keypoints_as_results, main_person_keypoints
+from rep_counters import make_rep_counter
+from seek_index import probe_keyframes
+from stage_profiler import StageProfiler
+from video_io import VideoFrameReader
+
+
+# ---------- Coarse-to-Fine Sampling ----------
+# A first pass infers about one frame per second and replays it through the rep counter,
+# which gives provisional totals within seconds. Each refinement pass halves the sample
+# gap, but only inside intervals that still matter: where the exercise signal moves a lot
+# across the neighbouring samples, next to a rep boundary, where the person appears or
+# disappears, and (planks) where alignment flips. Every sample sits on the uniform
+# analysis grid (multiples of the exercise stride), so the finished run never infers a
+# frame the uniform pass would not have, and idle stretches stay at the coarse rate.
+# Reaching a sample means decoding every frame since the last one (or since the keyframe
+# the decoder seeks to), so when the keyframes are known the coarse samples are moved to
+# the first grid frame after a nearby keyframe.
+
+COARSE_SECONDS = 1.0
+MOTION_FRACTION = 0.25  # refine where nearby samples spread over more than this share of the signal range
+
+
+def pass_gaps(fps, stride, coarse_seconds=COARSE_SECONDS):
+    """Sample gaps (in frames) of each pass, coarsest first: stride * 2^k down to stride."""
+    levels = max(0, int(round(math.log2(max(1.0, fps * coarse_seconds / stride)))))
+    return [stride * 2 ** k for k in range(levels, -1, -1)]
+
+
+def snap_to_keyframes(frames, keyframes, stride, gap):
+    """
+    Moves each frame to the first multiple of stride at or after the last keyframe within
+    half a gap before it, so it is reached by a seek plus at most stride decoded frames.
+    Frames without a keyframe that close stay where they are.
+    """
+    snapped = set()
+    for frame_idx in frames:
+        i = bisect.bisect_right(keyframes, frame_idx)
+        if i and frame_idx - keyframes[i - 1] < gap // 2:
+            frame_idx = -(-keyframes[i - 1] // stride) * stride
+        snapped.add(frame_idx)
+    return sorted(snapped)
+
+
+def pose_signal(exercise, kpts):
+    """
+    The per-frame value the exercise's counter runs on (head, torso or hip height; hip angle
+    for planks), or None when the joints it needs are not visible.
+    """
+    results = keypoints_as_results(kpts)
+    if exercise == "pullup":
+        head_y, shoulder_y, _ = get_pose_details_pullup(results)
+        return None if shoulder_y is None else head_y
+    if exercise == "pushup":
+        return get_pose_details_pushup(results)[0]
+    if exercise == "squat":
+        return get_pose_details_squat(results)[0]
+    return get_pose_details_plank(results)[0]
+
+
+def _signal_span(values):
+    """10-90 percentile range of the visible signal values."""
+    ordered = sorted(v for v in values if v is not None)
+    if len(ordered) < 2:
+        return 0.0
+    return ordered[int(0.9 * (len(ordered) - 1))] - ordered[int(0.1 * (len(ordered) - 1))]
+
+
+def refine_frames(exercise, settings, samples, reps, gap):
+    """
+    Frames for the next pass: multiples of `gap` inside every interval between neighbouring
+    samples that needs a closer look. samples: {frame_idx: keypoints or None}.
+    """
+    frames = sorted(samples)
+    signal = [pose_signal(exercise, samples[f]) for f in frames]
+    span = _signal_span(signal)
+    boundaries = {rep[key] for rep in reps for key in ("start_frame", "bottom_frame", "end_frame")}
+    targets = []
+    for i in range(len(frames) - 1):
+        a, b = frames[i], frames[i + 1]
+        first = (a // gap + 1) * gap
+        if first >= b:
+            continue
+        s_a, s_b = signal[i], signal[i + 1]
+        if (s_a is None) != (s_b is None):
+            needed = True  # the person (or a joint the counter needs) comes or goes in between
+        elif s_a is None:
+            needed = False
+        elif exercise == "plank":
+            threshold = settings["align_threshold"]
+            needed = (abs(s_a - 180.0) <= threshold) != (abs(s_b - 180.0) <= threshold)
+        else:
+            # Judge motion on the neighbouring samples too: both ends of an interval can land on
+            # the same phase of a rep (aliasing) while the person is far from still in between.
+            nearby = [v for v in signal[max(0, i - 1):i + 3] if v is not None]
+            needed = a in boundaries or b in boundaries or max(nearby) - min(nearby) > MOTION_FRACTION * span
+        if needed:
+            targets.extend(range(first, b, gap))
+    return targets
+
+
+def replay(exercise, settings, samples, fps):
+    """Fresh rep counter fed with every sample in frame order; returns the counter."""
+    counter = make_rep_counter(exercise, settings, fps=fps)
+    for frame_idx in sorted(samples):
+        feed_rep_counter(exercise, counter, frame_idx, keypoints_as_results(samples[frame_idx]))
+    return counter
+
+
+# ---------- Progressive Analysis ----------
+
+
+def analyze_video_progressive(video_path, exercise, settings, model, on_progress=None):
+    """
+    Coarse-to-fine version of form_analysis.analyze_video with the same summary dict.
+    on_progress(progress, preview) gets provisional counts (progress["provisional"] is True
+    until the last pass finishes) plus the pass number; counts change once per pass.
+    The summary's "progressive" entry lists the frames inferred per pass against the
+    frame count of the uniform pass.
+    Videos without a frame count fall back to the uniform pass.
+
+    roi_tracking applies within each pass. skip_idle does not apply (the motion gate needs
+    consecutive samples; idle stretches stay at the coarse rate instead) and is listed in
+    progressive["ignored_settings"], as is decode_process. Frames are decoded with
+    VideoFrameReader.read_frames: with keyframe positions from ffprobe, coarse samples sit
+    just after keyframes and gaps are skipped by seeking to them. Without ffprobe, gaps
+    shorter than read_frames' seek_gap (90 frames) are decoded through, so every pass
+    decodes most of the video even though it infers only a fraction of it.
+    """
+    if exercise not in EXERCISES:
+        raise ValueError(f"Unknown exercise: {exercise}")
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    stride = FRAME_STRIDE[exercise] * int(settings["stride_scale"])
+    reader = VideoFrameReader(video_path, stride=stride)
+    if reader.frame_count <= 0:
+        return analyze_video(video_path, exercise, settings, model, on_progress)
+    profiler = StageProfiler(enabled=settings["profile"])
+    pose_model = profiler.timed_model(model)
+    roi = None
+    if settings["roi_tracking"]:
+        roi = pose_model = PersonROITracker(pose_model)
+    gaps = pass_gaps(reader.fps, stride)
+    last_frame = reader.frame_count // stride * stride
+    probed = probe_keyframes(video_path)
+    keyframes = probed[1] if probed is not None else None
+
+    samples = {}
+    reps = []
+    counts = make_rep_counter(exercise, settings, fps=reader.fps).counts()
+    passes = []
+    inferred = 0
+    for pass_idx, gap in enumerate(gaps):
+        if pass_idx == 0:
+            coarse = range(gap, last_frame + 1, gap)
+            if keyframes:
+                coarse = snap_to_keyframes(coarse, keyframes, stride, gap)
+            frames = sorted({stride, *coarse, last_frame} - {0})
+        else:
+            frames = refine_frames(exercise, settings, samples, reps, gap)
+        if roi is not None:
+            roi.reset()  # each pass starts again from the beginning of the video
+        n = 0
+        for frame_idx, frame in profiler.iterate(reader.read_frames(frames, keyframes=keyframes)):
+            samples[frame_idx] = main_person_keypoints(pose_model(frame, verbose=False))
+            n += 1
+            inferred += 1
+            if on_progress is None:
+                continue
+            preview = None
+            if inferred % DISPLAY_EVERY == 1:
+                with profiler.stage("display"):
+                    preview = reader.to_display(frame)
+                profiler.count("displayed")
+            on_progress(dict(counts, frame_idx=frame_idx, frame_count=reader.frame_count,
+                             fraction=(pass_idx + n / len(frames)) / len(gaps),
+                             provisional=True, refine_pass=pass_idx + 1, passes=len(gaps)), preview)
+        passes.append({"gap": gap, "inferred": n})
+
+        counter = replay(exercise, settings, samples, reader.fps)
+        counts, reps = counter.counts(), counter.reps
+        if on_progress is not None:
+            on_progress(dict(counts, frame_idx=last_frame, frame_count=reader.frame_count,
+                             fraction=(pass_idx + 1) / len(gaps), provisional=pass_idx + 1 < len(gaps),
+                             refine_pass=pass_idx + 1, passes=len(gaps)), None)
+
+    summary = dict(counts, reps=reps)
+    for key in THRESHOLD_KEYS[exercise]:
+        summary[key] = settings[key]
+    progressive = {"passes": passes, "inferred": inferred, "uniform_frames": reader.frame_count // stride}
+    ignored = [key for key in ("skip_idle", "decode_process") if settings.get(key)]
+    if ignored:
+        progressive["ignored_settings"] = ignored
+    summary.update(exercise=exercise, frames_processed=len(samples), fps=reader.fps, progressive=progressive)
+    if profiler.enabled:
+        summary["profile"] = profiler.report()
+    return summary
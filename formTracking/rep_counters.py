@@ -0,0 +1,302 @@
+from abc import ABC, abstractmethod
+from keypoint_filters import OneEuroFilter, PercentileRange
+
+
+# ---------- Online Rep Counters ----------
+# Streamlit-free, incremental versions of the exercise state machines. Feed one sample per
+# analysed frame with update(); it returns a rep event dict when a rep completes, else None.
+# Counter state is bounded: the smoothing filters keep one sample, range calibration keeps a
+# sliding window, and a rep's angle list is cleared when the next rep starts. Only the rep log
+# grows, by one event per rep; pass keep_reps=False on streams without an end.
+# state_dict()/load_state_dict() snapshot and restore everything as JSON-serialisable values.
+#
+# Rep events: {"rep", "start_frame", "bottom_frame", "end_frame", "valid", "counted", "metric"}.
+# bottom_frame is the turnaround of the rep (lowest point for push-ups and squats, chin at its
+# highest for pull-ups).
+
+class RepCounter(ABC):
+    """Shared plumbing: timestamps, optional rep log, and state snapshots."""
+
+    _STATE_FIELDS = ()
+    _COMPONENTS = ()
+
+    def __init__(self, fps=30.0, window=300, keep_reps=True):
+        self.fps = fps
+        self.window = window
+        self.keep_reps = keep_reps
+        self.reps = []
+        self.rep_index = 0
+
+    def _emit(self, start_frame, bottom_frame, end_frame, valid, counted, metric=None):
+        self.rep_index += 1
+        event = {
+            "rep": self.rep_index,
+            "start_frame": int(start_frame),
+            "bottom_frame": int(bottom_frame),
+            "end_frame": int(end_frame),
+            "valid": bool(valid),
+            "counted": bool(counted),
+            "metric": None if metric is None else float(metric),
+        }
+        if self.keep_reps:
+            self.reps.append(event)
+        return event
+
+    @abstractmethod
+    def counts(self):
+        """The counter's running totals as a dict."""
+
+    def state_dict(self):
+        # Copy list fields (the current rep's angles) so later updates do not alter the snapshot.
+        state = {name: _copy(getattr(self, name)) for name in self._STATE_FIELDS}
+        for name in self._COMPONENTS:
+            state[name] = getattr(self, name).state_dict()
+        state["rep_index"] = self.rep_index
+        state["reps"] = list(self.reps)
+        return state
+
+    def load_state_dict(self, state):
+        for name in self._STATE_FIELDS:
+            setattr(self, name, _copy(state[name]))
+        for name in self._COMPONENTS:
+            getattr(self, name).load_state_dict(state[name])
+        self.rep_index = state["rep_index"]
+        self.reps = list(state["reps"])
+        return self
+
+
+class PullupRepCounter(RepCounter):
+    """Valid rep = chin (nose) rises above the shoulder line between hang and hang."""
+
+    _STATE_FIELDS = ("state", "chin_above_bar", "good_count", "total_reps",
+                     "extreme_y", "extreme_frame", "start_frame")
+    _COMPONENTS = ("head_filter", "shoulder_filter", "head_calib")
+
+    def __init__(self, fps=30.0, window=300, keep_reps=True):
+        super().__init__(fps, window, keep_reps)
+        self.head_filter = OneEuroFilter()
+        self.shoulder_filter = OneEuroFilter()
+        self.head_calib = PercentileRange(window=window)
+        self.state = "down"
+        self.chin_above_bar = False
+        self.good_count = 0
+        self.total_reps = 0
+        self.extreme_y = None
+        self.extreme_frame = 0
+        self.start_frame = 0
+
+    def update(self, frame_idx, head_y, shoulder_y):
+        if head_y is None or shoulder_y is None:
+            return None
+        t = frame_idx / self.fps
+        head_y = self.head_filter(t, head_y)
+        shoulder_y = self.shoulder_filter(t, shoulder_y)
+        min_head_y, max_head_y = self.head_calib.update(head_y)
+        head_above_shoulder = head_y < shoulder_y
+        head_range = max_head_y - min_head_y
+        if head_range > 0:
+            top_thresh = min_head_y + 0.3 * head_range
+            bottom_thresh = min_head_y + 0.7 * head_range
+        else:
+            top_thresh, bottom_thresh = min_head_y, max_head_y
+
+        # While hanging, remember the lowest head position: that is where the rep starts.
+        if self.state == "down" and (self.extreme_y is None or head_y >= self.extreme_y):
+            self.extreme_y, self.start_frame = head_y, frame_idx
+
+        event = None
+        if self.state == "down" and head_y < top_thresh:
+            self.state = "up"
+            self.chin_above_bar = False
+            self.extreme_y, self.extreme_frame = head_y, frame_idx
+        if self.state == "up":
+            if head_above_shoulder:
+                self.chin_above_bar = True
+            if head_y < self.extreme_y:
+                self.extreme_y, self.extreme_frame = head_y, frame_idx
+            if head_y > bottom_thresh:
+                self.state = "down"
+                self.total_reps += 1
+                if self.chin_above_bar:
+                    self.good_count += 1
+                event = self._emit(self.start_frame, self.extreme_frame, frame_idx,
+                                   valid=self.chin_above_bar, counted=True)
+                self.extreme_y = head_y
+                self.start_frame = frame_idx
+        return event
+
+    def counts(self):
+        return {"good_count": self.good_count, "total_reps": self.total_reps}
+
+
+class PushupRepCounter(RepCounter):
+    """Counts push-ups from torso height; a rep is bad when its median elbow flare exceeds the threshold."""
+
+    _STATE_FIELDS = ("flare_threshold", "state", "current_rep_angles", "good_count", "bad_count",
+                     "extreme_y", "extreme_frame", "start_frame")
+    _COMPONENTS = ("torso_filter", "torso_calib")
+
+    def __init__(self, flare_threshold=75, fps=30.0, window=300, keep_reps=True):
+        super().__init__(fps, window, keep_reps)
+        self.flare_threshold = flare_threshold
+        self.torso_filter = OneEuroFilter()
+        self.torso_calib = PercentileRange(window=window)
+        self.state = "up"
+        self.current_rep_angles = []
+        self.good_count = 0
+        self.bad_count = 0
+        self.extreme_y = None
+        self.extreme_frame = 0
+        self.start_frame = 0
+
+    def update(self, frame_idx, torso_y, flare):
+        if torso_y is None:
+            return None
+        torso_y = self.torso_filter(frame_idx / self.fps, torso_y)
+        min_y, max_y = self.torso_calib.update(torso_y)
+        range_span = max_y - min_y
+        down_thresh = min_y + 0.6 * range_span
+        up_thresh = min_y + 0.3 * range_span
+
+        # In the top position, track the highest torso point: the next rep starts there.
+        if self.state == "up" and (self.extreme_y is None or torso_y <= self.extreme_y):
+            self.extreme_y, self.start_frame = torso_y, frame_idx
+
+        event = None
+        if self.state == "up" and torso_y > down_thresh:
+            self.state = "down"
+            self.current_rep_angles = []
+            self.extreme_y, self.extreme_frame = torso_y, frame_idx
+        if self.state == "down":
+            if flare > 0:
+                self.current_rep_angles.append(float(flare))
+            if torso_y > self.extreme_y:
+                self.extreme_y, self.extreme_frame = torso_y, frame_idx
+            if torso_y < up_thresh:
+                self.state = "up"
+                if self.current_rep_angles:
+                    rep_flare = _median(self.current_rep_angles)
+                    valid = rep_flare <= self.flare_threshold
+                    if valid:
+                        self.good_count += 1
+                    else:
+                        self.bad_count += 1
+                    event = self._emit(self.start_frame, self.extreme_frame, frame_idx,
+                                       valid=valid, counted=True, metric=rep_flare)
+                self.extreme_y = torso_y
+                self.start_frame = frame_idx
+        return event
+
+    def counts(self):
+        return {"good_count": self.good_count, "bad_count": self.bad_count}
+
+
+class SquatRepCounter(RepCounter):
+    """Counts squats from hip height; only reps whose lowest knee angle reaches depth are counted."""
+
+    _STATE_FIELDS = ("depth_threshold", "state", "rep_knee_angles", "good_count", "total_reps",
+                     "extreme_y", "extreme_frame", "start_frame")
+    _COMPONENTS = ("hip_filter", "hip_calib")
+
+    def __init__(self, depth_threshold=100, fps=30.0, window=300, keep_reps=True):
+        super().__init__(fps, window, keep_reps)
+        self.depth_threshold = depth_threshold
+        self.hip_filter = OneEuroFilter()
+        self.hip_calib = PercentileRange(window=window)
+        self.state = "up"
+        self.rep_knee_angles = []
+        self.good_count = 0
+        self.total_reps = 0
+        self.extreme_y = None
+        self.extreme_frame = 0
+        self.start_frame = 0
+
+    def update(self, frame_idx, hip_y, knee_angle):
+        if hip_y is None:
+            return None
+        hip_y = self.hip_filter(frame_idx / self.fps, hip_y)
+        min_hip_y, max_hip_y = self.hip_calib.update(hip_y)
+        range_span = max_hip_y - min_hip_y
+        down_thresh = min_hip_y + 0.55 * range_span
+        up_thresh = min_hip_y + 0.35 * range_span
+
+        if self.state == "up" and (self.extreme_y is None or hip_y <= self.extreme_y):
+            self.extreme_y, self.start_frame = hip_y, frame_idx
+
+        event = None
+        if self.state == "up" and hip_y > down_thresh:
+            self.state = "down"
+            self.rep_knee_angles = []
+            self.extreme_y, self.extreme_frame = hip_y, frame_idx
+        if self.state == "down":
+            if knee_angle is not None and knee_angle > 10:
+                self.rep_knee_angles.append(float(knee_angle))
+            if hip_y > self.extreme_y:
+                self.extreme_y, self.extreme_frame = hip_y, frame_idx
+            if hip_y < up_thresh:
+                self.state = "up"
+                if self.rep_knee_angles:
+                    bottom_angle = min(self.rep_knee_angles)
+                    valid = bottom_angle <= self.depth_threshold
+                    if valid:
+                        self.total_reps += 1
+                        self.good_count += 1
+                    # Shallow reps are reported but, as before, not counted.
+                    event = self._emit(self.start_frame, self.extreme_frame, frame_idx,
+                                       valid=valid, counted=valid, metric=bottom_angle)
+                self.extreme_y = hip_y
+                self.start_frame = frame_idx
+        return event
+
+    def counts(self):
+        return {"good_count": self.good_count, "total_reps": self.total_reps}
+
+
+class PlankTimer(RepCounter):
+    """Plank equivalent of a rep counter: accumulates total and well-aligned hold time."""
+
+    _STATE_FIELDS = ("align_threshold", "total_time", "good_align_time", "last_frame")
+
+    def __init__(self, align_threshold=25, fps=30.0, window=300, keep_reps=True):
+        super().__init__(fps, window, keep_reps)
+        self.align_threshold = align_threshold
+        self.total_time = 0.0
+        self.good_align_time = 0.0
+        self.last_frame = 0
+
+    def update(self, frame_idx, hip_angle):
+        frame_duration = 1.0 / self.fps
+        elapsed = (frame_idx - self.last_frame) * frame_duration
+        self.last_frame = frame_idx
+        self.total_time = frame_idx * frame_duration
+        if hip_angle is not None and abs(hip_angle - 180.0) <= self.align_threshold:
+            self.good_align_time += elapsed
+        return None
+
+    def counts(self):
+        return {"total_time": self.total_time, "good_align_time": self.good_align_time}
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def _median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[mid]
+    return (ordered[mid - 1] + ordered[mid]) / 2.0
+
+
+def make_rep_counter(exercise, settings, fps=30.0, keep_reps=True):
+    """Counter for `exercise` configured from the analysis settings dict."""
+    if exercise == "pullup":
+        return PullupRepCounter(fps=fps, keep_reps=keep_reps)
+    if exercise == "pushup":
+        return PushupRepCounter(settings["flare_threshold"], fps=fps, keep_reps=keep_reps)
+    if exercise == "squat":
+        return SquatRepCounter(settings["depth_threshold"], fps=fps, keep_reps=keep_reps)
+    if exercise == "plank":
+        return PlankTimer(settings["align_threshold"], fps=fps, keep_reps=keep_reps)
+    raise ValueError(f"Unknown exercise: {exercise}")
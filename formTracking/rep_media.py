@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+import cv2
+from seek_index import decode_range
+from video_export import BackgroundVideoWriter
+
+
+# ---------- Configuration ----------
+
+REP_MEDIA_DIR = os.environ.get("TRAINR_REP_MEDIA_DIR", os.path.join(tempfile.gettempdir(), "trainr-rep-media"))
+REP_MEDIA_MAX_MB = float(os.environ.get("TRAINR_REP_MEDIA_MB", "256"))
+THUMBNAIL_SIZE = 240  # longer side, px
+CLIP_SIZE = 360
+CLIP_PAD_SECONDS = 0.3  # context before and after the rep
+
+
+# ---------- Rep Media Cache ----------
+
+class RepMediaCache:
+    """
+    Thumbnails (JPEG of the rep's bottom frame) and short clips (MP4 of the rep) made on
+    first request from the rep boundaries in the analysis summary, decoding only the
+    rep's frames through seek_index.decode_range.
+
+    Files are keyed by the video (path, size, mtime), the rep range and the output size,
+    so a repeat view is a file read. Every hit refreshes the file's mtime; when the cache
+    grows past max_bytes the least recently used files are deleted.
+    """
+
+    def __init__(self, cache_dir=REP_MEDIA_DIR, max_bytes=int(REP_MEDIA_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._evict()
+
+    def _path(self, video_path, kind, *params):
+        stat = os.stat(video_path)
+        key = "|".join(str(p) for p in (os.path.abspath(video_path), stat.st_size, stat.st_mtime, kind) + params)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + kind)
+
+    def _hit(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def thumbnail(self, video_path, rep, index=None, size=THUMBNAIL_SIZE):
+        """JPEG bytes of the rep's bottom frame, or None if it cannot be decoded."""
+        path = self._path(video_path, ".jpg", rep["bottom_frame"], size)
+        if not self._hit(path):
+            frames = list(decode_range(video_path, rep["bottom_frame"], rep["bottom_frame"], index, max_side=size))
+            if not frames:
+                return None
+            ok, data = cv2.imencode(".jpg", frames[0][1], [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if not ok:
+                return None
+            self._store(path, data.tobytes())
+        with open(path, "rb") as f:
+            return f.read()
+
+    def clip(self, video_path, rep, fps, index=None, size=CLIP_SIZE):
+        """Path of an MP4 of the rep (with CLIP_PAD_SECONDS either side), or None if nothing decodes."""
+        pad = int(round(CLIP_PAD_SECONDS * fps))
+        start, end = max(1, rep["start_frame"] - pad), rep["end_frame"] + pad
+        path = self._path(video_path, ".mp4", start, end, size)
+        if self._hit(path):
+            return path
+        tmp_path = path + ".tmp.mp4"
+        writer = None
+        try:
+            for _, frame in decode_range(video_path, start, end, index, max_side=size):
+                if writer is None:
+                    writer = BackgroundVideoWriter(tmp_path, fps, (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            return None
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def _store(self, path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if ".tmp" in name:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue  # removed by another session
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
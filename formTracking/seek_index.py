@@ -0,0 +1,149 @@
+import os
+import shutil
+import subprocess
+import cv2
+import numpy as np
+from video_io import fit_size
+
+
+# ---------- Seek Index ----------
+# Written once per analysed video so that any rep can be reviewed later by decoding only
+# its group of pictures: seek to the keyframe before the rep, grab forward to its first
+# frame, decode the rep. Timestamps make rep times right for variable-frame-rate phone videos.
+
+class SeekIndex:
+    """
+    Frame timestamps and keyframe positions of one video.
+    timestamps: presentation time in ms of frames 1..N (index 0 = frame 1); empty when unknown.
+    keyframes: ascending 1-based frame numbers of keyframes; empty when unknown.
+    """
+
+    def __init__(self, fps, frame_count, timestamps=(), keyframes=()):
+        self.fps = float(fps)
+        self.frame_count = int(frame_count)
+        self.timestamps = np.asarray(timestamps, np.float64)
+        self.keyframes = np.asarray(keyframes, np.int64)
+
+    def time_of(self, frame_idx):
+        """Seconds from the start of the video to 1-based frame_idx."""
+        if 0 < frame_idx <= len(self.timestamps):
+            return float(self.timestamps[frame_idx - 1]) / 1000.0
+        return (frame_idx - 1) / self.fps
+
+    def keyframe_before(self, frame_idx):
+        """Last keyframe at or before frame_idx, or None when keyframes are unknown."""
+        i = int(np.searchsorted(self.keyframes, frame_idx, side="right"))
+        return int(self.keyframes[i - 1]) if i else None
+
+    def rep_table(self, reps):
+        """Rep events from the analysis summary with start/bottom/end times in seconds."""
+        return [dict(rep, start_time=round(self.time_of(rep["start_frame"]), 3),
+                     bottom_time=round(self.time_of(rep["bottom_frame"]), 3),
+                     end_time=round(self.time_of(rep["end_frame"]), 3))
+                for rep in reps]
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, fps=self.fps, frame_count=self.frame_count,
+                                timestamps=self.timestamps.astype(np.float32),
+                                keyframes=self.keyframes.astype(np.int32))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(float(data["fps"]), int(data["frame_count"]), data["timestamps"], data["keyframes"])
+
+
+def probe_keyframes(path):
+    """
+    (timestamps_ms, keyframes) from the container's packet table via ffprobe, which reads
+    packet headers only and decodes nothing. None when ffprobe is unavailable or fails.
+    """
+    if shutil.which("ffprobe") is None:
+        return None
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+           "-of", "csv=p=0", path]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=120).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+    packets = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        try:
+            packets.append((float(pts), "K" in flags))
+        except ValueError:
+            continue  # packets without a pts (N/A)
+    if not packets:
+        return None
+    # Packets come in decode order; frame numbers follow presentation order.
+    packets.sort()
+    timestamps = [(pts - packets[0][0]) * 1000.0 for pts, _ in packets]
+    keyframes = [i + 1 for i, (_, key) in enumerate(packets) if key]
+    return timestamps, keyframes
+
+
+def build_seek_index(path, fps, frame_count, timestamps=()):
+    """
+    Index for `path`: keyframes (and timestamps, if the analysis pass did not record any)
+    from ffprobe when available. Without either the index still works, falling back to
+    frame_idx / fps for times and to the decoder's own seeking.
+    """
+    probed = probe_keyframes(path)
+    keyframes = ()
+    if probed is not None:
+        if not len(timestamps):
+            timestamps = probed[0]
+        keyframes = probed[1]
+    return SeekIndex(fps, frame_count, timestamps, keyframes)
+
+
+def load_or_build_seek_index(index_path, video_path):
+    """The saved index, or (for runs that did not write one) a new one built from the container and saved."""
+    if os.path.exists(index_path):
+        return SeekIndex.load(index_path)
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    index = build_seek_index(video_path, fps, frame_count)
+    index.save(index_path)
+    return index
+
+
+# ---------- Range Decoding ----------
+
+def decode_range(path, start_frame, end_frame, index=None, step=1, max_side=480):
+    """
+    Yields (frame_idx, BGR frame) for every `step`-th frame of start_frame..end_frame
+    (1-based, inclusive), scaled to at most max_side. Only the group of pictures that
+    holds the range is decoded: with a keyframe index the capture is positioned on the
+    keyframe before start_frame and grabs forward; without one OpenCV's own seek does
+    the same search.
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        keyframe = index.keyframe_before(start_frame) if index is not None else None
+        position = (keyframe if keyframe is not None else start_frame) - 1
+        if position > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        while position < start_frame - 1:
+            if not cap.grab():
+                return
+            position += 1
+        for frame_idx in range(start_frame, end_frame + 1):
+            if (frame_idx - start_frame) % step:
+                if not cap.grab():
+                    return
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                return
+            w, h = fit_size(frame.shape[1], frame.shape[0], max_side)
+            if (w, h) != (frame.shape[1], frame.shape[0]):
+                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            yield frame_idx, frame
+    finally:
+        cap.release()
@@ -0,0 +1,135 @@
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# ---------- Pipeline Profiling ----------
+
+STAGES = ("decode", "inference", "pose_details", "overlay", "display")
+_NO_STAGE = nullcontext()
+
+
+class StageProfiler:
+    """
+    Wall-time accounting for the analysis loop.
+
+    Stages are timed with `with profiler.stage(name):`; decode time is taken from the
+    reader by iterate(), and model time by timed_model() (so motion gating, ROI cropping
+    and rep counting end up in "other"). Frame counters record how many frames the reader
+    handed to the analysis (one per stride), were inferred and turned into previews, and
+    "source" how far into the video the run got (the last 1-based frame number; the
+    reader decodes or grabs the frames in between too). A frame counts as inferred once
+    however many model calls it took (an ROI crop miss is re-run on the full frame); the
+    calls are the "inference" stage's calls. When disabled every call is a no-op.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.totals = {}
+        self.calls = {}
+        self.frames = {"analysed": 0, "inferred": 0, "displayed": 0, "source": 0}
+        self._last_inferred = None  # frames["analysed"] at the last inferred frame
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def stage(self, name):
+        return self._timed(name) if self.enabled else _NO_STAGE
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.frames[name] = self.frames.get(name, 0) + n
+
+    def iterate(self, reader):
+        """Yields (frame_idx, frame) from the reader, timing each next() as the decode stage."""
+        it = iter(reader)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+            if self.enabled:
+                self.add("decode", time.perf_counter() - start)
+                self.frames["analysed"] += 1
+                self.frames["source"] = max(self.frames["source"], item[0])
+            yield item
+        self.finished = time.perf_counter()
+
+    def timed_model(self, model):
+        """Model-like callable that times every real inference call and counts the frames inferred."""
+        if not self.enabled:
+            return model
+
+        def infer(frame, **kwargs):
+            with self._timed("inference"):
+                results = model(frame, **kwargs)
+            if self._last_inferred != self.frames["analysed"]:
+                self._last_inferred = self.frames["analysed"]
+                self.frames["inferred"] += 1
+            return results
+
+        return infer
+
+    def report(self):
+        """Plain-dict profile: per-stage totals, frame counts, and analysed and source frames per second."""
+        wall = (self.finished or time.perf_counter()) - self.started
+        stages = {}
+        for name in list(STAGES) + sorted(set(self.totals) - set(STAGES)):
+            total = self.totals.get(name, 0.0)
+            calls = self.calls.get(name, 0)
+            stages[name] = {
+                "total_s": round(total, 4),
+                "calls": calls,
+                "mean_ms": round(total / calls * 1e3, 3) if calls else 0.0,
+                "share": round(total / wall, 4) if wall > 0 else 0.0,
+            }
+        other = max(0.0, wall - sum(self.totals.values()))
+        stages["other"] = {"total_s": round(other, 4), "calls": 0, "mean_ms": 0.0,
+                           "share": round(other / wall, 4) if wall > 0 else 0.0}
+        return {
+            "wall_time": round(wall, 4),
+            "stages": stages,
+            "frames": dict(self.frames),
+            "effective_fps": round(self.frames["analysed"] / wall, 2) if wall > 0 else 0.0,
+            "source_fps": round(self.frames["source"] / wall, 2) if wall > 0 else 0.0,
+        }
+
+
+def environment_info():
+    """Deployment details recorded with every trace, so runs on different machines can be compared."""
+    import cv2
+
+    return {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": sys.version.split()[0],
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "pose_server": os.environ.get("TRAINR_POSE_SERVER"),
+    }
+
+
+def write_trace(path, profile, **meta):
+    """Writes a profile plus run metadata as one JSON document."""
+    trace = {"version": 1, "created_at": time.time(), "environment": environment_info(), **meta,
+             "profile": profile}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(trace, f, indent=1)
+    os.replace(tmp_path, path)
+    return trace
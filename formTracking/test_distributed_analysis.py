@@ -0,0 +1,108 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from distributed_analysis import WorkQueue, process_task, run_worker
+from pose_backends import PoseDetections
+
+FPS = 30.0
+SIZE = (320, 240)
+BLOCK = 60
+
+
+def _write_video(path, cycles=5, moving=120, still=120):
+    """A white block standing in for the athlete: two push-ups, then a still pause, per cycle."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, SIZE)
+    for t in range(cycles * (moving + still)):
+        phase = t % (moving + still)
+        offset = 50 * math.sin(2 * math.pi * min(phase, moving) / 60)
+        frame = np.zeros((SIZE[1], SIZE[0], 3), np.uint8)
+        y = int(round(SIZE[1] / 2 - BLOCK / 2 + offset))
+        frame[y:y + BLOCK, 130:130 + BLOCK] = 255
+        writer.write(frame)
+    writer.release()
+
+
+class BlockPoseModel:
+    """Pose from the block's position; crops give the same keypoints, so ROI tracking is exact."""
+
+    def __call__(self, frame, **kwargs):
+        ys, xs = np.nonzero(frame.max(axis=2) > 128)
+        if not len(xs):
+            return []
+        cx, cy = float(xs.mean()), float(ys.mean())
+        kpts = np.full((17, 2), (cx, cy), np.float32)
+        kpts[5:7] = (cx - 20, cy - 10), (cx + 20, cy - 10)  # shoulders
+        kpts[7:9] = (cx - 25, cy + 10), (cx + 25, cy + 10)  # elbows
+        kpts[11:13] = (cx - 10, cy + 20), (cx + 10, cy + 20)  # hips
+        return [PoseDetections(kpts[None], [0.9], [[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]])]
+
+
+class SplitIndependenceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.video = os.path.join(self.tmp, "pushups.avi")
+        _write_video(self.video)
+        self.model = BlockPoseModel()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _single_node(self, settings):
+        work_queue = WorkQueue(os.path.join(self.tmp, "single"))
+        job_id = work_queue.submit(self.video, "pushup", settings, segment_seconds=1000)
+        run_worker(work_queue, self.model, worker="only", exit_when_idle=True)
+        return work_queue.job(job_id)["summary"]
+
+    def _split_with_steal(self, settings):
+        work_queue = WorkQueue(os.path.join(self.tmp, "split"))
+        job_id = work_queue.submit(self.video, "pushup", settings, segment_seconds=7)
+        tasks = []
+        while True:
+            task = work_queue.claim(f"worker-{len(tasks)}")
+            if task is None:
+                break
+            tasks.append(task)
+        self.assertGreater(len(tasks), work_queue.job(job_id)["frame_count"] // (7 * FPS) + 1,
+                           "no segment was stolen")
+        for task in reversed(tasks):
+            process_task(work_queue, task, self.model)
+        return work_queue.job(job_id)["summary"]
+
+    def _assert_same_result(self, settings):
+        single = self._single_node(settings)
+        split = self._split_with_steal(settings)
+        self.assertGreaterEqual(single["good_count"], 8)
+        for key in ("good_count", "bad_count", "reps", "frames_processed"):
+            self.assertEqual(split[key], single[key], key)
+        return single, split
+
+    def test_skip_idle(self):
+        single, split = self._assert_same_result({"skip_idle": True})
+        self.assertGreater(single["skipped_time"], 0)
+        self.assertEqual(split["skipped_time"], single["skipped_time"])
+
+    def test_skip_idle_with_roi_tracking(self):
+        self._assert_same_result({"skip_idle": True, "roi_tracking": True})
+
+    def test_short_or_missing_frame_count(self):
+        original = cv2.VideoCapture.get
+        for reported in (900, 0):
+            with self.subTest(reported=reported):
+                work_queue = WorkQueue(os.path.join(self.tmp, f"reported{reported}"))
+                cv2.VideoCapture.get = lambda cap, prop: (reported if prop == cv2.CAP_PROP_FRAME_COUNT
+                                                          else original(cap, prop))
+                try:
+                    job_id = work_queue.submit(self.video, "pushup", {"skip_idle": False}, segment_seconds=7)
+                finally:
+                    cv2.VideoCapture.get = original
+                run_worker(work_queue, self.model, exit_when_idle=True)
+                self.assertEqual(work_queue.job(job_id)["summary"]["frames_processed"], 1200 // 6)
+
+if __name__ == "__main__":
+    unittest.main()
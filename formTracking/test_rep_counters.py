@@ -0,0 +1,79 @@
+import json
+import math
+import unittest
+
+from rep_counters import PushupRepCounter, SquatRepCounter
+
+
+def _pushup_samples(frames=400, period=60):
+    """Torso height oscillating over `period` frames, with the elbow flare drifting rep to rep."""
+    for frame_idx in range(1, frames + 1):
+        phase = 2 * math.pi * frame_idx / period
+        torso_y = 300 + 80 * math.sin(phase)
+        flare = 60 + 30 * math.sin(phase / 7) + (frame_idx % 5)
+        yield frame_idx, torso_y, flare
+
+
+def _squat_samples(frames=400, period=80):
+    for frame_idx in range(1, frames + 1):
+        phase = 2 * math.pi * frame_idx / period
+        hip_y = 400 + 120 * math.sin(phase)
+        knee_angle = 140 - 60 * math.sin(phase) + (frame_idx % 7)
+        yield frame_idx, hip_y, knee_angle
+
+
+class StateRoundTripTest(unittest.TestCase):
+    def _round_trip(self, counter, samples, through_json=False):
+        """Feeds samples, snapshots mid-rep, feeds the rest, then restores and feeds the rest again."""
+        samples = list(samples)
+        events = []
+        snapshot_at = None
+        for i, sample in enumerate(samples):
+            events.append(counter.update(*sample))
+            if snapshot_at is None and i > len(samples) // 2 and counter.state == "down":
+                snapshot_at = i + 1
+                snapshot = counter.state_dict()
+                if through_json:
+                    snapshot = json.loads(json.dumps(snapshot))
+        self.assertIsNotNone(snapshot_at, "the stream never reached a rep's bottom phase")
+        expected_counts, expected_reps = counter.counts(), list(counter.reps)
+
+        counter.load_state_dict(snapshot)
+        for sample in samples[snapshot_at:]:
+            counter.update(*sample)
+        self.assertEqual(counter.counts(), expected_counts)
+        self.assertEqual(counter.reps, expected_reps)
+        return events
+
+    def test_pushup_snapshot_mid_rep(self):
+        counter = PushupRepCounter(flare_threshold=75)
+        events = self._round_trip(counter, _pushup_samples())
+        self.assertGreaterEqual(sum(event is not None for event in events), 4)
+
+    def test_squat_snapshot_mid_rep(self):
+        counter = SquatRepCounter(depth_threshold=100)
+        events = self._round_trip(counter, _squat_samples())
+        self.assertGreaterEqual(sum(event is not None for event in events), 3)
+
+    def test_snapshot_survives_json(self):
+        self._round_trip(PushupRepCounter(flare_threshold=75), _pushup_samples(), through_json=True)
+
+    def test_snapshot_is_not_aliased(self):
+        counter = PushupRepCounter(flare_threshold=75)
+        samples = _pushup_samples()
+        for sample in samples:
+            counter.update(*sample)
+            if counter.state == "down" and counter.current_rep_angles:
+                break
+        snapshot = counter.state_dict()
+        angles = list(snapshot["current_rep_angles"])
+        counter.update(*next(samples))
+        self.assertEqual(snapshot["current_rep_angles"], angles)
+
+        counter.load_state_dict(snapshot)
+        counter.current_rep_angles.append(0.0)
+        self.assertEqual(snapshot["current_rep_angles"], angles)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,12 @@
 import os
 import tempfile
-import cv2
-import numpy as np
+import threading
+import time
 import streamlit as st
-from ultralytics import YOLO
 from datetime import datetime
 
+JOB_POLL_INTERVAL = 1.0  # seconds between progress refreshes of a running analysis
+
 
 # ---------- Helper Functions ----------
 
@@ -176,356 +177,18 @@ def inject_base_styles():
         unsafe_allow_html=True,
     )
 
-def calculate_angle(a, b, c):
-    """
-    Calculates the angle at point b (vertex) formed by a and c.
-    """
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-
-    ba = a - b
-    bc = c - b
-
-    norm_ba = np.linalg.norm(ba)
-    norm_bc = np.linalg.norm(bc)
-
-    if norm_ba == 0 or norm_bc == 0:
-        return 0.0
-
-    cosine_angle = np.dot(ba, bc) / (norm_ba * norm_bc)
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-
-    angle = np.arccos(cosine_angle)
-    return np.degrees(angle)
-
-
-# ---------- Pull-up Functions ----------
-
-def get_pose_details_pullup(results):
-    """
-    Extracts keypoints for pull-up analysis.
-    Returns: head_y, shoulder_y, keypoints dict
-    """
-    if results is None or len(results) == 0:
-        return None, None, None
-
-    r = results[0]
-    if r.keypoints is None or r.keypoints.xy is None:
-        return None, None, None
-
-    kpts = r.keypoints.xy
-    if kpts.shape[0] == 0:
-        return None, None, None
-
-    # Get main person
-    dets = r.boxes
-    if dets is None or len(dets) == 0:
-        return None, None, None
-
-    scores = dets.conf.cpu().numpy()
-    main_idx = int(scores.argmax())
-    person_kpts = kpts[main_idx].cpu().numpy()
-
-    def get_pt(idx):
-        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
-            return person_kpts[idx]
-        return None
-
-    # COCO keypoint indices: 0=nose, 5=l_shoulder, 6=r_shoulder, 7=l_elbow, 8=r_elbow, 11=l_hip, 12=r_hip
-    keypoints = {
-        "nose": get_pt(0),
-        "l_sh": get_pt(5), "r_sh": get_pt(6),
-        "l_el": get_pt(7), "r_el": get_pt(8),
-        "l_hip": get_pt(11), "r_hip": get_pt(12)
-    }
-
-    # Calculate head Y (use nose as proxy for chin/head position)
-    # Calculate shoulder Y (average of both shoulders)
-    head_y = None
-    if keypoints["nose"] is not None:
-        head_y = float(keypoints["nose"][1])
-    
-    shoulder_y = None
-    shoulder_coords = []
-    if keypoints["l_sh"] is not None:
-        shoulder_coords.append(keypoints["l_sh"][1])
-    if keypoints["r_sh"] is not None:
-        shoulder_coords.append(keypoints["r_sh"][1])
-    
-    if shoulder_coords:
-        shoulder_y = float(np.mean(shoulder_coords))
-
-    return head_y, shoulder_y, keypoints
-
-
-def draw_debug_overlay_pullup(frame, kpts, head_y, shoulder_y):
-    """
-    Draws visualization overlay showing head position relative to shoulders.
-    """
-    # Draw shoulder line
-    if kpts['l_sh'] is not None and kpts['r_sh'] is not None:
-        cv2.line(frame, tuple(kpts['l_sh'].astype(int)), tuple(kpts['r_sh'].astype(int)), (255, 255, 0), 2)
-    
-    # Draw head position indicator
-    if kpts['nose'] is not None and shoulder_y is not None:
-        # Draw line from nose to shoulder level
-        nose_pos = tuple(kpts['nose'].astype(int))
-        shoulder_x = int((kpts['l_sh'][0] + kpts['r_sh'][0]) / 2) if kpts['l_sh'] is not None and kpts['r_sh'] is not None else nose_pos[0]
-        shoulder_pos = (shoulder_x, int(shoulder_y))
-        
-        # Color based on position
-        head_above_shoulder = head_y < shoulder_y  # Lower Y = higher in image
-        line_color = (0, 255, 0) if head_above_shoulder else (0, 0, 255)  # Green if above, red if below
-        
-        cv2.line(frame, nose_pos, shoulder_pos, line_color, 2)
-        cv2.circle(frame, nose_pos, 5, (0, 255, 255), -1)
-    
-    # Text overlay
-    if head_y is not None and shoulder_y is not None:
-        head_above_shoulder = head_y < shoulder_y  # Lower Y = higher in image
-        status = "CHIN ABOVE BAR" if head_above_shoulder else "CHIN BELOW BAR"
-        color = (0, 255, 0) if head_above_shoulder else (0, 0, 255)
-        cv2.putText(frame, status, (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-    
-    return frame
-
-
-# ---------- Push-up Functions ----------
-
-def get_pose_details_pushup(results):
-    """
-    Extracts keypoints and torso Y.
-    """
-    if results is None or len(results) == 0:
-        return None, None
-
-    r = results[0]
-    if r.keypoints is None or r.keypoints.xy is None:
-        return None, None
-
-    kpts = r.keypoints.xy
-    if kpts.shape[0] == 0:
-        return None, None
-
-    # Get main person
-    dets = r.boxes
-    if dets is None or len(dets) == 0:
-        return None, None
-
-    scores = dets.conf.cpu().numpy()
-    main_idx = int(scores.argmax())
-    person_kpts = kpts[main_idx].cpu().numpy()
-
-    def get_pt(idx):
-        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
-            return person_kpts[idx]
-        return None
-
-    keypoints = {
-        "l_sh": get_pt(5), "r_sh": get_pt(6),
-        "l_el": get_pt(7), "r_el": get_pt(8),
-        "l_hip": get_pt(11), "r_hip": get_pt(12)
-    }
-
-    # Calculate Torso Y (average of shoulders and hips)
-    y_coords = []
-    for k in keypoints.values():
-        if k is not None:
-            y_coords.append(k[1])
-
-    if not y_coords:
-        return None, None
-
-    torso_y = float(np.mean(y_coords))
-    return torso_y, keypoints
-
-
-def draw_debug_overlay_pushup(frame, kpts, angle, threshold):
-    """
-    Draws the torso-to-arm lines and the calculated angle on the frame.
-    """
-    # Color based on threshold
-    color = (0, 255, 0) if angle < threshold else (0, 0, 255)  # Green if good, Red if bad
-
-    # Draw Left Side (if visible)
-    if kpts['l_sh'] is not None and kpts['l_hip'] is not None and kpts['l_el'] is not None:
-        cv2.line(frame, tuple(kpts['l_sh'].astype(int)), tuple(kpts['l_hip'].astype(int)), (255, 255, 0), 2)  # Torso
-        cv2.line(frame, tuple(kpts['l_sh'].astype(int)), tuple(kpts['l_el'].astype(int)), color, 3)  # Arm
-
-    # Draw Right Side (if visible)
-    if kpts['r_sh'] is not None and kpts['r_hip'] is not None and kpts['r_el'] is not None:
-        cv2.line(frame, tuple(kpts['r_sh'].astype(int)), tuple(kpts['r_hip'].astype(int)), (255, 255, 0), 2)
-        cv2.line(frame, tuple(kpts['r_sh'].astype(int)), tuple(kpts['r_el'].astype(int)), color, 3)
-
-    # Text overlay
-    cv2.putText(frame, f"Angle: {int(angle)} deg", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-    return frame
-
-
-# ---------- Squat Functions ----------
-# COCO: 11=l_hip, 12=r_hip, 13=l_knee, 14=r_knee, 15=l_ankle, 16=r_ankle
-
-def get_pose_details_squat(results):
-    """
-    Extracts keypoints for squat analysis.
-    Returns: hip_y, knee_angle_deg, keypoints dict.
-    knee_angle is the average of left/right hip-knee-ankle angle (lower = deeper squat).
-    """
-    if results is None or len(results) == 0:
-        return None, None, None
-
-    r = results[0]
-    if r.keypoints is None or r.keypoints.xy is None:
-        return None, None, None
-
-    kpts = r.keypoints.xy
-    if kpts.shape[0] == 0:
-        return None, None, None
-
-    dets = r.boxes
-    if dets is None or len(dets) == 0:
-        return None, None, None
-
-    scores = dets.conf.cpu().numpy()
-    main_idx = int(scores.argmax())
-    person_kpts = kpts[main_idx].cpu().numpy()
-
-    def get_pt(idx):
-        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
-            return person_kpts[idx]
-        return None
-
-    keypoints = {
-        "l_hip": get_pt(11), "r_hip": get_pt(12),
-        "l_knee": get_pt(13), "r_knee": get_pt(14),
-        "l_ankle": get_pt(15), "r_ankle": get_pt(16),
-    }
-
-    hip_y = None
-    hip_coords = [keypoints["l_hip"], keypoints["r_hip"]]
-    hip_coords = [p for p in hip_coords if p is not None]
-    if hip_coords:
-        hip_y = float(np.mean([p[1] for p in hip_coords]))
-
-    knee_angles = []
-    if keypoints["l_hip"] is not None and keypoints["l_knee"] is not None and keypoints["l_ankle"] is not None:
-        knee_angles.append(calculate_angle(keypoints["l_hip"], keypoints["l_knee"], keypoints["l_ankle"]))
-    if keypoints["r_hip"] is not None and keypoints["r_knee"] is not None and keypoints["r_ankle"] is not None:
-        knee_angles.append(calculate_angle(keypoints["r_hip"], keypoints["r_knee"], keypoints["r_ankle"]))
-    knee_angle = float(np.mean(knee_angles)) if knee_angles else None
-
-    return hip_y, knee_angle, keypoints
-
-
-def draw_debug_overlay_squat(frame, kpts, knee_angle, depth_threshold):
-    """Draw knee angles and depth cue for squat."""
-    color = (0, 255, 0) if (knee_angle is not None and knee_angle <= depth_threshold) else (0, 0, 255)
-
-    if kpts["l_hip"] is not None and kpts["l_knee"] is not None and kpts["l_ankle"] is not None:
-        cv2.line(frame, tuple(kpts["l_hip"].astype(int)), tuple(kpts["l_knee"].astype(int)), (255, 255, 0), 2)
-        cv2.line(frame, tuple(kpts["l_knee"].astype(int)), tuple(kpts["l_ankle"].astype(int)), (255, 255, 0), 2)
-    if kpts["r_hip"] is not None and kpts["r_knee"] is not None and kpts["r_ankle"] is not None:
-        cv2.line(frame, tuple(kpts["r_hip"].astype(int)), tuple(kpts["r_knee"].astype(int)), (255, 255, 0), 2)
-        cv2.line(frame, tuple(kpts["r_knee"].astype(int)), tuple(kpts["r_ankle"].astype(int)), (255, 255, 0), 2)
-
-    if knee_angle is not None:
-        cv2.putText(frame, f"Knee: {int(knee_angle)} deg", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-    return frame
-
-
-# ---------- Plank Functions ----------
-# Alignment: angle at hip (shoulder-hip-ankle). Good plank = straight line = ~180°. Works from any camera angle.
-
-def _plank_midpoints(kpts):
-    """Get mid shoulder, mid hip, mid ankle from keypoints dict."""
-    sh = None
-    if kpts["l_sh"] is not None and kpts["r_sh"] is not None:
-        sh = (kpts["l_sh"] + kpts["r_sh"]) / 2
-    elif kpts["l_sh"] is not None:
-        sh = kpts["l_sh"]
-    elif kpts["r_sh"] is not None:
-        sh = kpts["r_sh"]
-    hip = None
-    if kpts["l_hip"] is not None and kpts["r_hip"] is not None:
-        hip = (kpts["l_hip"] + kpts["r_hip"]) / 2
-    elif kpts["l_hip"] is not None:
-        hip = kpts["l_hip"]
-    elif kpts["r_hip"] is not None:
-        hip = kpts["r_hip"]
-    ankle = None
-    if kpts["l_ankle"] is not None and kpts["r_ankle"] is not None:
-        ankle = (kpts["l_ankle"] + kpts["r_ankle"]) / 2
-    elif kpts["l_ankle"] is not None:
-        ankle = kpts["l_ankle"]
-    elif kpts["r_ankle"] is not None:
-        ankle = kpts["r_ankle"]
-    return sh, hip, ankle
-
-
-def get_pose_details_plank(results):
-    """
-    Extracts keypoints for plank analysis.
-    Returns: hip_angle_deg, keypoints dict.
-    hip_angle: angle at the hip (shoulder-hip-ankle). Straight line = 180°. Sag or pike deviates from 180°.
-    This is independent of camera position.
-    """
-    if results is None or len(results) == 0:
-        return None, None
-
-    r = results[0]
-    if r.keypoints is None or r.keypoints.xy is None:
-        return None, None
-
-    kpts = r.keypoints.xy
-    if kpts.shape[0] == 0:
-        return None, None
-
-    dets = r.boxes
-    if dets is None or len(dets) == 0:
-        return None, None
-
-    scores = dets.conf.cpu().numpy()
-    main_idx = int(scores.argmax())
-    person_kpts = kpts[main_idx].cpu().numpy()
-
-    def get_pt(idx):
-        if idx < len(person_kpts) and person_kpts[idx][0] != 0 and person_kpts[idx][1] != 0:
-            return person_kpts[idx]
-        return None
-
-    keypoints = {
-        "l_sh": get_pt(5), "r_sh": get_pt(6),
-        "l_hip": get_pt(11), "r_hip": get_pt(12),
-        "l_ankle": get_pt(15), "r_ankle": get_pt(16),
-    }
-
-    sh, hip, ankle = _plank_midpoints(keypoints)
-    hip_angle = None
-    if sh is not None and hip is not None and ankle is not None:
-        hip_angle = float(calculate_angle(sh, hip, ankle))
-
-    return hip_angle, keypoints
-
-
-def draw_debug_overlay_plank(frame, kpts, hip_angle, tolerance):
-    """Draw shoulder-hip-ankle line. Good = angle within tolerance of 180°."""
-    good = hip_angle is not None and abs(hip_angle - 180.0) <= tolerance
-    color = (0, 255, 0) if good else (0, 0, 255)
-
-    sh, hip, ankle = _plank_midpoints(kpts)
-    if sh is not None and hip is not None:
-        cv2.line(frame, tuple(sh.astype(int)), tuple(hip.astype(int)), color, 3)
-    if hip is not None and ankle is not None:
-        cv2.line(frame, tuple(hip.astype(int)), tuple(ankle.astype(int)), color, 3)
-
-    if hip_angle is not None:
-        cv2.putText(frame, f"Hip angle: {int(hip_angle)} deg", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-    return frame
+# ---------- Page Functions ----------
 
+def roi_tracking_toggle(key):
+    """Sidebar switch for running follow-up inferences on a crop around the athlete."""
+    return st.sidebar.checkbox(
+        "Track athlete (crop to person)",
+        value=False,
+        key=key,
+        help="After a confident detection, later frames run on a padded crop around the athlete at a smaller "
+             "input size. Faster when you fill a small part of the frame; falls back to the full frame if lost."
+    )
 
-# ---------- Page Functions ----------
 
 def show_landing_page():
     """Display the landing page with mission, features, and contact info."""
@@ -606,6 +269,9 @@ def show_landing_page():
 
 def show_workout_schedule():
     """Display today's workout schedule."""
+    # Every card leads to the analysis page: start importing its stack now.
+    preload_analysis_stack()
+
     # Header
     today = datetime.now().strftime("%B %d, %Y")
     st.title("📅 Today’s workout")
@@ -696,123 +362,389 @@ def show_workout_schedule():
 
     st.markdown("<br>", unsafe_allow_html=True)
 
+    # Whole-session Card
+    st.markdown(
+        """
+        <div class="flow-card">
+            <div class="eyebrow">Full session</div>
+            <h2 style="margin:6px 0;">🎬 Whole workout video</h2>
+            <p style="margin: 0 0 12px;"><strong>One recording, every exercise</strong></p>
+            <p style="margin:0;">Upload the full session. We find the pull-up, push-up, squat and plank sets and score each one.</p>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+    if st.button("▶️ Analyze a full workout", key="start_workout", use_container_width=True, type="primary"):
+        st.session_state.page = "exercise"
+        st.session_state.exercise = "workout"
+        st.rerun()
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+
+# The analysis stack (OpenCV, and torch once a model loads) is imported on first use, so the
+# landing and schedule pages start without it. Streamlit reruns this script on every
+# interaction, but repeated imports are just a sys.modules lookup.
+
+@st.cache_resource
+def get_job_manager():
+    """One analysis job manager (and worker pool) per server process, shared by all sessions."""
+    from analysis_jobs import AnalysisJobManager
+
+    return AnalysisJobManager()
+
+
+@st.cache_resource
+def get_rep_media():
+    """Shared on-demand cache of rep thumbnails and clips."""
+    from rep_media import RepMediaCache
+
+    return RepMediaCache()
+
+
+@st.cache_resource
+def preload_analysis_stack():
+    """Imports the analysis modules (and ultralytics/torch) in the background, once per server process."""
+    def preload():
+        import analysis_jobs
+        if not os.environ.get("TRAINR_POSE_SERVER"):
+            try:
+                import ultralytics
+            except ImportError:
+                pass  # reported when the first analysis loads the model
+
+    thread = threading.Thread(target=preload, name="analysis-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def metric_lines(exercise, counts):
+    """Markdown for the two live metrics shown next to the video."""
+    if exercise == "pullup":
+        return (f"### ✅ Valid Reps: {counts.get('good_count', 0)}",
+                f"### 📊 Total Reps: {counts.get('total_reps', 0)}")
+    if exercise == "pushup":
+        return (f"### Good: {counts.get('good_count', 0)}",
+                f"### Bad: {counts.get('bad_count', 0)}")
+    if exercise == "squat":
+        return (f"### ✅ Good depth: {counts.get('good_count', 0)}",
+                f"### 📊 Valid squats: {counts.get('total_reps', 0)}")
+    if exercise == "workout":
+        return ("### 🎬 Reading your workout",
+                "Sets are found and scored once the whole video has been read.")
+    return (f"### ⏱ Total: {counts.get('total_time', 0.0):.1f}s",
+            f"### ✅ Good alignment: {counts.get('good_align_time', 0.0):.1f}s")
+
+
+def render_group_summary(summary):
+    """Per-person table for a group-mode analysis."""
+    exercise = summary["exercise"]
+    people = summary["people"]
+    st.write(f"**Group analysis complete.** {len(people)} people tracked.")
+    if not people:
+        st.info("Nobody was tracked long enough to count reps. Make sure everyone is fully in frame.")
+        return
+    rows = []
+    for person in people:
+        row = {"Person": f"#{person['person']}"}
+        if exercise == "plank":
+            row["Hold time (s)"] = round(person["total_time"], 1)
+            row["Aligned (s)"] = round(person["good_align_time"], 1)
+        elif exercise == "pushup":
+            row["Good reps"] = person["good_count"]
+            row["Flared reps"] = person["bad_count"]
+        else:
+            row["Good reps"] = person["good_count"]
+            row["Total reps"] = person["total_reps"]
+        score = person["form_score"]
+        row["Form score"] = "–" if score is None else f"{score * 100:.0f}%"
+        rows.append(row)
+    st.table(rows)
+
+
+EXERCISE_NAMES = {"pullup": "🏋️‍♂️ Pull-ups", "pushup": "🏃 Push-ups", "squat": "🦵 Squats", "plank": "🧘 Plank",
+                  "rest": "Rest"}
+
+
+def segment_result(exercise, counts):
+    """One-line result for a workout segment or exercise total."""
+    if exercise == "pushup":
+        return f"{counts['good_count']} good, {counts['bad_count']} flared"
+    if exercise == "plank":
+        return f"{counts['good_align_time']:.1f}s aligned of {counts['total_time']:.1f}s"
+    if exercise in ("pullup", "squat"):
+        return f"{counts['good_count']} good of {counts['total_reps']}"
+    return ""
+
+
+def render_workout_summary(summary):
+    """Per-exercise totals and the segment timeline of a whole-workout analysis."""
+    totals = summary["totals"]
+    st.write("**Workout analysis complete.**")
+    if not totals:
+        st.info("No exercise sets were recognised. Make sure your whole body is in frame.")
+        return
+    for exercise, counts in totals.items():
+        st.write(f"- {EXERCISE_NAMES[exercise]}: {segment_result(exercise, counts)}")
+    st.table([
+        {"From": f"{int(seg['start_time'] // 60)}:{seg['start_time'] % 60:04.1f}",
+         "To": f"{int(seg['end_time'] // 60)}:{seg['end_time'] % 60:04.1f}",
+         "Exercise": EXERCISE_NAMES[seg["exercise"]],
+         "Result": segment_result(seg["exercise"], seg)}
+        for seg in summary["segments"]
+    ])
+
+
+def render_summary(summary):
+    """Display the end-of-analysis summary for a finished job."""
+    exercise = summary["exercise"]
+    st.divider()
+    if exercise == "workout":
+        render_workout_summary(summary)
+        return
+    if "people" in summary:
+        render_group_summary(summary)
+        return
+    if exercise == "pullup":
+        good_count, total_reps = summary["good_count"], summary["total_reps"]
+        st.write(f"**Analysis Complete.**")
+        st.write(f"**Standard:** Chin above bar (head above shoulders)")
+        st.write(f"- ✅ Valid reps (chin above bar): {good_count}")
+        st.write(f"- 📊 Total reps detected: {total_reps}")
+        if total_reps > 0:
+            invalid_count = total_reps - good_count
+            if invalid_count == 0:
+                st.balloons()
+                st.success(f"Perfect! All {good_count} reps had chin above bar.")
+            else:
+                st.warning(f"{invalid_count} rep(s) did not reach chin above bar.")
+        else:
+            st.info("No reps detected. Make sure the video shows clear pull-up movements.")
+
+    elif exercise == "pushup":
+        good_count, bad_count = summary["good_count"], summary["bad_count"]
+        flare_threshold = summary["flare_threshold"]
+        st.write(f"**Analysis Complete.** Threshold used: {flare_threshold}°")
+        if bad_count == 0 and good_count > 0:
+            st.balloons()
+            st.success("Perfect form! No flaring detected.")
+        elif bad_count > 0:
+            st.error(f"Detected {bad_count} reps with flared elbows (> {flare_threshold}°).")
+
+    elif exercise == "squat":
+        total_reps, depth_threshold = summary["total_reps"], summary["depth_threshold"]
+        st.write(f"**Analysis complete.** Only reps that hit depth (knee ≤ {depth_threshold}°) are counted.")
+        st.write(f"- 📊 Valid squats: {total_reps} (all with good depth)")
+        if total_reps > 0:
+            st.balloons()
+            st.success(f"Counted {total_reps} squat(s) with good depth.")
+        else:
+            st.info("No squats detected. Get full body in frame and squat to at least knee ≤ threshold.")
+
+    elif exercise == "plank":
+        total_time, good_align_time = summary["total_time"], summary["good_align_time"]
+        st.write(f"**Plank analysis complete.** Good alignment = hip angle within ±{summary['align_threshold']}° of 180° (straight line).")
+        st.write(f"- ⏱ Total time: {total_time:.1f}s | ✅ Time in good alignment: {good_align_time:.1f}s")
+        if good_align_time >= 15:
+            st.balloons()
+            st.success("Solid plank hold with good alignment!")
+
+    if summary.get("skipped_time"):
+        st.caption(f"Skipped {summary['skipped_time']:.1f}s of idle video "
+                   f"({summary['inference_speedup']:.1f}× fewer pose detections).")
+    if "progressive" in summary:
+        progressive = summary["progressive"]
+        st.caption(f"Refined in {len(progressive['passes'])} passes: {progressive['inferred']} pose detections "
+                   f"instead of {progressive['uniform_frames']} for a full pass.")
+    if "distributed" in summary:
+        st.caption(f"Analysed by {summary['distributed']['workers']} worker(s) "
+                   f"in {summary['distributed']['tasks']} segments.")
+
+
+def show_analysis_job(job_id):
+    """Poll a background analysis job and show its progress, or its summary once done."""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        st.warning("This analysis could not be found. It may have been cleaned up.")
+        if st.button("Analyze another video", key="new_analysis"):
+            del st.query_params["job"]
+            st.rerun()
+        return
+
+    video_col, metrics_col = st.columns([2, 1])
+    with video_col:
+        preview = manager.preview(job_id)
+        if preview is not None:
+            start = time.perf_counter()
+            st.image(preview, channels="RGB", use_container_width=True)
+            st.session_state.preview_render_ms = (time.perf_counter() - start) * 1e3
+    with metrics_col:
+        for line in metric_lines(job["exercise"], job["progress"]):
+            st.markdown(line)
+        if "people" in job["progress"]:
+            st.markdown(f"### 👥 In view: {job['progress']['people']}")
+        if "workers" in job["progress"]:
+            st.markdown(f"### 🖥 Workers: {job['progress']['workers']}")
+
+    if st.button("Analyze another video", key="new_analysis"):
+        del st.query_params["job"]
+        st.rerun()
+
+    if job["status"] in ("queued", "running"):
+        fraction = job["progress"].get("fraction", 0.0)
+        label = "Waiting for a free analysis worker…" if job["status"] == "queued" else f"Analyzing… {int(fraction * 100)}%"
+        if job["progress"].get("provisional") and job["progress"]["refine_pass"] > 1:
+            label = (f"Provisional totals · refining (pass {job['progress']['refine_pass']} of "
+                     f"{job['progress']['passes']})… {int(fraction * 100)}%")
+        st.progress(fraction, text=label)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+    elif job["status"] == "failed":
+        st.error(f"Analysis failed: {job['error']}")
+    else:
+        render_summary(job["summary"])
+        export_path = job["summary"].get("export_path")
+        if export_path and os.path.exists(export_path):
+            st.video(export_path)
+            with open(export_path, "rb") as f:
+                st.download_button("Download annotated video", f.read(),
+                                   file_name=f"{job['exercise']}-analysis.mp4", mime="video/mp4")
+        if job["summary"].get("reps") and os.path.exists(job["video_path"]):
+            render_rep_review(job, manager.seek_index_path(job_id))
+        if "profile" in job["summary"]:
+            render_profile(job["summary"]["profile"], manager.trace_path(job_id))
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def rep_frames(video_path, index_path, start_frame, end_frame, max_frames=48):
+    """RGB display frames of one rep, decoded from the keyframe before it (at most max_frames)."""
+    import cv2
+    from seek_index import SeekIndex, decode_range
+
+    step = max(1, -(-(end_frame - start_frame + 1) // max_frames))
+    start = time.perf_counter()
+    frames = [(frame_idx, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+              for frame_idx, frame in decode_range(video_path, start_frame, end_frame,
+                                                   SeekIndex.load(index_path), step=step)]
+    return frames, (time.perf_counter() - start) * 1e3
+
+
+def render_rep_review(job, index_path):
+    """Rep table plus a scrubber that decodes only the selected rep."""
+    from seek_index import load_or_build_seek_index
+
+    index = load_or_build_seek_index(index_path, job["video_path"])
+    table = index.rep_table(job["summary"]["reps"])
+    st.markdown("### 🔎 Review reps")
+    st.dataframe([
+        {"rep": rep["rep"], "result": "✅" if rep["valid"] else "❌", "counted": rep["counted"],
+         "start (s)": rep["start_time"], "bottom (s)": rep["bottom_time"], "end (s)": rep["end_time"],
+         "metric": None if rep["metric"] is None else round(rep["metric"], 1)}
+        for rep in table
+    ], hide_index=True, use_container_width=True)
+    choice = st.selectbox(
+        "Jump to rep",
+        range(len(table)),
+        format_func=lambda i: f"Rep {table[i]['rep']} {'✅' if table[i]['valid'] else '❌'} "
+                              f"({table[i]['start_time']:.1f}s – {table[i]['end_time']:.1f}s)",
+        key=f"review_{job['id']}",
+    )
+    rep = table[choice]
+    frames, decode_ms = rep_frames(job["video_path"], index_path, rep["start_frame"], rep["end_frame"])
+    if not frames:
+        st.info("This rep could not be decoded from the video.")
+        return
+    numbers = [frame_idx for frame_idx, _ in frames]
+    bottom = min(numbers, key=lambda n: abs(n - rep["bottom_frame"]))
+    shown = st.select_slider("Frame", options=numbers, value=bottom, key=f"review_frame_{job['id']}_{choice}",
+                             format_func=lambda n: f"{index.time_of(n):.2f}s")
+    st.image(frames[numbers.index(shown)][1], channels="RGB", use_container_width=True)
+    st.caption(f"Decoded {len(frames)} frames of rep {rep['rep']} in {decode_ms:.0f} ms.")
+    if st.button("▶️ Play this rep", key=f"review_clip_{job['id']}_{choice}"):
+        clip = get_rep_media().clip(job["video_path"], rep, index.fps, index)
+        if clip is not None:
+            st.video(clip)
+    render_rep_thumbnails(job, table, index)
+
+
+def render_rep_thumbnails(job, table, index, max_thumbnails=24):
+    """Thumbnail strip of the bottom frame of each rep, filtered to counted or rejected reps."""
+    shown = st.radio("Thumbnails", ["Rejected", "Counted", "All"], horizontal=True, key=f"thumbs_{job['id']}")
+    reps = [rep for rep in table
+            if shown == "All" or (rep["valid"] if shown == "Counted" else not rep["valid"])]
+    if not reps:
+        st.caption(f"No {shown.lower()} reps.")
+        return
+    media = get_rep_media()
+    columns = st.columns(6)
+    for i, rep in enumerate(reps[:max_thumbnails]):
+        thumbnail = media.thumbnail(job["video_path"], rep, index)
+        if thumbnail is None:
+            continue
+        metric = "" if rep["metric"] is None else f" · {rep['metric']:.0f}°"
+        columns[i % 6].image(thumbnail, caption=f"Rep {rep['rep']} {'✅' if rep['valid'] else '❌'}{metric}",
+                             use_container_width=True)
+    if len(reps) > max_thumbnails:
+        st.caption(f"Showing the first {max_thumbnails} of {len(reps)} reps.")
+
+
+def render_profile(profile, trace_path):
+    """Sidebar panel with per-stage wall time, frame counts and throughput of a profiled run."""
+    with st.sidebar.expander("⏱ Pipeline profile", expanded=True):
+        frames = profile["frames"]
+        st.markdown(f"**{profile['effective_fps']:.1f} analysed frames/s** "
+                    f"({profile['source_fps']:.1f} video frames/s) over {profile['wall_time']:.1f}s")
+        calls = profile["stages"]["inference"]["calls"]
+        inferred = f"{frames['inferred']} inferred"
+        if calls != frames["inferred"]:
+            inferred += f" in {calls} model calls"  # ROI crop misses are re-run on the full frame
+        st.caption(f"{frames['analysed']} analysed of {frames['source']} video frames · "
+                   f"{inferred} · {frames['displayed']} previews")
+        st.table([
+            {"stage": name, "total (s)": f"{stage['total_s']:.2f}", "per call (ms)": f"{stage['mean_ms']:.1f}",
+             "share": f"{stage['share'] * 100:.0f}%"}
+            for name, stage in profile["stages"].items()
+        ])
+        render_ms = st.session_state.get("preview_render_ms")
+        if render_ms is not None:
+            st.caption(f"Last preview st.image round-trip: {render_ms:.1f} ms")
+        if os.path.exists(trace_path):
+            with open(trace_path, "rb") as f:
+                st.download_button("Download trace (JSON)", f.read(), file_name=os.path.basename(trace_path),
+                                   mime="application/json")
+
 
 def show_exercise_analysis():
     """Display exercise analysis page with video upload."""
+    from analysis_jobs import JobQueueFull
+    from form_analysis import FRAME_STRIDE
+    from workout_segmentation import WORKOUT_STRIDE
+
+    # Load a model while the user picks a video.
+    get_job_manager().warm_up()
+
     # Back button
     if st.button("← Back to Workout Schedule", key="back_schedule"):
         st.session_state.page = "workout_schedule"
         st.session_state.exercise = None
+        if "job" in st.query_params:
+            del st.query_params["job"]
         st.rerun()
-    
-    if st.session_state.exercise == "pullup":
+
+    exercise = st.session_state.exercise
+    settings = {}
+    if exercise == "pullup":
         st.subheader("🏋️‍♂️ Pull-up Analysis")
         st.sidebar.header("Configuration")
         st.sidebar.info("**Standard:** Chin must go above the bar (head above shoulders) for a valid rep.")
         st.sidebar.info("Side or rear view recommended for best results.")
-        
-        @st.cache_resource
-        def load_model():
-            return YOLO("yolov8n-pose.pt")
-        
-        uploaded_file = st.file_uploader("Upload video (Side view recommended)", type=["mp4", "mov", "avi"], key="pullup_video")
-        
-        if uploaded_file is not None:
-            suffix = os.path.splitext(uploaded_file.name)[1]
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-            tmp.write(uploaded_file.read())
-            tmp.close()
-            video_path = tmp.name
-
-            if st.button("Analyze Form", key="pullup_analyze"):
-                model = load_model()
-                cap = cv2.VideoCapture(video_path)
-
-                video_col, metrics_col = st.columns([2, 1])
-                with video_col:
-                    stframe = st.empty()
-                with metrics_col:
-                    good_metric = st.empty()
-                    total_metric = st.empty()
-
-                good_count = 0
-                total_reps = 0
-                state = "down"
-                min_head_y = None
-                max_head_y = None
-                chin_above_bar = False
-                frame_idx = 0
-                processed_count = 0
-                FRAME_STRIDE = 6
-                DISPLAY_EVERY = 4
-
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    frame_idx += 1
-                    if frame_idx % FRAME_STRIDE != 0:
-                        continue
-
-                    results = model(frame, verbose=False)
-                    head_y, shoulder_y, kpts = get_pose_details_pullup(results)
-
-                    if head_y is None or shoulder_y is None or kpts is None:
-                        continue
-
-                    if min_head_y is None:
-                        min_head_y = max_head_y = head_y
-                    min_head_y = min(min_head_y, head_y)
-                    max_head_y = max(max_head_y, head_y)
-                    head_above_shoulder = head_y < shoulder_y
-                    head_range = max_head_y - min_head_y
-                    if head_range > 0:
-                        top_thresh = min_head_y + 0.3 * head_range
-                        bottom_thresh = min_head_y + 0.7 * head_range
-                    else:
-                        top_thresh, bottom_thresh = min_head_y, max_head_y
-
-                    if state == "down" and head_y < top_thresh:
-                        state = "up"
-                        chin_above_bar = False
-                    if state == "up":
-                        if head_above_shoulder:
-                            chin_above_bar = True
-                        if head_y > bottom_thresh:
-                            state = "down"
-                            total_reps += 1
-                            if chin_above_bar:
-                                good_count += 1
-
-                    debug_frame = draw_debug_overlay_pullup(frame.copy(), kpts, head_y, shoulder_y)
-                    processed_count += 1
-                    if processed_count % DISPLAY_EVERY == 1 or processed_count == 1:
-                        stframe.image(cv2.cvtColor(debug_frame, cv2.COLOR_BGR2RGB), channels="RGB", use_container_width=True)
-
-                    good_metric.markdown(f"### ✅ Valid Reps: {good_count}")
-                    total_metric.markdown(f"### 📊 Total Reps: {total_reps}")
-
-                cap.release()
-                st.divider()
-                st.write(f"**Analysis Complete.**")
-                st.write(f"**Standard:** Chin above bar (head above shoulders)")
-                st.write(f"- ✅ Valid reps (chin above bar): {good_count}")
-                st.write(f"- 📊 Total reps detected: {total_reps}")
-                if total_reps > 0:
-                    invalid_count = total_reps - good_count
-                    if invalid_count == 0:
-                        st.balloons()
-                        st.success(f"Perfect! All {good_count} reps had chin above bar.")
-                    else:
-                        st.warning(f"{invalid_count} rep(s) did not reach chin above bar.")
-                else:
-                    st.info("No reps detected. Make sure the video shows clear pull-up movements.")
-
-    elif st.session_state.exercise == "pushup":
+        uploader_label = "Upload video (Side view recommended)"
+
+    elif exercise == "pushup":
         st.subheader("🏃 Push-up Analysis")
         st.sidebar.header("Configuration")
-        flare_threshold = st.sidebar.slider(
+        settings["flare_threshold"] = st.sidebar.slider(
             "Max Elbow Angle (Degrees)",
             min_value=45,
             max_value=90,
@@ -820,105 +752,12 @@ def show_exercise_analysis():
             help="Higher = more lenient. Lower = stricter form. >75 usually implies flaring."
         )
         st.sidebar.info("Tip: Adjust this slider until 'Good' reps are green and 'Bad' reps are red.")
+        uploader_label = "Upload video (Front view best)"
 
-        @st.cache_resource
-        def load_model():
-            return YOLO("yolov8n-pose.pt")
-
-        uploaded_file = st.file_uploader("Upload video (Front view best)", type=["mp4", "mov", "avi"], key="pushup_video")
-
-        if uploaded_file is not None:
-            suffix = os.path.splitext(uploaded_file.name)[1]
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-            tmp.write(uploaded_file.read())
-            tmp.close()
-            video_path = tmp.name
-
-            if st.button("Analyze Form", key="pushup_analyze"):
-                model = load_model()
-                cap = cv2.VideoCapture(video_path)
-
-                video_col, metrics_col = st.columns([2, 1])
-                with video_col:
-                    stframe = st.empty()
-                with metrics_col:
-                    good_metric = st.empty()
-                    bad_metric = st.empty()
-
-                good_count = bad_count = 0
-                state = "up"
-                min_y = max_y = None
-                current_rep_angles = []
-                frame_idx = 0
-                processed_count = 0
-                FRAME_STRIDE = 6
-                DISPLAY_EVERY = 4
-
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    frame_idx += 1
-                    if frame_idx % FRAME_STRIDE != 0:
-                        continue
-
-                    results = model(frame, verbose=False)
-                    current_y, kpts = get_pose_details_pushup(results)
-
-                    if current_y is None:
-                        continue
-
-                    if min_y is None: min_y = max_y = current_y
-                    min_y = min(min_y, current_y)
-                    max_y = max(max_y, current_y)
-                    range_span = max_y - min_y
-                    down_thresh = min_y + 0.6 * range_span
-                    up_thresh = min_y + 0.3 * range_span
-                    left_angle = right_angle = 0
-                    if kpts['l_sh'] and kpts['l_hip'] and kpts['l_el']:
-                        left_angle = calculate_angle(kpts['l_hip'], kpts['l_sh'], kpts['l_el'])
-                    if kpts['r_sh'] and kpts['r_hip'] and kpts['r_el']:
-                        right_angle = calculate_angle(kpts['r_hip'], kpts['r_sh'], kpts['r_el'])
-                    valid_angles = [a for a in [left_angle, right_angle] if a > 10]
-                    current_flare = np.mean(valid_angles) if valid_angles else 0
-
-                    if state == "up" and current_y > down_thresh:
-                        state = "down"
-                        current_rep_angles = []
-                    if state == "down":
-                        if current_flare > 0:
-                            current_rep_angles.append(current_flare)
-                        if current_y < up_thresh:
-                            state = "up"
-                            if current_rep_angles:
-                                rep_max_flare = np.median(current_rep_angles)
-                                if rep_max_flare > flare_threshold:
-                                    bad_count += 1
-                                else:
-                                    good_count += 1
-
-                    debug_frame = draw_debug_overlay_pushup(frame.copy(), kpts, current_flare, flare_threshold)
-                    processed_count += 1
-                    if processed_count % DISPLAY_EVERY == 1 or processed_count == 1:
-                        stframe.image(cv2.cvtColor(debug_frame, cv2.COLOR_BGR2RGB), channels="RGB", use_container_width=True)
-
-                    good_metric.markdown(f"### Good: {good_count}")
-                    bad_metric.markdown(f"### Bad: {bad_count}")
-
-                cap.release()
-                st.divider()
-                st.write(f"**Analysis Complete.** Threshold used: {flare_threshold}°")
-                if bad_count == 0 and good_count > 0:
-                    st.balloons()
-                    st.success("Perfect form! No flaring detected.")
-                elif bad_count > 0:
-                    st.error(f"Detected {bad_count} reps with flared elbows (> {flare_threshold}°).")
-
-    elif st.session_state.exercise == "squat":
+    elif exercise == "squat":
         st.subheader("🦵 Squat Analysis")
         st.sidebar.header("Configuration")
-        depth_threshold = st.sidebar.slider(
+        settings["depth_threshold"] = st.sidebar.slider(
             "Max knee angle at bottom (degrees)",
             min_value=70,
             max_value=120,
@@ -926,99 +765,12 @@ def show_exercise_analysis():
             help="Knee angle (hip-knee-ankle). Lower = deeper squat required for a 'good' rep."
         )
         st.sidebar.info("Side or front view. A rep counts only when you hit depth (knee ≤ threshold) and come back up—walking or small movements are ignored.")
+        uploader_label = "Upload video (Side or front view)"
 
-        @st.cache_resource
-        def load_model():
-            return YOLO("yolov8n-pose.pt")
-
-        uploaded_file = st.file_uploader("Upload video (Side or front view)", type=["mp4", "mov", "avi"], key="squat_video")
-
-        if uploaded_file is not None:
-            suffix = os.path.splitext(uploaded_file.name)[1]
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-            tmp.write(uploaded_file.read())
-            tmp.close()
-            video_path = tmp.name
-
-            if st.button("Analyze Form", key="squat_analyze"):
-                model = load_model()
-                cap = cv2.VideoCapture(video_path)
-
-                video_col, metrics_col = st.columns([2, 1])
-                with video_col:
-                    stframe = st.empty()
-                with metrics_col:
-                    good_metric = st.empty()
-                    total_metric = st.empty()
-
-                good_count = total_reps = 0
-                state = "up"
-                min_hip_y = max_hip_y = None
-                rep_knee_angles = []
-                frame_idx = 0
-                processed_count = 0
-                FRAME_STRIDE = 6
-                DISPLAY_EVERY = 4
-
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    frame_idx += 1
-                    if frame_idx % FRAME_STRIDE != 0:
-                        continue
-
-                    results = model(frame, verbose=False)
-                    hip_y, knee_angle, kpts = get_pose_details_squat(results)
-
-                    if hip_y is None:
-                        continue
-
-                    if min_hip_y is None:
-                        min_hip_y = max_hip_y = hip_y
-                    min_hip_y = min(min_hip_y, hip_y)
-                    max_hip_y = max(max_hip_y, hip_y)
-                    range_span = max_hip_y - min_hip_y
-                    down_thresh = min_hip_y + 0.55 * range_span
-                    up_thresh = min_hip_y + 0.35 * range_span
-
-                    if state == "up" and hip_y > down_thresh:
-                        state = "down"
-                        rep_knee_angles = []
-                    if state == "down":
-                        if knee_angle is not None and knee_angle > 10:
-                            rep_knee_angles.append(knee_angle)
-                        if hip_y < up_thresh:
-                            state = "up"
-                            if rep_knee_angles:
-                                bottom_angle = min(rep_knee_angles)
-                                if bottom_angle <= depth_threshold:
-                                    total_reps += 1
-                                    good_count += 1
-
-                    debug_frame = draw_debug_overlay_squat(frame.copy(), kpts, knee_angle, depth_threshold)
-                    processed_count += 1
-                    if processed_count % DISPLAY_EVERY == 1 or processed_count == 1:
-                        stframe.image(cv2.cvtColor(debug_frame, cv2.COLOR_BGR2RGB), channels="RGB", use_container_width=True)
-
-                    good_metric.markdown(f"### ✅ Good depth: {good_count}")
-                    total_metric.markdown(f"### 📊 Valid squats: {total_reps}")
-
-                cap.release()
-                st.divider()
-                st.write(f"**Analysis complete.** Only reps that hit depth (knee ≤ {depth_threshold}°) are counted.")
-                st.write(f"- 📊 Valid squats: {total_reps} (all with good depth)")
-                if total_reps > 0:
-                    st.balloons()
-                    st.success(f"Counted {total_reps} squat(s) with good depth.")
-                else:
-                    st.info("No squats detected. Get full body in frame and squat to at least knee ≤ threshold.")
-
-    elif st.session_state.exercise == "plank":
+    elif exercise == "plank":
         st.subheader("🧘 Plank Analysis")
         st.sidebar.header("Configuration")
-        align_threshold = st.sidebar.slider(
+        settings["align_threshold"] = st.sidebar.slider(
             "Tolerance from straight (degrees)",
             min_value=10,
             max_value=50,
@@ -1026,71 +778,94 @@ def show_exercise_analysis():
             help="Straight line = 180° at the hip. Good alignment = within this many degrees of 180°. Works from any camera angle."
         )
         st.sidebar.info("We measure shoulder–hip–ankle angle (180° = straight). No need for a perfect camera position.")
+        uploader_label = "Upload video (Side view best)"
+
+    elif exercise == "workout":
+        st.subheader("🎬 Full Workout Analysis")
+        st.sidebar.header("Configuration")
+        settings["flare_threshold"] = st.sidebar.slider("Push-ups: max elbow angle (degrees)", 45, 90, 75)
+        settings["depth_threshold"] = st.sidebar.slider("Squats: max knee angle at bottom (degrees)", 70, 120, 100)
+        settings["align_threshold"] = st.sidebar.slider("Plank: tolerance from straight (degrees)", 10, 50, 25)
+        st.sidebar.info("Pose detection runs once over the whole video; each set is then scored "
+                        "with the matching exercise rules. Keep your full body in frame.")
+        uploader_label = "Upload your workout video"
+
+    else:
+        return
+
+    settings["roi_tracking"] = roi_tracking_toggle(f"{exercise}_roi")
+    settings["skip_idle"] = st.sidebar.checkbox(
+        "Skip idle segments",
+        value=True,
+        key=f"{exercise}_skip_idle",
+        help="Skips pose detection while nothing in the video moves (setup, rest, walking off). "
+             "Planks keep scoring the last detected pose. Not used by Quick first estimate, "
+             "which already samples still stretches only about once per second."
+    )
+    base_stride = WORKOUT_STRIDE if exercise == "workout" else FRAME_STRIDE[exercise]
+    settings["stride_scale"] = st.sidebar.select_slider(
+        "Analysis speed",
+        options=[1, 2, 3],
+        value=1,
+        format_func=lambda v: f"{v}× (every {v * base_stride} frames)",
+        key=f"{exercise}_stride_scale",
+        help="Samples fewer frames for faster analysis. Keypoints are smoothed over time, so 2–3× "
+             "usually gives the same rep count on clear videos."
+    )
+    if exercise != "workout":
+        settings["multi_person"] = st.sidebar.checkbox(
+            "Group mode (everyone in view)",
+            value=False,
+            key=f"{exercise}_multi_person",
+            help="Tracks every person in the video and counts reps for each of them, "
+                 "e.g. a class filmed from one camera. Ignored when exporting a video."
+        )
+        settings["export_video"] = st.sidebar.checkbox(
+            "Export annotated video",
+            value=False,
+            key=f"{exercise}_export_video",
+            help="Saves an MP4 with the skeleton, angles and rep counter at the original frame rate. "
+                 "Poses between analysed frames are interpolated, so this costs little extra time."
+        )
+        settings["progressive"] = st.sidebar.checkbox(
+            "Quick first estimate",
+            value=False,
+            key=f"{exercise}_progressive",
+            help="Shows provisional totals from about one frame per second within seconds, then refines "
+                 "only around reps and pose changes. Usually needs fewer frames than the full pass. "
+                 "Replaces Skip idle segments. Ignored in group mode or when exporting a video."
+        )
+    settings["profile"] = st.sidebar.checkbox(
+        "Profile pipeline",
+        value=False,
+        key=f"{exercise}_profile",
+        help="Times decode, pose detection, keypoint processing, overlay and preview stages "
+             "and saves a JSON trace of the run."
+    )
 
-        @st.cache_resource
-        def load_model():
-            return YOLO("yolov8n-pose.pt")
-
-        uploaded_file = st.file_uploader("Upload video (Side view best)", type=["mp4", "mov", "avi"], key="plank_video")
-
-        if uploaded_file is not None:
-            suffix = os.path.splitext(uploaded_file.name)[1]
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-            tmp.write(uploaded_file.read())
-            tmp.close()
-            video_path = tmp.name
-
-            if st.button("Analyze Form", key="plank_analyze"):
-                model = load_model()
-                cap = cv2.VideoCapture(video_path)
-                fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-                frame_duration = 1.0 / fps
-
-                video_col, metrics_col = st.columns([2, 1])
-                with video_col:
-                    stframe = st.empty()
-                with metrics_col:
-                    time_metric = st.empty()
-                    align_metric = st.empty()
-
-                total_time = 0.0
-                good_align_time = 0.0
-                frame_idx = 0
-                processed_count = 0
-                FRAME_STRIDE = 4
-                DISPLAY_EVERY = 4
-
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    frame_idx += 1
-                    if frame_idx % FRAME_STRIDE != 0:
-                        continue
-
-                    total_time = frame_idx * frame_duration
-                    results = model(frame, verbose=False)
-                    hip_angle, kpts = get_pose_details_plank(results)
-
-                    if hip_angle is not None and abs(hip_angle - 180.0) <= align_threshold:
-                        good_align_time += frame_duration * FRAME_STRIDE
-
-                    debug_frame = draw_debug_overlay_plank(frame.copy(), kpts, hip_angle, align_threshold)
-                    processed_count += 1
-                    if processed_count % DISPLAY_EVERY == 1 or processed_count == 1:
-                        stframe.image(cv2.cvtColor(debug_frame, cv2.COLOR_BGR2RGB), channels="RGB", use_container_width=True)
-
-                    time_metric.markdown(f"### ⏱ Total: {total_time:.1f}s")
-                    align_metric.markdown(f"### ✅ Good alignment: {good_align_time:.1f}s")
-
-                cap.release()
-                st.divider()
-                st.write(f"**Plank analysis complete.** Good alignment = hip angle within ±{align_threshold}° of 180° (straight line).")
-                st.write(f"- ⏱ Total time: {total_time:.1f}s | ✅ Time in good alignment: {good_align_time:.1f}s")
-                if good_align_time >= 15:
-                    st.balloons()
-                    st.success("Solid plank hold with good alignment!")
+    job_id = st.query_params.get("job")
+    if job_id:
+        show_analysis_job(job_id)
+        return
+
+    uploaded_file = st.file_uploader(uploader_label, type=["mp4", "mov", "avi"], key=f"{exercise}_video")
+
+    if uploaded_file is not None:
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        tmp.write(uploaded_file.read())
+        tmp.close()
+        video_path = tmp.name
+
+        if st.button("Analyze Form", key=f"{exercise}_analyze"):
+            try:
+                job_id = get_job_manager().submit(video_path, exercise, settings)
+            except JobQueueFull as exc:
+                st.warning(str(exc))
+                return
+            # Keep the job id in the URL so a refresh or a new tab reattaches to it.
+            st.query_params["job"] = job_id
+            st.rerun()
 
 
 # ---------- Streamlit App ----------
@@ -1104,6 +879,13 @@ if "page" not in st.session_state:
 if "exercise" not in st.session_state:
     st.session_state.exercise = None
 
+# Reattach to a running or finished analysis after a browser refresh
+if "job" in st.query_params and st.session_state.page == "landing":
+    job = get_job_manager().get(st.query_params["job"])
+    if job is not None:
+        st.session_state.page = "exercise"
+        st.session_state.exercise = job["exercise"]
+
 # Route to appropriate page
 if st.session_state.page == "landing":
     show_landing_page()
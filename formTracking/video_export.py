@@ -0,0 +1,208 @@
+import queue
+import threading
+import cv2
+import numpy as np
+from form_analysis import (
+    DEFAULT_SETTINGS, DISPLAY_EVERY, EXERCISES, FRAME_STRIDE, THRESHOLD_KEYS,
+    draw_debug_overlay_plank, draw_debug_overlay_pullup, draw_debug_overlay_pushup, draw_debug_overlay_squat,
+    feed_rep_counter, get_pose_details_plank, get_pose_details_pullup, get_pose_details_pushup,
+    get_pose_details_squat, pushup_flare_angle,
+)
+from motion_gate import MotionGatedModel
+from pose_backends import PersonROITracker, keypoints_as_results, main_person_keypoints
+from rep_counters import make_rep_counter
+from video_io import VideoFrameReader
+
+
+# ---------- Background Encoder ----------
+
+class BackgroundVideoWriter:
+    """
+    cv2.VideoWriter running on its own thread behind a bounded queue.
+
+    write() only enqueues, so encoding overlaps with inference; it blocks only when
+    `max_queue` frames are already waiting, which bounds memory if the encoder falls
+    behind for good. The first fourcc the local OpenCV build can open is used
+    (H.264 plays in browsers, mp4v is the fallback every build has).
+    Encoder errors are re-raised from write() or close().
+    """
+
+    def __init__(self, path, fps, size, max_queue=64, fourccs=("avc1", "mp4v")):
+        self.path = path
+        self.writer = None
+        for code in fourccs:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*code), fps, size)
+            if writer.isOpened():
+                self.writer, self.fourcc = writer, code
+                break
+            writer.release()
+        if self.writer is None:
+            raise RuntimeError(f"could not open a video encoder for {path} ({', '.join(fourccs)})")
+        self.frames_written = 0
+        self.max_backlog = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="video-encoder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            if self._error is not None:
+                continue  # keep draining so write() never blocks on a dead encoder
+            try:
+                self.writer.write(frame)
+                self.frames_written += 1
+            except Exception as exc:
+                self._error = exc
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+        self.max_backlog = max(self.max_backlog, self._queue.qsize())
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.release()
+        if self._error is not None:
+            raise self._error
+
+
+# ---------- Keypoint Interpolation ----------
+
+def interpolate_keypoints(prev, nxt, w):
+    """
+    Keypoints (17, 2) at fraction w in [0, 1] between two inferred frames.
+    Joints visible in both are linearly interpolated; a joint seen in only one of them
+    is taken from that frame while it is the nearer one, and is missing (0, 0) otherwise.
+    """
+    if prev is None and nxt is None:
+        return None
+    if prev is None:
+        return nxt if w >= 0.5 else None
+    if nxt is None:
+        return prev if w < 0.5 else None
+    seen_prev = (prev != 0).all(axis=1)
+    seen_next = (nxt != 0).all(axis=1)
+    nearest = prev if w < 0.5 else nxt
+    seen_nearest = seen_prev if w < 0.5 else seen_next
+    out = np.where(seen_nearest[:, None], nearest, 0.0)
+    both = seen_prev & seen_next
+    out[both] = prev[both] + (nxt[both] - prev[both]) * w
+    return out
+
+
+# ---------- Annotated Export ----------
+
+def _draw_overlay(exercise, frame, results, settings):
+    """Draws the exercise overlay for one frame's pose results, where the analysis loop would draw it."""
+    if exercise == "pullup":
+        head_y, shoulder_y, details = get_pose_details_pullup(results)
+        if head_y is not None and shoulder_y is not None and details is not None:
+            draw_debug_overlay_pullup(frame, details, head_y, shoulder_y)
+    elif exercise == "pushup":
+        torso_y, details = get_pose_details_pushup(results)
+        if torso_y is not None:
+            draw_debug_overlay_pushup(frame, details, pushup_flare_angle(details), settings["flare_threshold"])
+    elif exercise == "squat":
+        hip_y, knee_angle, details = get_pose_details_squat(results)
+        if hip_y is not None:
+            draw_debug_overlay_squat(frame, details, knee_angle, settings["depth_threshold"])
+    else:
+        hip_angle, details = get_pose_details_plank(results)
+        if details is not None:
+            draw_debug_overlay_plank(frame, details, hip_angle, settings["align_threshold"])
+    return frame
+
+
+def draw_rep_counter(frame, exercise, counts):
+    """Rep (or hold time) counter in the bottom-left corner."""
+    if exercise == "plank":
+        text = f"Time {counts['total_time']:.1f}s | Aligned {counts['good_align_time']:.1f}s"
+    elif exercise == "pushup":
+        text = f"Good {counts['good_count']} | Bad {counts['bad_count']}"
+    else:
+        text = f"Good {counts['good_count']} | Reps {counts['total_reps']}"
+    origin = (10, frame.shape[0] - 15)
+    cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 4)
+    cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    return frame
+
+
+def export_annotated_video(video_path, exercise, settings, model, out_path, on_progress=None,
+                           export_size=720):
+    """
+    Writes the analysis overlay and rep counter for every source frame to out_path (MP4)
+    and returns the same summary dict as analyze_video.
+
+    Every frame is decoded, but the model only runs on the exercise's usual stride; the
+    main person's keypoints for the frames in between are interpolated, so the export
+    plays at the source fps at the inference cost of a normal analysis. Frames wait in a
+    short lookahead buffer (one stride) until the next inferred frame arrives. Only the
+    inferred frames feed the rep counter, as in analyze_video, so the summary matches it;
+    interpolated frames are only drawn. With skip_idle, idle frames are gated the same way.
+    on_progress(progress, preview) is called once per inferred frame.
+    """
+    if exercise not in EXERCISES:
+        raise ValueError(f"Unknown exercise: {exercise}")
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    stride = FRAME_STRIDE[exercise] * int(settings["stride_scale"])
+    pose_model = PersonROITracker(model) if settings["roi_tracking"] else model
+    gate = None
+    if settings["skip_idle"]:
+        gate = pose_model = MotionGatedModel(pose_model, reuse_last=(exercise == "plank"))
+    reader = VideoFrameReader(video_path, analysis_size=export_size, stride=1)
+    if reader.analysis_size == (0, 0):
+        raise ValueError("could not decode any frames")
+    counter = make_rep_counter(exercise, settings, fps=reader.fps)
+    writer = BackgroundVideoWriter(out_path, reader.fps, reader.analysis_size)
+
+    def emit(frame_idx, frame, kpts, inferred_frame=False):
+        results = keypoints_as_results(kpts)
+        if inferred_frame:
+            feed_rep_counter(exercise, counter, frame_idx, results)
+        _draw_overlay(exercise, frame, results, settings)
+        writer.write(draw_rep_counter(frame, exercise, counter.counts()))
+
+    prev_kpts = None
+    prev_idx = 0
+    pending = []
+    inferred = 0
+    try:
+        for frame_idx, frame in reader:
+            if frame_idx % stride != 0:
+                pending.append((frame_idx, frame))
+                continue
+            kpts = main_person_keypoints(pose_model(frame, verbose=False))
+            inferred += 1
+            for idx, buffered in pending:
+                # Frames before the first inference just hold its pose.
+                w = 1.0 if inferred == 1 else (idx - prev_idx) / (frame_idx - prev_idx)
+                emit(idx, buffered, interpolate_keypoints(prev_kpts, kpts, w))
+            pending = []
+            emit(frame_idx, frame, kpts, inferred_frame=True)
+            prev_kpts, prev_idx = kpts, frame_idx
+            if on_progress is not None:
+                preview = reader.to_display(frame) if inferred % DISPLAY_EVERY == 1 else None
+                fraction = min(1.0, frame_idx / reader.frame_count) if reader.frame_count else 0.0
+                on_progress(dict(counter.counts(), frame_idx=frame_idx, frame_count=reader.frame_count,
+                                 fraction=fraction), preview)
+        # Frames after the last inference keep its pose.
+        for idx, buffered in pending:
+            emit(idx, buffered, prev_kpts)
+    finally:
+        reader.release()
+        writer.close()
+
+    summary = dict(counter.counts(), reps=counter.reps)
+    for key in THRESHOLD_KEYS[exercise]:
+        summary[key] = settings[key]
+    summary.update(exercise=exercise, frames_processed=inferred, fps=reader.fps, export_path=out_path,
+                   export_frames=writer.frames_written, export_codec=writer.fourcc)
+    if gate is not None:
+        summary.update(gate.stats(reader.fps, stride))
+    return summary
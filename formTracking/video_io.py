@@ -0,0 +1,197 @@
+import bisect
+import shutil
+import subprocess
+from array import array
+import cv2
+import numpy as np
+
+
+# ---------- Helper Functions ----------
+
+def fit_size(width, height, max_side):
+    """
+    Scales (width, height) so the longer side is at most max_side, keeping aspect ratio.
+    Never upscales. Dimensions are rounded to even numbers for the decoder's scaler.
+    """
+    scale = min(1.0, float(max_side) / max(width, height))
+    w = max(2, int(round(width * scale / 2)) * 2)
+    h = max(2, int(round(height * scale / 2)) * 2)
+    return w, h
+
+
+# ---------- Video Decoding ----------
+
+class VideoFrameReader:
+    """
+    Decodes a video straight to the analysis resolution.
+
+    Yields (frame_idx, frame) for every `stride`-th frame, where frame_idx is the
+    1-based source frame number (the same numbering the analysis loops used) and
+    frame is a BGR array whose longer side is at most `analysis_size`.
+
+    When ffmpeg is on PATH, frame selection and scaling run inside the decoder and
+    only analysis-sized frames are piped into Python. Otherwise OpenCV is used:
+    skipped frames are only grabbed (no BGR conversion or copy) and kept frames are
+    resized with INTER_AREA before they reach the loop.
+
+    alloc(shape) may supply the destination array for each frame (for example a
+    shared-memory slot); frames are then decoded or resized straight into it.
+
+    The OpenCV path also records every source frame's presentation time (ms) in
+    `timestamps` as it goes, for seek_index; the ffmpeg path leaves it empty.
+    """
+
+    def __init__(self, path, analysis_size=640, display_size=480, stride=1, use_ffmpeg=None, alloc=None):
+        self.path = path
+        self.stride = max(1, int(stride))
+        self.display_size = display_size
+        self.alloc = alloc
+
+        cap = cv2.VideoCapture(path)
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        # Read one frame to get the orientation-corrected size (phone videos carry rotation metadata).
+        ok, first = cap.read()
+        cap.release()
+        if ok:
+            self.source_size = (first.shape[1], first.shape[0])
+        else:
+            self.source_size = (0, 0)
+        self.analysis_size = fit_size(*self.source_size, analysis_size) if ok else (0, 0)
+
+        if use_ffmpeg is None:
+            use_ffmpeg = shutil.which("ffmpeg") is not None
+        self.use_ffmpeg = bool(use_ffmpeg) and ok
+        self._proc = None
+        self._cap = None
+        self.timestamps = array("d")
+
+    def __iter__(self):
+        if self.analysis_size == (0, 0):
+            return iter(())
+        if self.use_ffmpeg:
+            return self._iter_ffmpeg()
+        return self._iter_opencv()
+
+    def _iter_opencv(self):
+        self._cap = cv2.VideoCapture(self.path)
+        w, h = self.analysis_size
+        frame_idx = 0
+        self.timestamps = array("d")
+        try:
+            while True:
+                frame_idx += 1
+                if frame_idx % self.stride != 0:
+                    if not self._cap.grab():
+                        break
+                    self.timestamps.append(self._cap.get(cv2.CAP_PROP_POS_MSEC))
+                    continue
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                self.timestamps.append(self._cap.get(cv2.CAP_PROP_POS_MSEC))
+                needs_resize = (frame.shape[1], frame.shape[0]) != (w, h)
+                if self.alloc is not None:
+                    out = self.alloc((h, w, 3))
+                    if needs_resize:
+                        cv2.resize(frame, (w, h), dst=out, interpolation=cv2.INTER_AREA)
+                    else:
+                        out[...] = frame
+                    frame = out
+                elif needs_resize:
+                    frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+                yield frame_idx, frame
+        finally:
+            self.release()
+
+    def _iter_ffmpeg(self):
+        w, h = self.analysis_size
+        filters = []
+        if self.stride > 1:
+            filters.append(f"select='not(mod(n+1\\,{self.stride}))'")
+        filters.append(f"scale={w}:{h}:flags=area")
+        cmd = [
+            "ffmpeg", "-v", "error", "-nostdin", "-i", self.path,
+            "-an", "-sn", "-vf", ",".join(filters), "-vsync", "0",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1",
+        ]
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=w * h * 3)
+        frame_bytes = w * h * 3
+        out_idx = 0
+        try:
+            while True:
+                if self.alloc is not None:
+                    frame = self.alloc((h, w, 3))
+                else:
+                    frame = np.empty((h, w, 3), dtype=np.uint8)
+                view = memoryview(frame).cast("B")
+                filled = 0
+                while filled < frame_bytes:
+                    n = self._proc.stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < frame_bytes:
+                    break
+                out_idx += 1
+                yield out_idx * self.stride, frame
+        finally:
+            self.release()
+
+    def read_frames(self, frame_indices, seek_gap=90, keyframes=None):
+        """
+        Yields (frame_idx, frame) for the given 1-based frame numbers (in ascending order),
+        ignoring the stride. Short gaps are grabbed through; gaps longer than `seek_gap`
+        frames are skipped with a seek, so sparse passes over long videos stay cheap.
+        With `keyframes` (ascending 1-based frame numbers, e.g. from
+        seek_index.probe_keyframes), a short gap with a keyframe in it is skipped by seeking
+        to that keyframe, so only the frames from there on are decoded.
+        Always decodes with OpenCV.
+        """
+        if self.analysis_size == (0, 0):
+            return
+        self._cap = cv2.VideoCapture(self.path)
+        w, h = self.analysis_size
+        position = 0  # frames consumed so far; the next read returns frame position + 1
+        try:
+            for frame_idx in frame_indices:
+                if frame_idx <= position:
+                    continue
+                if frame_idx - position - 1 > seek_gap:
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx - 1)
+                    position = frame_idx - 1
+                elif keyframes is not None:
+                    i = bisect.bisect_right(keyframes, frame_idx)
+                    if i and keyframes[i - 1] - 1 > position:
+                        self._cap.set(cv2.CAP_PROP_POS_FRAMES, keyframes[i - 1] - 1)
+                        position = keyframes[i - 1] - 1
+                while position < frame_idx - 1:
+                    if not self._cap.grab():
+                        return
+                    position += 1
+                ret, frame = self._cap.read()
+                if not ret:
+                    return
+                position += 1
+                if (frame.shape[1], frame.shape[0]) != (w, h):
+                    frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+                yield frame_idx, frame
+        finally:
+            self.release()
+
+    def to_display(self, frame):
+        """Downscales an analysis frame to the display size and converts it to RGB for st.image."""
+        w, h = fit_size(frame.shape[1], frame.shape[0], self.display_size)
+        if (w, h) != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        if self._proc is not None:
+            self._proc.stdout.close()
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
@@ -0,0 +1,209 @@
+import numpy as np
+from form_analysis import DEFAULT_SETTINGS, DISPLAY_EVERY, FRAME_STRIDE, feed_rep_counter
+from frame_ring import RingVideoReader
+from motion_gate import MotionGatedModel
+from pose_backends import PersonROITracker, keypoints_as_results, main_person_keypoints
+from rep_counters import make_rep_counter
+from seek_index import SeekIndex, build_seek_index
+from video_io import VideoFrameReader
+
+
+# ---------- Keypoint Timeline ----------
+# One decode + inference pass stores the main person's keypoints for every sampled frame.
+# Everything after that (classification, rep counting) replays the stored timeline.
+
+WORKOUT_STRIDE = min(FRAME_STRIDE.values())
+WINDOW_SECONDS = 3.0  # classification window
+MIN_SEGMENT_SECONDS = 4.0  # shorter exercise runs are treated as rest
+REST = "rest"
+
+
+def extract_timeline(reader, pose_model, on_sample=None):
+    """
+    (frame_idx (S,), keypoints (S, 17, 2)) for every frame the reader yields; keypoints
+    are all zero where nobody was detected (the same "missing" convention as the model).
+    on_sample(frame_idx, kpts, frame) is called after each inference.
+    """
+    frames = []
+    keypoints = []
+    for frame_idx, frame in reader:
+        kpts = main_person_keypoints(pose_model(frame, verbose=False))
+        frames.append(frame_idx)
+        keypoints.append(np.zeros((17, 2), np.float32) if kpts is None else np.asarray(kpts, np.float32))
+        if on_sample is not None:
+            on_sample(frame_idx, kpts, frame)
+    if not frames:
+        return np.zeros(0, np.int64), np.zeros((0, 17, 2), np.float32)
+    return np.asarray(frames, np.int64), np.stack(keypoints)
+
+
+# ---------- Exercise Classification ----------
+
+def _pair_mean(kpts, left, right):
+    """Per-sample midpoint of two joints (using whichever is visible), NaN when neither is."""
+    pair = kpts[:, [left, right]]
+    seen = (pair != 0).all(axis=2)
+    count = seen.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mid = (pair * seen[:, :, None]).sum(axis=1) / count[:, None]
+    mid[count == 0] = np.nan
+    return mid
+
+
+def window_features(kpts):
+    """
+    Cheap pose features of one window of samples, or None when the person is mostly missing.
+    tilt: torso angle from vertical (0 = standing, 90 = horizontal), median over the window.
+    arms_up: share of samples with the wrists above the nose (hanging from a bar).
+    hip_motion / shoulder_motion: 10-90 percentile travel, in torso lengths.
+    """
+    shoulder = _pair_mean(kpts, 5, 6)
+    hip = _pair_mean(kpts, 11, 12)
+    ok = ~np.isnan(shoulder).any(axis=1) & ~np.isnan(hip).any(axis=1)
+    if ok.sum() < max(3, 0.5 * len(kpts)):
+        return None
+    shoulder, hip = shoulder[ok], hip[ok]
+    torso = shoulder - hip
+    torso_len = float(np.median(np.linalg.norm(torso, axis=1)))
+    if torso_len <= 0:
+        return None
+    tilt = float(np.median(np.degrees(np.arctan2(np.abs(torso[:, 0]), -torso[:, 1]))))
+
+    wrist = _pair_mean(kpts[ok], 9, 10)
+    nose = kpts[ok, 0]
+    has_arms = ~np.isnan(wrist[:, 1]) & (nose != 0).all(axis=1)
+    arms_up = float(np.mean(wrist[has_arms, 1] < nose[has_arms, 1])) if has_arms.any() else 0.0
+
+    def travel(y):
+        return float(np.percentile(y, 90) - np.percentile(y, 10)) / torso_len
+
+    return {"tilt": tilt, "arms_up": arms_up,
+            "hip_motion": travel(hip[:, 1]), "shoulder_motion": travel(shoulder[:, 1])}
+
+
+def classify_window(features):
+    """Rule-based exercise label for one window's features."""
+    if features is None:
+        return REST
+    if features["tilt"] < 45:
+        if features["arms_up"] > 0.5:
+            return "pullup" if features["shoulder_motion"] > 0.15 else REST
+        return "squat" if features["hip_motion"] > 0.2 else REST
+    return "pushup" if features["shoulder_motion"] > 0.15 else "plank"
+
+
+def segment_timeline(frames, keypoints, fps, window_seconds=WINDOW_SECONDS, min_segment_seconds=MIN_SEGMENT_SECONDS):
+    """
+    Splits the timeline into labelled segments:
+    [{"exercise", "start_frame", "end_frame", "start": sample index, "stop": sample index (exclusive)}].
+    Windows are classified independently, a single window that disagrees with both
+    neighbours takes their label (a pause inside a set), windows are merged into runs,
+    and exercise runs shorter than min_segment_seconds become rest.
+    """
+    if len(frames) == 0:
+        return []
+    sample_gap = float(np.median(np.diff(frames))) if len(frames) > 1 else 1.0
+    per_window = max(3, int(round(window_seconds * fps / sample_gap)))
+    bounds = list(range(0, len(frames), per_window))
+    labels = [classify_window(window_features(keypoints[b:b + per_window])) for b in bounds]
+
+    smoothed = list(labels)
+    for i in range(1, len(labels) - 1):
+        if labels[i - 1] == labels[i + 1] != labels[i]:
+            smoothed[i] = labels[i - 1]
+
+    segments = []
+    for i, label in enumerate(smoothed):
+        start, stop = bounds[i], min(bounds[i] + per_window, len(frames))
+        if segments and segments[-1]["exercise"] == label:
+            segments[-1]["stop"] = stop
+        else:
+            segments.append({"exercise": label, "start": start, "stop": stop})
+    for seg in segments:
+        seg["start_frame"] = int(frames[seg["start"]])
+        seg["end_frame"] = int(frames[seg["stop"] - 1])
+        if seg["exercise"] != REST and (seg["end_frame"] - seg["start_frame"]) / fps < min_segment_seconds:
+            seg["exercise"] = REST
+
+    merged = []
+    for seg in segments:
+        if merged and merged[-1]["exercise"] == seg["exercise"]:
+            merged[-1].update(stop=seg["stop"], end_frame=seg["end_frame"])
+        else:
+            merged.append(seg)
+    return merged
+
+
+# ---------- Workout Analysis ----------
+
+def score_segment(exercise, settings, frames, keypoints, fps):
+    """Replays one segment's keypoints through the exercise's rep counter; returns its counts and reps."""
+    counter = make_rep_counter(exercise, settings, fps=fps)
+    # Counters time from the first frame they see, so feed frame numbers relative to the segment.
+    offset = int(frames[0]) - 1
+    for frame_idx, kpts in zip(frames, keypoints):
+        visible = kpts if (kpts != 0).any() else None
+        feed_rep_counter(exercise, counter, int(frame_idx) - offset, keypoints_as_results(visible))
+    reps = [dict(rep, start_frame=rep["start_frame"] + offset, bottom_frame=rep["bottom_frame"] + offset,
+                 end_frame=rep["end_frame"] + offset) for rep in counter.reps]
+    return dict(counter.counts(), reps=reps)
+
+
+def analyze_workout_video(video_path, settings, model, on_progress=None):
+    """
+    Whole-workout analysis from one decode + inference pass: extracts the keypoint
+    timeline, segments it by exercise and scores each segment with that exercise's
+    counter. Returns {"exercise": "workout", "segments": [...], "totals": {exercise: counts}}.
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    pose_model = PersonROITracker(model) if settings["roi_tracking"] else model
+    gate = None
+    if settings["skip_idle"]:
+        # Reusing the last pose keeps planks scored; idle stretches of other exercises count no reps anyway.
+        gate = pose_model = MotionGatedModel(pose_model, reuse_last=True)
+    reader_cls = RingVideoReader if settings["decode_process"] else VideoFrameReader
+    reader = reader_cls(video_path, stride=WORKOUT_STRIDE * int(settings["stride_scale"]))
+    sampled = [0]
+
+    def on_sample(frame_idx, kpts, frame):
+        sampled[0] += 1
+        if on_progress is None:
+            return
+        preview = reader.to_display(frame) if sampled[0] % DISPLAY_EVERY == 1 else None
+        frame_count = reader.frame_count
+        on_progress({"frame_idx": frame_idx, "frame_count": frame_count,
+                     "fraction": min(1.0, frame_idx / frame_count) if frame_count else 0.0}, preview)
+
+    try:
+        frames, keypoints = extract_timeline(reader, pose_model, on_sample)
+    finally:
+        reader.release()
+
+    # Segment times from the decoded frames' timestamps (variable-frame-rate phone videos), else
+    # from ffprobe's packet table, else (frame_idx - 1) / fps; see SeekIndex.time_of.
+    timestamps = getattr(reader, "timestamps", ())
+    if len(timestamps):
+        index = SeekIndex(reader.fps, reader.frame_count, timestamps)
+    else:
+        index = build_seek_index(video_path, reader.fps, reader.frame_count)
+    segments = []
+    totals = {}
+    for seg in segment_timeline(frames, keypoints, reader.fps):
+        entry = {"exercise": seg["exercise"], "start_frame": seg["start_frame"], "end_frame": seg["end_frame"],
+                 "start_time": round(index.time_of(seg["start_frame"]), 2),
+                 "end_time": round(index.time_of(seg["end_frame"]), 2)}
+        if seg["exercise"] != REST:
+            result = score_segment(seg["exercise"], settings, frames[seg["start"]:seg["stop"]],
+                                   keypoints[seg["start"]:seg["stop"]], reader.fps)
+            entry.update(result)
+            exercise_totals = totals.setdefault(seg["exercise"], {})
+            for key, value in result.items():
+                if key != "reps":
+                    exercise_totals[key] = exercise_totals.get(key, 0) + value
+        segments.append(entry)
+
+    summary = {"exercise": "workout", "segments": segments, "totals": totals,
+               "frames_processed": int(len(frames)), "fps": reader.fps}
+    if gate is not None:
+        summary.update(gate.stats(reader.fps, reader.stride))
+    return summary
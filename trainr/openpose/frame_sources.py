@@ -0,0 +1,367 @@
+import functools
+import os
+import sys
+import threading
+import time
+import cv2 as cv
+import numpy as np
+
+
+# ---------- Capture Timestamps ----------
+# loadtest.py measures end-to-end latency by stamping the capture time into each frame as
+# a row of black and white cells and reading it back from the JPEG the client receives
+# (both ends use the same clock). The cells are big enough to survive JPEG compression;
+# a checksum byte rejects frames where the skeleton overlay was drawn across them.
+
+STAMP_BITS = 32  # capture time in ms, modulo 2**32
+STAMP_CELLS = STAMP_BITS + 8
+STAMP_MARGIN = 20  # px, clear of the 10 px score border
+STAMP_HEIGHT = 24
+
+
+def _stamp_geometry(width, height):
+    cell = (width - 2 * STAMP_MARGIN) // STAMP_CELLS
+    top = height - STAMP_MARGIN - STAMP_HEIGHT
+    return cell, top
+
+
+def _checksum(value):
+    return sum(value.to_bytes(4, "big")) & 0xFF
+
+
+def stamp_capture_time(frame, t=None):
+    """Draws the capture time (time.time() if omitted) along the bottom of the frame, in place."""
+    t = time.time() if t is None else t
+    cell, top = _stamp_geometry(frame.shape[1], frame.shape[0])
+    value = int(t * 1000) & 0xFFFFFFFF
+    word = (value << 8) | _checksum(value)
+    for i in range(STAMP_CELLS):
+        x = STAMP_MARGIN + i * cell
+        frame[top:top + STAMP_HEIGHT, x:x + cell] = 255 if (word >> (STAMP_CELLS - 1 - i)) & 1 else 0
+    return frame
+
+
+def read_capture_time(frame):
+    """Capture time (s) stamped by stamp_capture_time, or None if the stamp is missing or damaged."""
+    if frame.ndim == 3:
+        frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+    cell, top = _stamp_geometry(frame.shape[1], frame.shape[0])
+    if cell < 4 or top < 0:
+        return None
+    # Sample the middle of every cell, away from the edges JPEG blurs.
+    band = frame[top + STAMP_HEIGHT // 4:top + 3 * STAMP_HEIGHT // 4, STAMP_MARGIN:STAMP_MARGIN + cell * STAMP_CELLS]
+    levels = band.reshape(band.shape[0], STAMP_CELLS, cell)[:, :, cell // 4:cell - cell // 4].mean(axis=(0, 2))
+    word = 0
+    for level in levels:
+        word = (word << 1) | int(level > 127)
+    value = word >> 8
+    if word & 0xFF != _checksum(value):
+        return None
+    now_ms = int(time.time() * 1000)
+    return (now_ms - ((now_ms - value) & 0xFFFFFFFF)) / 1000.0
+
+
+# ---------- Frame Sources ----------
+
+def parse_synthetic(spec):
+    """(width, height, fps) from "synthetic[:WIDTHxHEIGHT[@FPS]]", e.g. "synthetic:1280x720@30"."""
+    width, height, fps = 640, 480, 30.0
+    _, _, params = spec.partition(":")
+    if params:
+        size, _, rate = params.partition("@")
+        if size:
+            width, height = (int(v) for v in size.lower().split("x"))
+        if rate:
+            fps = float(rate)
+    return width, height, fps
+
+
+def _paced(fps):
+    """Sleeps until the next frame is due. A consumer that falls behind is not caught up later:
+    like a camera with a one-frame buffer, the next frame is simply the current one."""
+    interval = 1.0 / fps
+    next_time = time.monotonic()
+    while True:
+        delay = next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_time = time.monotonic()
+        next_time += interval
+        yield
+
+
+def synthetic_frames(width=640, height=480, fps=30.0):
+    """
+    Endless generated frames at `fps`, for load tests without a camera: a noisy gradient
+    that scrolls and a moving block, so consecutive frames differ and JPEG sizes are close
+    to a camera's.
+    """
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(40, 200, width, dtype=np.float32)[None, :, None]
+    texture = rng.normal(0, 18, (height, width, 3)).astype(np.float32)
+    base = np.clip(gradient + texture, 0, 255).astype(np.uint8)
+    block = max(8, min(width, height) // 6)
+    for n, _ in enumerate(_paced(fps)):
+        frame = np.roll(base, (n * 4) % width, axis=1)
+        x = int((width - block) * (0.5 + 0.5 * np.sin(n / fps)))
+        y = int((height - block) * (0.5 + 0.5 * np.cos(n / (1.7 * fps))))
+        cv.rectangle(frame, (x, y), (x + block, y + block), (30, 90, 220), cv.FILLED)
+        yield frame
+
+
+def looping_file_frames(path):
+    """Frames of a video file played in a loop at its own frame rate."""
+    cap = cv.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video file {path}")
+    try:
+        fps = cap.get(cv.CAP_PROP_FPS) or 30.0
+        for _ in _paced(fps):
+            ok, frame = cap.read()
+            if not ok:
+                cap.set(cv.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = cap.read()
+                if not ok:
+                    return
+            yield frame
+    finally:
+        cap.release()
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def image_directory_frames(path, fps=30.0):
+    """The images of a directory, in name order, shown in a loop at `fps`."""
+    names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not names:
+        raise IOError(f"No images in {path}")
+    for n, _ in enumerate(_paced(fps)):
+        frame = cv.imread(os.path.join(path, names[n % len(names)]))
+        if frame is not None:
+            yield frame
+
+
+STREAM_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+RECONNECT_SECONDS = 2.0
+
+
+def stream_frames(url):
+    """
+    Frames of a network stream (RTSP, HTTP MJPEG, ...). A reader thread drains the stream
+    continuously and only the newest frame is handed on, so a slow consumer never builds up
+    a backlog in the demuxer. A dropped connection is reopened every RECONNECT_SECONDS.
+    """
+    latest = {"frame": None, "seq": 0}
+    ready = threading.Condition()
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            cap = cv.VideoCapture(url, cv.CAP_FFMPEG)
+            cap.set(cv.CAP_PROP_BUFFERSIZE, 1)
+            while not stop.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                with ready:
+                    latest["frame"] = frame
+                    latest["seq"] += 1
+                    ready.notify_all()
+            cap.release()
+            stop.wait(RECONNECT_SECONDS)
+
+    thread = threading.Thread(target=reader, name="stream-reader", daemon=True)
+    thread.start()
+    seen = 0
+    try:
+        while True:
+            with ready:
+                ready.wait_for(lambda: latest["seq"] != seen, timeout=1.0)
+                if latest["seq"] == seen:
+                    continue
+                frame, seen = latest["frame"], latest["seq"]
+            yield frame
+    finally:
+        stop.set()
+        thread.join(timeout=RECONNECT_SECONDS)
+
+
+# ---------- Capture Devices ----------
+# USB cameras default to uncompressed YUYV, which at 720p and above limits the frame rate
+# to what the bus can carry, and to a driver queue of several frames, each one adding a
+# frame interval of lag once inference is slower than the camera. open_device asks for
+# MJPG, the requested size and rate and a one-frame buffer; the driver may refuse any of
+# them, so what was actually negotiated is read back and reported.
+
+def _fourcc_name(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\x00") or None
+
+
+def open_device(device, width=None, height=None, fps=None, buffer_size=1, fourcc="MJPG"):
+    """Opens a camera (index or device path) and requests the given format; returns the VideoCapture."""
+    cap = cv.VideoCapture(device)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open camera {device}")
+    # The format has to be set before the size: some drivers only offer large sizes as MJPG.
+    if fourcc:
+        cap.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc(*fourcc))
+    if width and height:
+        cap.set(cv.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        cap.set(cv.CAP_PROP_FPS, fps)
+    if buffer_size:
+        cap.set(cv.CAP_PROP_BUFFERSIZE, buffer_size)
+    return cap
+
+
+def negotiated_settings(cap):
+    """Format the driver actually delivers. buffer_size is None where the backend cannot report it."""
+    return {
+        "fourcc": _fourcc_name(cap.get(cv.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv.CAP_PROP_FPS), 2),
+        "buffer_size": int(cap.get(cv.CAP_PROP_BUFFERSIZE)) or None,
+        "backend": cap.getBackendName(),
+    }
+
+
+def measure_capture_latency(cap, frames=30):
+    """
+    Delivered frame rate and capture latency of an opened camera.
+    After a pause long enough for the driver queue to fill, reads that return at once
+    come from the queue and the first one that blocks is live; the latency estimate is
+    the queued frames times the frame interval plus half an interval for the frame that
+    was being exposed.
+    """
+    times = []
+    for _ in range(frames):
+        if not cap.grab():
+            return {}
+        times.append(time.monotonic())
+    interval = float(np.median(np.diff(times)))
+    time.sleep(8 * interval)
+    queued = 0
+    while queued < 16:
+        start = time.monotonic()
+        if not cap.grab():
+            break
+        if time.monotonic() - start > interval / 3:
+            break
+        queued += 1
+    return {
+        "measured_fps": round(1.0 / interval, 2),
+        "queued_frames": queued,
+        "capture_latency_ms": round((queued + 0.5) * interval * 1000.0, 1),
+    }
+
+
+def device_frames(cap):
+    """Frames of an opened camera; releases it when the consumer stops."""
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+# ---------- Source Selection ----------
+
+FORM_TRACKING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "formTracking")
+
+
+class FrameSource:
+    """
+    Frames for the server, chosen by a spec string:
+      "0", "1", "/dev/video2"             camera (negotiated with width/height/fps/buffer_size)
+      "synthetic[:WxH[@FPS]]"             generated frames, for load tests
+      "rtsp://...", "http://...", ...     network stream (newest frame only)
+      a directory                         its images in a loop at `fps` (default 30)
+      any other path                      video file in a loop at its own frame rate
+    Each iteration opens the source afresh and yields BGR frames. For cameras, `settings`
+    then holds the negotiated format and the capture latency, measured the first time each
+    device configuration is opened (the measurement grabs 30 frames and pauses, too slow to
+    repeat every time the server restarts its pipeline).
+    With capture_process, cameras and streams are read in a separate process through the
+    shared-memory ring from formTracking/frame_ring.py, so capture never waits on inference.
+    """
+
+    def __init__(self, spec="0", width=None, height=None, fps=None, buffer_size=1, capture_process=False):
+        self.spec = str(spec)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.buffer_size = buffer_size
+        self.capture_process = capture_process
+        self.settings = {}
+        self._capture_latency = {}  # (device, width, height, fps, buffer_size) -> measurement
+
+    @property
+    def kind(self):
+        if self.spec.isdigit() or self.spec.startswith("/dev/video"):
+            return "camera"
+        if self.spec.startswith("synthetic"):
+            return "synthetic"
+        if self.spec.startswith(STREAM_PREFIXES):
+            return "stream"
+        if os.path.isdir(self.spec):
+            return "images"
+        return "file"
+
+    def _device_options(self):
+        return {"width": self.width, "height": self.height, "fps": self.fps, "buffer_size": self.buffer_size}
+
+    def __iter__(self):
+        kind = self.kind
+        if kind == "camera":
+            device = int(self.spec) if self.spec.isdigit() else self.spec
+            cap = open_device(device, **self._device_options())
+            self.settings = negotiated_settings(cap)
+            key = (device, *self._device_options().values())
+            if key not in self._capture_latency:
+                self._capture_latency[key] = measure_capture_latency(cap)
+            self.settings.update(self._capture_latency[key])
+            print(f"Frame source: {self.describe()}")
+            if self.capture_process:
+                cap.release()
+                return self._ring_frames(device, functools.partial(open_device, **self._device_options()))
+            return device_frames(cap)
+        if kind == "stream":
+            self.settings = {}
+            if self.capture_process:
+                return self._ring_frames(self.spec, None)
+            return stream_frames(self.spec)
+        if kind == "synthetic":
+            width, height, fps = parse_synthetic(self.spec)
+            self.settings = {"width": width, "height": height, "fps": fps}
+            return synthetic_frames(width, height, fps)
+        if kind == "images":
+            self.settings = {"fps": self.fps or 30.0}
+            return image_directory_frames(self.spec, self.fps or 30.0)
+        return looping_file_frames(self.spec)
+
+    def _ring_frames(self, source, open_capture):
+        if FORM_TRACKING_DIR not in sys.path:
+            sys.path.append(FORM_TRACKING_DIR)
+        from frame_ring import RingCapture
+
+        return iter(RingCapture(source, open_capture=open_capture))
+
+    def describe(self):
+        """One line with the source and, once opened, its negotiated settings."""
+        s = self.settings
+        if self.kind != "camera" or not s:
+            return f"{self.kind} {self.spec}"
+        text = f"camera {self.spec} ({s['backend']}): {s['fourcc']} {s['width']}x{s['height']} @ {s['fps']} fps"
+        text += f", buffer {s['buffer_size'] or 'n/a'}"
+        if "measured_fps" in s:
+            text += (f"; measured {s['measured_fps']} fps, {s['queued_frames']} queued frame(s),"
+                     f" capture latency ~{s['capture_latency_ms']} ms")
+        return text
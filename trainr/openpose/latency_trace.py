@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+# ---------- Frame Traces ----------
+# Every frame carries a FrameTrace from the moment the source hands it over: its capture
+# time on the wall clock (sent to clients in the X-Capture-Timestamp part header, so a
+# client on a synchronised clock can work out display latency) and monotonic marks as it
+# passes each pipeline stage. A trace costs a few clock reads and deque appends per frame,
+# so it stays on in production.
+
+class FrameTrace:
+    """Capture time of one frame (epoch seconds) and the monotonic time it reached each stage."""
+
+    __slots__ = ("captured_at", "marks")
+
+    def __init__(self):
+        self.captured_at = time.time()
+        self.marks = {"capture": time.monotonic()}
+
+    def mark(self, stage):
+        self.marks[stage] = time.monotonic()
+
+    def age(self, now=None):
+        """Seconds since capture."""
+        return (time.monotonic() if now is None else now) - self.marks["capture"]
+
+
+class LatencyStats:
+    """
+    Rolling per-stage latency percentiles over the last `window` samples of each stage.
+    Pipeline stages (from FrameTrace marks) are recorded once per frame; delivery stages
+    (wait, send, total) once per frame per client.
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def add_trace(self, trace):
+        """Records the time between consecutive marks under the later mark's name."""
+        marks = list(trace.marks.items())
+        for (_, start), (stage, end) in zip(marks, marks[1:]):
+            self.add(stage, end - start)
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}} in the order stages were first seen."""
+        with self._lock:
+            snapshot = {stage: np.array(samples) * 1000.0 for stage, samples in self._samples.items()}
+        result = {}
+        for stage, values in snapshot.items():
+            if not len(values):
+                continue
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            result[stage] = {
+                "count": len(values),
+                "mean_ms": round(float(values.mean()), 2),
+                "p50_ms": round(float(p50), 2),
+                "p90_ms": round(float(p90), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(values.max()), 2),
+            }
+        return result
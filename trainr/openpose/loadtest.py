@@ -0,0 +1,299 @@
+"""
+Load test for the /video-feed MJPEG endpoint.
+
+Starts openpose.py on a synthetic camera (or a video file played in a loop), or attaches
+to a server that is already running, then for each client count opens that many
+concurrent MJPEG streams. Every step reports the frame rate each client receives,
+inter-frame jitter, end-to-end latency from capture to receipt, and the server's CPU
+and memory use: a capacity curve that can be compared from release to release.
+
+    python loadtest.py --clients 1,2,4,8,16 --duration 20
+    python loadtest.py --source workout.mp4 --label v1.4 --out loadtest.jsonl
+    python loadtest.py --url http://camera-box:5001/video-feed --pid 4242
+
+Latency is measured from the X-Capture-Timestamp part header, or from the capture time
+stamped into each frame (OPENPOSE_STAMP_TIME=1, set for a server started here) when the
+header is missing, so it needs the server on the same clock. CPU and
+memory come from /proc (Linux) for the server started here or for --pid.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import cv2 as cv
+import numpy as np
+from frame_sources import read_capture_time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WARM_UP_SECONDS = 3.0  # per step, left out of the statistics (connecting, first inference)
+SAMPLE_INTERVAL = 0.5  # seconds between server memory samples
+SERVER_START_TIMEOUT = 60.0
+SERVER_LOG_TAIL = 4000  # bytes of the server log quoted when it fails to start
+
+
+# ---------- MJPEG Client ----------
+
+class MJPEGClient(threading.Thread):
+    """Reads one /video-feed stream, recording when each JPEG arrived and (if stamped) when it was captured."""
+
+    def __init__(self, url, stop, read_latency=True):
+        super().__init__(daemon=True)
+        self.url = url
+        self.stop = stop
+        self.read_latency = read_latency
+        self.arrivals = []
+        self.latencies = []  # (arrival time, seconds since capture)
+        self.error = None
+        self._response = None
+
+    def run(self):
+        try:
+            self._response = urllib.request.urlopen(self.url, timeout=30)
+            self._read(self._response)
+        except Exception as exc:
+            if not self.stop.is_set():
+                self.error = str(exc)
+
+    def close(self):
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass  # may be mid-read on the client thread
+
+    def _read(self, response):
+        buffer = b""
+        while not self.stop.is_set():
+            chunk = response.read1(65536)
+            if not chunk:
+                if not self.stop.is_set():
+                    self.error = "stream ended"
+                return
+            buffer += chunk
+            while True:
+                # A part is its headers, a blank line, then one JPEG ending in the EOI marker
+                # (which cannot occur inside the entropy-coded data), so no Content-Length is needed.
+                start = buffer.find(b"\r\n\r\n")
+                end = buffer.find(b"\xff\xd9", start + 4) if start >= 0 else -1
+                if end < 0:
+                    break
+                arrived = time.time()
+                headers = buffer[:start]
+                jpeg = buffer[start + 4:end + 2]
+                buffer = buffer[end + 2:]
+                self.arrivals.append(arrived)
+                if self.read_latency:
+                    captured = self._capture_time(headers, jpeg)
+                    if captured is not None:
+                        self.latencies.append((arrived, arrived - captured))
+
+    def _capture_time(self, headers, jpeg):
+        # The X-Capture-Timestamp part header when the server sends it, else the stamp in the image.
+        for line in headers.split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"x-capture-timestamp":
+                return float(value)
+        image = cv.imdecode(np.frombuffer(jpeg, np.uint8), cv.IMREAD_GRAYSCALE)
+        return read_capture_time(image) if image is not None else None
+
+
+# ---------- Server ----------
+
+def process_stats(pid):
+    """(CPU seconds, RSS bytes) of a process from /proc, or None where that is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        return cpu, rss_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError, AttributeError):
+        return None
+
+
+def start_server(source, port, log_path):
+    """
+    Starts openpose.py on `source` with capture timestamps and waits until it streams.
+    Its stderr goes to log_path: a pipe nobody reads during the run would fill up (Flask logs
+    every request) and block the server.
+    """
+    env = dict(os.environ, OPENPOSE_SOURCE=source, OPENPOSE_STAMP_TIME="1", OPENPOSE_PORT=str(port))
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, "openpose.py")], cwd=HERE, env=env,
+                                stdout=subprocess.DEVNULL, stderr=log)
+    url = f"http://127.0.0.1:{port}/video-feed"
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            with open(log_path, "rb") as log:
+                log.seek(max(0, os.path.getsize(log_path) - SERVER_LOG_TAIL))
+                tail = log.read().decode(errors="replace")
+            raise RuntimeError(f"openpose.py exited during start-up (log: {log_path}):\n{tail}")
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.read1(1):
+                    return proc, url
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"openpose.py did not serve {url} within {SERVER_START_TIMEOUT:.0f} s")
+
+
+# ---------- Load Steps ----------
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 1) if len(values) else None
+
+
+def client_stats(client, window_start, window_end):
+    arrivals = np.array([t for t in client.arrivals if window_start <= t <= window_end])
+    intervals = np.diff(arrivals) * 1000.0
+    latencies = [latency * 1000.0 for t, latency in client.latencies if window_start <= t <= window_end]
+    return {
+        "fps": round(len(arrivals) / (window_end - window_start), 2),
+        "jitter_ms": round(float(intervals.std()), 1) if len(intervals) else None,
+        "interval_p95_ms": _percentile(intervals, 95),
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+        "error": client.error,
+    }
+
+
+def run_step(url, clients, duration, pid=None, read_latency=True):
+    """Streams to `clients` concurrent readers for WARM_UP_SECONDS + duration and summarises the window after warm-up."""
+    stop = threading.Event()
+    readers = [MJPEGClient(url, stop, read_latency) for _ in range(clients)]
+    for reader in readers:
+        reader.start()
+    time.sleep(WARM_UP_SECONDS)
+
+    window_start = time.time()
+    before = process_stats(pid) if pid else None
+    rss = []
+    while time.time() < window_start + duration:
+        time.sleep(SAMPLE_INTERVAL)
+        stats = process_stats(pid) if pid else None
+        if stats is not None:
+            rss.append(stats[1])
+    window_end = time.time()
+    after = process_stats(pid) if pid else None
+
+    stop.set()
+    for reader in readers:
+        reader.close()
+    for reader in readers:
+        reader.join(timeout=5)
+
+    per_client = [client_stats(reader, window_start, window_end) for reader in readers]
+    fps = [c["fps"] for c in per_client]
+    all_latencies = [latency * 1000.0 for reader in readers for t, latency in reader.latencies
+                     if window_start <= t <= window_end]
+    jitters = [c["jitter_ms"] for c in per_client if c["jitter_ms"] is not None]
+    cpu = None
+    if before is not None and after is not None:
+        cpu = round(100.0 * (after[0] - before[0]) / (window_end - window_start), 1)
+    return {
+        "clients": clients,
+        "fps_mean": round(float(np.mean(fps)), 2),
+        "fps_min": min(fps),
+        "fps_total": round(sum(fps), 2),
+        "jitter_ms": round(float(np.mean(jitters)), 1) if jitters else None,
+        "latency_p50_ms": _percentile(all_latencies, 50),
+        "latency_p95_ms": _percentile(all_latencies, 95),
+        "server_cpu_percent": cpu,
+        "server_rss_mb": round(max(rss) / 2 ** 20, 1) if rss else None,
+        "errors": sum(1 for c in per_client if c["error"]),
+        "per_client": per_client,
+    }
+
+
+def _cell(value):
+    return "-" if value is None else str(value)
+
+
+TABLE_COLUMNS = ("clients", "fps_mean", "fps_min", "fps_total", "jitter_ms", "latency_p50_ms", "latency_p95_ms",
+                 "server_cpu_percent", "server_rss_mb", "errors")
+
+
+def print_step(step=None):
+    """Prints one row of the capacity table (the header without a step)."""
+    if step is None:
+        print("  ".join(f"{c:>14}" for c in TABLE_COLUMNS))
+    else:
+        print("  ".join(f"{_cell(step[c]):>14}" for c in TABLE_COLUMNS), flush=True)
+
+
+def git_label():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+# ---------- Command Line ----------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", default="1,2,4,8", help="Comma-separated client counts, one step each")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per step")
+    parser.add_argument("--source", default="synthetic:640x480@30",
+                        help='Frames for the started server: "synthetic[:WxH[@FPS]]" or a video file')
+    parser.add_argument("--port", type=int, default=5051, help="Port for the started server")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "openpose-loadtest.log"),
+                        help="stderr of the started server")
+    parser.add_argument("--url", help="Test a running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="Process id of the --url server, for CPU and memory")
+    parser.add_argument("--min-fps", type=float, default=15.0,
+                        help="Capacity is the largest step where every client gets at least this frame rate")
+    parser.add_argument("--label", default=None, help="Name of this run (default: git describe)")
+    parser.add_argument("--out", help="Append the run as one JSON line to this file")
+    args = parser.parse_args()
+    counts = [int(n) for n in args.clients.split(",") if n.strip()]
+
+    proc = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        proc, url = start_server(args.source, args.port, args.server_log)
+        pid = proc.pid
+        print(f"Server log: {args.server_log}")
+    print(f"Load testing {url}")
+    print_step()
+    steps = []
+    try:
+        for clients in counts:
+            step = run_step(url, clients, args.duration, pid)
+            steps.append(step)
+            print_step(step)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    sustained = [s["clients"] for s in steps if s["fps_min"] >= args.min_fps and not s["errors"]]
+    capacity = max(sustained) if sustained else 0
+    print(f"Capacity: {capacity} client(s) at >= {args.min_fps:g} fps each")
+    if args.out:
+        record = {
+            "label": args.label or git_label(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "url": url,
+            "source": None if args.url else args.source,
+            "duration": args.duration,
+            "min_fps": args.min_fps,
+            "capacity": capacity,
+            "steps": steps,
+        }
+        with open(args.out, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import socket
+import threading
+import time
+import cv2 as cv
+from latency_trace import LatencyStats
+
+
+# ---------- Stream Tiers ----------
+# Every client is served from one of these tiers, best first. A client starts on the best
+# tier and is moved down while its writes block (the link or the browser cannot drain the
+# stream as fast as it is produced) and back up after a quiet spell. Each tier's JPEG of a
+# frame is encoded once, by whichever client needs it first, and shared with every other
+# client on that tier.
+
+TIERS = [
+    {"name": "full", "scale": 1.0, "quality": 85, "fps": 30},
+    {"name": "high", "scale": 1.0, "quality": 70, "fps": 20},
+    {"name": "medium", "scale": 0.75, "quality": 60, "fps": 15},
+    {"name": "low", "scale": 0.5, "quality": 50, "fps": 10},
+    {"name": "minimal", "scale": 0.5, "quality": 35, "fps": 5},
+]
+
+DOWN_BUSY = 0.6  # step down when writes block for this fraction of the frame interval
+UP_BUSY = 0.15  # step up when they block for less than this ...
+UP_HOLD_SECONDS = 4.0  # ... for this long since the last change, if the better tier fits the drain rate
+PROBE_SECONDS = 20.0  # or for this long regardless, in case the link has improved
+DOWN_HOLD_SECONDS = 0.5
+# A small kernel send buffer makes writes block as soon as the link falls behind, instead
+# of queueing seconds of video in the socket where it shows up as lag.
+SEND_BUFFER_BYTES = 64 * 1024
+KEEPALIVE_SECONDS = 10.0  # the producer keeps running this long after the last latest() call
+FIRST_FRAME_SECONDS = 10.0  # latest() waits at least this long for the first frame of a new producer
+
+
+class ClientRate:
+    """
+    Tier controller for one client. record() is called with the size of each part and how
+    long writing it blocked. `busy` is the smoothed share of the frame interval spent
+    blocked; `drain_rate` is the smoothed bytes per second the client took while it was
+    the bottleneck. On a step down the client goes straight to the best tier whose
+    expected bitrate (frame_bytes(tier) x fps) fits in the drain rate.
+    """
+
+    def __init__(self, tiers=TIERS, frame_bytes=None, tier=0):
+        self.tiers = tiers
+        self.frame_bytes = frame_bytes
+        self.tier = tier
+        self.busy = 0.0
+        self.drain_rate = None
+        self._changed = time.monotonic()
+        self._last_end = None
+
+    def record(self, nbytes, seconds):
+        now = time.monotonic()
+        interval = 1.0 / self.tiers[self.tier]["fps"]
+        self.busy = 0.7 * self.busy + 0.3 * min(seconds / interval, 2.0)
+        if self._last_end is not None and seconds > 0.5 * (now - self._last_end):
+            # Blocked for most of the time since the last part: the socket buffer never ran
+            # empty, so everything sent since then is what the client could take.
+            rate = nbytes / (now - self._last_end)
+            self.drain_rate = rate if self.drain_rate is None else 0.7 * self.drain_rate + 0.3 * rate
+        self._last_end = now
+        if self.busy > DOWN_BUSY and self.tier < len(self.tiers) - 1 and now - self._changed >= DOWN_HOLD_SECONDS:
+            self._set_tier(self._fitting_tier(), now)
+        elif self.busy < UP_BUSY and self.tier > 0:
+            quiet = now - self._changed
+            if quiet >= PROBE_SECONDS or (quiet >= UP_HOLD_SECONDS and self._fits(self.tier - 1)):
+                self._set_tier(self.tier - 1, now)
+
+    def _fits(self, tier):
+        if self.drain_rate is None or self.frame_bytes is None:
+            return True
+        size = self.frame_bytes(tier)
+        return size is None or size * self.tiers[tier]["fps"] <= 0.8 * self.drain_rate
+
+    def _fitting_tier(self):
+        tier = self.tier + 1
+        while tier < len(self.tiers) - 1 and not self._fits(tier):
+            tier += 1
+        return tier
+
+    def _set_tier(self, tier, now):
+        self.tier = tier
+        self.busy = 0.0
+        self._changed = now
+
+
+# ---------- Stream Hub ----------
+
+class StreamHub:
+    """
+    One capture and inference pipeline shared by every /video-feed client.
+
+    A producer thread runs while at least one client is connected or latest() was called
+    in the last KEEPALIVE_SECONDS: it takes (frame, trace, result) from frames() (a callable
+    returning an iterator, such as a generator function), where trace is the frame's
+    latency_trace.FrameTrace and result whatever the pipeline worked out for it, and
+    publishes each as the latest frame. Stream clients always get the latest frame, at
+    their tier's rate, so a slow client skips frames instead of falling behind; latest()
+    hands out the same frame and result without running the pipeline again.
+
+    `stats` collects per-stage latency: the trace's pipeline stages and "publish" once per
+    frame, "encode" once per encoded variant, and "wait" (publish to write), "send" (write)
+    and "total" (capture to written) per frame sent to each client.
+    """
+
+    def __init__(self, frames, tiers=TIERS):
+        self.frames = frames
+        self.tiers = tiers
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._frame = None
+        self._trace = None
+        self._result = None
+        self._clients = 0
+        self._lease_until = 0.0
+        self._first_seq = 1  # first frame number of the current producer
+        self._thread = None
+        self._previous = None  # producer that is still releasing the source
+        self._encoded = {}  # tier index -> (seq, JPEG bytes, trace)
+        self._sizes = [None] * len(tiers)  # smoothed JPEG size per tier
+        self._encode_locks = [threading.Lock() for _ in tiers]
+        self.stats = LatencyStats()
+
+    def _produce(self, previous):
+        if previous is not None:
+            previous.join()  # a camera can only be opened once the last producer has let go of it
+        frames = iter(self.frames())
+        try:
+            for frame, trace, result in frames:
+                # Copied because capture-process frames are recycled when the next one is read.
+                frame = frame.copy()
+                trace.mark("publish")
+                self.stats.add_trace(trace)
+                with self._cond:
+                    self._seq += 1
+                    self._frame = frame
+                    self._trace = trace
+                    self._result = result
+                    self._cond.notify_all()
+                    if self._clients == 0 and time.monotonic() >= self._lease_until:
+                        self._thread = None  # the next client starts a new producer
+                        self._previous = threading.current_thread()
+                        break
+        finally:
+            close = getattr(frames, "close", None)
+            if close is not None:
+                close()  # releases the camera until the next client connects
+            with self._cond:
+                if self._thread is threading.current_thread():
+                    self._thread = None  # the source ended or failed
+                self._cond.notify_all()
+
+    def _start(self):
+        # Called with self._cond held.
+        if self._thread is None:
+            self._first_seq = self._seq + 1
+            self._thread = threading.Thread(target=self._produce, args=(self._previous,),
+                                            name="stream-producer", daemon=True)
+            self._thread.start()
+
+    def _join(self):
+        with self._cond:
+            self._clients += 1
+            self._start()
+
+    def _leave(self):
+        with self._cond:
+            self._clients -= 1
+
+    def _wait_frame(self, last_seq):
+        """Latest frame number after last_seq, or None once the producer has stopped."""
+        with self._cond:
+            while self._seq <= last_seq:
+                if self._thread is None:
+                    return None
+                self._cond.wait(timeout=1.0)
+            return self._seq
+
+    def latest(self, after_seq=0, timeout=0.0):
+        """
+        (frame number, frame, trace, result) of the latest frame, waiting up to `timeout`
+        seconds for one newer than after_seq (a long poll); the frame number is 0 while
+        there is none yet. Starts the producer if needed and keeps it running for
+        KEEPALIVE_SECONDS; a frame left over from an earlier producer run is only
+        returned if the new one has produced nothing within FIRST_FRAME_SECONDS.
+        """
+        now = time.monotonic()
+        deadline = now + timeout
+        with self._cond:
+            self._lease_until = max(self._lease_until, now + max(KEEPALIVE_SECONDS, timeout))
+            self._start()
+            if self._seq < self._first_seq:
+                after_seq = max(after_seq, self._first_seq - 1)
+                deadline = max(deadline, now + FIRST_FRAME_SECONDS)
+            while self._seq <= after_seq and self._thread is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._seq, self._frame, self._trace, self._result
+
+    def jpeg(self, tier):
+        """(frame number, JPEG bytes, trace) of the latest frame on the given tier, encoding it if no client has yet."""
+        with self._cond:
+            seq, frame, trace = self._seq, self._frame, self._trace
+        cached = self._encoded.get(tier)
+        if cached is not None and cached[0] >= seq:
+            return cached
+        with self._encode_locks[tier]:
+            cached = self._encoded.get(tier)
+            if cached is not None and cached[0] >= seq:
+                return cached  # another client on this tier encoded it meanwhile
+            settings = self.tiers[tier]
+            start = time.monotonic()
+            if settings["scale"] != 1.0:
+                size = (int(frame.shape[1] * settings["scale"]), int(frame.shape[0] * settings["scale"]))
+                frame = cv.resize(frame, size, interpolation=cv.INTER_AREA)
+            _, buffer = cv.imencode(".jpg", frame, [cv.IMWRITE_JPEG_QUALITY, settings["quality"]])
+            cached = (seq, buffer.tobytes(), trace)
+            self.stats.add("encode", time.monotonic() - start)
+            self._encoded[tier] = cached
+            size = self._sizes[tier]
+            self._sizes[tier] = len(cached[1]) if size is None else 0.9 * size + 0.1 * len(cached[1])
+            return cached
+
+    def frame_bytes(self, tier):
+        """
+        Expected JPEG size on a tier: measured if any client has used it, otherwise scaled
+        from a measured tier (size taken as proportional to pixel count and quality).
+        None before the first frame is encoded.
+        """
+        if self._sizes[tier] is not None:
+            return self._sizes[tier]
+        for known, size in enumerate(self._sizes):
+            if size is not None:
+                a, b = self.tiers[tier], self.tiers[known]
+                return size * (a["scale"] / b["scale"]) ** 2 * a["quality"] / b["quality"]
+        return None
+
+    def stream(self, sock=None):
+        """
+        multipart/x-mixed-replace body for one client. The time each yield takes to come
+        back is the time the server spent writing the part to the client, which drives the
+        client's tier. `sock` (the client connection, when the server exposes it) gets a
+        small send buffer.
+        """
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+            except OSError:
+                pass
+        rate = ClientRate(self.tiers, self.frame_bytes)
+        self._join()
+        try:
+            last_seq = 0
+            next_due = 0.0
+            while True:
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if self._wait_frame(last_seq) is None:
+                    return
+                last_seq, jpeg, trace = self.jpeg(rate.tier)
+                headers = (f"Content-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n"
+                           f"X-Frame-Seq: {last_seq}\r\nX-Capture-Timestamp: {trace.captured_at:.6f}\r\n\r\n")
+                part = b'--frame\r\n' + headers.encode("ascii") + jpeg + b'\r\n'
+                start = time.monotonic()
+                yield part
+                end = time.monotonic()
+                rate.record(len(part), end - start)
+                self.stats.add("wait", start - trace.marks["publish"])
+                self.stats.add("send", end - start)
+                self.stats.add("total", trace.age(end))
+                next_due = start + 1.0 / self.tiers[rate.tier]["fps"]
+        finally:
+            self._leave()
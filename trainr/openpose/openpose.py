@@ -1,8 +1,15 @@
+import argparse
 import os
 import cv2 as cv
 import numpy as np
-from flask import Flask, Response
+from flask import Flask, Response, jsonify, request
 import time
+import uuid
+from frame_sources import FrameSource, stamp_capture_time
+from latency_trace import FrameTrace
+from mjpeg_stream import StreamHub
+from paf_decoding import NUM_PARTS, PAF_OFFSET, PersonTracker, decode_people
+from trim_graph import ensure_trimmed
 
 app = Flask(__name__)
 
@@ -57,7 +64,38 @@ POSE_PAIRS = [
 
 # Load the neural network (use absolute path relative to this file)
 model_path = os.path.join(os.path.dirname(__file__), "graph_opt.pb")
-net = cv.dnn.readNetFromTensorflow(model_path)
+# OPENPOSE_KEYPOINT_ONLY=1 (or --keypoint-only) loads the graph trimmed by trim_graph.py
+# (built beside the model on first use) to its 19 heatmap channels, so the part-affinity
+# fields are not computed. Channels 19-21 ("UpperBack" to "LowerBack") are the first
+# part-affinity channels, only drawn as a back line; that mode reports them as not detected.
+KEYPOINT_ONLY = os.environ.get("OPENPOSE_KEYPOINT_ONLY") == "1"
+
+
+def load_net(keypoint_only=KEYPOINT_ONLY):
+    return cv.dnn.readNetFromTensorflow(ensure_trimmed(model_path) if keypoint_only else model_path)
+
+
+# The network and the frame source are created on first use (or at startup below), not on
+# import: with --capture-process the capture process is started with multiprocessing's
+# "spawn" method, which re-imports this script, and it must not load the model too.
+net = None
+
+
+def get_net():
+    global net
+    if net is None:
+        net = load_net(KEYPOINT_ONLY)
+    return net
+
+
+# OPENPOSE_MULTI_PERSON=1 (or --multi-person) decodes every person in frame from the
+# part-affinity fields (paf_decoding.py) and follows one person from frame to frame
+# (paf_decoding.PersonTracker: the highest-scoring skeleton at first, then the nearest to
+# the last one), so someone else in view (a therapist, say) no longer pulls joints or the
+# whole skeleton off the patient; the others are drawn in grey. The back points are not
+# reported in this mode. It needs the full graph: on the keypoint-only graph it falls back
+# to the per-part maximum.
+MULTI_PERSON = os.environ.get("OPENPOSE_MULTI_PERSON") == "1"
 
 # Variables for scoring
 green_border_count = 0
@@ -66,16 +104,57 @@ start_time = time.time()
 last_score_time = start_time  # Tracks time of last score update
 current_score = 0  # Initialize current score
 
-# Function to generate video frames
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+# The frame source is set at startup (command line options, or these environment variables).
+# OPENPOSE_SOURCE: a camera index or device path (default "0"), "synthetic[:WxH[@FPS]]", a
+# network stream URL, an image directory or a video file played in a loop; see FrameSource.
+# Cameras are asked for MJPG at OPENPOSE_WIDTH x OPENPOSE_HEIGHT and OPENPOSE_FPS with a one-frame buffer.
+# OPENPOSE_CAPTURE_PROCESS=1 captures in a separate process and hands frames over through
+# the shared-memory ring from formTracking/frame_ring.py, so capture never waits on inference.
+# OPENPOSE_STAMP_TIME=1 stamps each frame's capture time into it so loadtest.py can measure
+# end-to-end latency.
+frame_source = None
+
+
+def get_frame_source():
+    global frame_source
+    if frame_source is None:
+        frame_source = FrameSource(
+            os.environ.get("OPENPOSE_SOURCE", "0"),
+            width=_env_int("OPENPOSE_WIDTH"),
+            height=_env_int("OPENPOSE_HEIGHT"),
+            fps=_env_int("OPENPOSE_FPS"),
+            capture_process=os.environ.get("OPENPOSE_CAPTURE_PROCESS") == "1",
+        )
+    return frame_source
+
+
+STAMP_CAPTURE_TIME = os.environ.get("OPENPOSE_STAMP_TIME") == "1"
+PORT = int(os.environ.get("OPENPOSE_PORT", "5001"))
+
+
+def source_frames():
+    """Yields (frame, trace) from the configured frame source; the trace starts at capture."""
+    for frame in get_frame_source():
+        trace = FrameTrace()
+        if STAMP_CAPTURE_TIME:
+            stamp_capture_time(frame, trace.captured_at)
+        yield frame, trace
+
+
+# Function to generate annotated video frames. A single stream hub producer runs it,
+# however many clients are watching.
 def generate_frames():
     global green_border_count, red_border_count, last_score_time, current_score
-    cap = cv.VideoCapture(0)  # 0 for the default camera
-
-    while True:
-        hasFrame, frame = cap.read()
-        if not hasFrame:
-            break
+    net = get_net()
+    tracker = PersonTracker()
 
+    for frame, trace in source_frames():
         # Resize frame as per requirements
         inWidth, inHeight = 368, 368
         net.setInput(
@@ -84,20 +163,39 @@ def generate_frames():
             )
         )
         out = net.forward()
-        out = out[:, :22, :, :]
+        trace.mark("inference")
 
         frameWidth, frameHeight = frame.shape[1], frame.shape[0]
-        points = []
+        multi_person = MULTI_PERSON and out.shape[1] > PAF_OFFSET
+        people, tracked = [], None
+        if multi_person:
+            people = decode_people(out, frameWidth, frameHeight)
+            tracked = tracker.update(people, frameWidth, frameHeight)
+            if tracked is not None:
+                people.insert(0, people.pop(tracked))  # the tracked person first
+            trace.mark("decode")
+        if multi_person:
+            # The tracked person's parts (none while they are lost). The back points are
+            # part-affinity channels, not parts of a decoded skeleton: not reported in this mode.
+            points = list(people[0]["points"]) if tracked is not None else [None] * NUM_PARTS
+            points += [None] * (len(BODY_PARTS) - NUM_PARTS)
+        else:
+            out = out[:, :22, :, :]
+            points = []
 
-        for i in range(len(BODY_PARTS)):
-            heatMap = out[0, i, :, :]
-            _, conf, _, point = cv.minMaxLoc(heatMap)
-            x = (frameWidth * point[0]) / out.shape[3]
-            y = (frameHeight * point[1]) / out.shape[2]
-            points.append((int(x), int(y)) if conf > 0.2 else None)
+            for i in range(len(BODY_PARTS)):
+                if i >= out.shape[1]:
+                    points.append(None)  # a part-affinity channel the keypoint-only graph drops
+                    continue
+                heatMap = out[0, i, :, :]
+                _, conf, _, point = cv.minMaxLoc(heatMap)
+                x = (frameWidth * point[0]) / out.shape[3]
+                y = (frameHeight * point[1]) / out.shape[2]
+                points.append((int(x), int(y)) if conf > 0.2 else None)
 
         # Calculate the elbow and shoulder angles
         elbow_angle_ok = shoulder_angle_ok = False
+        angle_deg = shoulder_angle_deg = None
         if (
             points[BODY_PARTS["RShoulder"]] and points[BODY_PARTS["RElbow"]] and points[BODY_PARTS["RWrist"]]
         ):
@@ -171,7 +269,13 @@ def generate_frames():
             2,
         )
 
-        # Draw the body parts and connections
+        # Draw the other people in frame, then the tracked person's parts and connections
+        for person in people[1:] if tracked is not None else people:
+            for partFrom, partTo in POSE_PAIRS:
+                idFrom, idTo = BODY_PARTS[partFrom], BODY_PARTS[partTo]
+                if idFrom < NUM_PARTS and idTo < NUM_PARTS and person["points"][idFrom] and person["points"][idTo]:
+                    cv.line(frame, person["points"][idFrom], person["points"][idTo], (160, 160, 160), 2)
+
         for pair in POSE_PAIRS:
             partFrom, partTo = pair[0], pair[1]
             idFrom, idTo = BODY_PARTS[partFrom], BODY_PARTS[partTo]
@@ -181,16 +285,126 @@ def generate_frames():
                 cv.ellipse(frame, points[idFrom], (3, 3), 0, 0, 360, (0, 0, 255), cv.FILLED)
                 cv.ellipse(frame, points[idTo], (3, 3), 0, 0, 360, (0, 0, 255), cv.FILLED)
 
-        # Encode the frame as JPEG
-        ret, buffer = cv.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+        # Result for /keypoints: pixel positions (None where not detected), angles in degrees;
+        # in multi-person mode "people" has everyone found, the tracked person first (if found)
+        result = {
+            "frame_size": [frameWidth, frameHeight],
+            "keypoints": {name: points[i] for name, i in BODY_PARTS.items()},
+            "angles": {
+                "elbow": None if angle_deg is None else round(float(angle_deg), 1),
+                "shoulder": None if shoulder_angle_deg is None else round(float(shoulder_angle_deg), 1),
+            },
+            "form_ok": elbow_angle_ok and shoulder_angle_ok,
+            "score": current_score,
+        }
+        if MULTI_PERSON:
+            result["people"] = [
+                {"keypoints": dict(zip(BODY_PARTS, person["points"])), "score": person["score"],
+                 "tracked": tracked is not None and i == 0}
+                for i, person in enumerate(people)
+            ]
+
+        # Hand the annotated frame to the stream hub, which encodes it for each client tier
+        trace.mark("draw")
+        yield frame, trace, result
+
+
+hub = StreamHub(generate_frames)
 
-        # Yield the frame in the format required for video streaming
-        yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
 
 @app.route('/video-feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Each client gets the shared frames at its own quality, size and rate (see mjpeg_stream.TIERS).
+    return Response(hub.stream(request.environ.get("werkzeug.socket")),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+# Latest-result endpoints. They are served from the frame and result the stream hub already
+# has (starting its pipeline if no one is watching), never by running inference per request.
+# The ETag names the frame; send it back in If-None-Match with ?wait=SECONDS to hold the
+# request until a newer frame is published (long poll) or get 304 Not Modified.
+SERVER_RUN_ID = uuid.uuid4().hex[:8]  # keeps ETags from a previous run from matching
+MAX_LONG_POLL_SECONDS = 30.0
+
+
+def _etag(seq):
+    return f'"{SERVER_RUN_ID}-{seq}"'
+
+
+def _seen_seq():
+    """Frame number named by the request's If-None-Match ETag, or 0."""
+    tag = request.headers.get("If-None-Match", "").strip().removeprefix("W/").strip('"')
+    run_id, _, seq = tag.partition("-")
+    return int(seq) if run_id == SERVER_RUN_ID and seq.isdigit() else 0
+
+
+def _long_poll_seconds():
+    try:
+        return min(max(float(request.args.get("wait", 0)), 0.0), MAX_LONG_POLL_SECONDS)
+    except ValueError:
+        return 0.0
+
+
+def _not_modified(seq):
+    return Response(status=304, headers={"ETag": _etag(seq), "Cache-Control": "no-cache"})
+
+
+@app.route('/keypoints')
+def keypoints():
+    seen = _seen_seq()
+    seq, _, trace, result = hub.latest(seen, _long_poll_seconds())
+    if seq == 0:
+        return jsonify({"error": "No frame has been processed yet"}), 503
+    if seq == seen:
+        return _not_modified(seq)
+    response = jsonify(dict(result, seq=seq, captured_at=trace.captured_at))
+    response.headers["ETag"] = _etag(seq)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route('/snapshot')
+def snapshot():
+    seen = _seen_seq()
+    seq = hub.latest(seen, _long_poll_seconds())[0]
+    if seq == 0:
+        return jsonify({"error": "No frame has been processed yet"}), 503
+    if seq == seen:
+        return _not_modified(seq)
+    # The best tier's JPEG, shared with the stream clients on that tier (encoded here if there are none).
+    seq, jpeg, trace = hub.jpeg(0)
+    return Response(jpeg, mimetype="image/jpeg", headers={
+        "ETag": _etag(seq), "Cache-Control": "no-cache", "X-Capture-Timestamp": f"{trace.captured_at:.6f}",
+    })
+
+
+@app.route('/latency')
+def latency():
+    # Per-stage latency percentiles over recent frames (ms). Each /video-feed part carries
+    # X-Capture-Timestamp (epoch seconds) for the client's own display latency; "camera"
+    # has the capture latency measured when the camera was opened, which comes before it.
+    return jsonify({"stages": hub.stats.summary(), "camera": get_frame_source().settings})
 
 if __name__ == "__main__":
-    app.run(port=5001)  # Adjust port as needed
+    frame_source = get_frame_source()  # the environment's settings, as defaults for the options
+    parser = argparse.ArgumentParser(description="OpenPose MJPEG server (/video-feed)")
+    parser.add_argument("--source", default=frame_source.spec, help="Camera index or path, stream URL, "
+                        "image directory, video file or synthetic[:WxH[@FPS]] (OPENPOSE_SOURCE)")
+    parser.add_argument("--width", type=int, default=frame_source.width, help="Requested camera width")
+    parser.add_argument("--height", type=int, default=frame_source.height, help="Requested camera height")
+    parser.add_argument("--fps", type=int, default=frame_source.fps, help="Requested camera (or image directory) fps")
+    parser.add_argument("--buffer-size", type=int, default=frame_source.buffer_size, help="Camera driver buffer, in frames")
+    parser.add_argument("--capture-process", action="store_true", default=frame_source.capture_process)
+    parser.add_argument("--keypoint-only", action="store_true", default=KEYPOINT_ONLY,
+                        help="Load the graph trimmed to the heatmap outputs (OPENPOSE_KEYPOINT_ONLY)")
+    parser.add_argument("--multi-person", action="store_true", default=MULTI_PERSON,
+                        help="Decode everyone in frame and track the best-scoring person (OPENPOSE_MULTI_PERSON)")
+    parser.add_argument("--port", type=int, default=PORT)  # Adjust port as needed (OPENPOSE_PORT)
+    args = parser.parse_args()
+    if args.keypoint_only and args.multi_person:
+        parser.error("--multi-person needs the part-affinity fields, which --keypoint-only removes")
+    MULTI_PERSON = args.multi_person
+    KEYPOINT_ONLY = args.keypoint_only
+    get_net()  # load the model before serving
+    frame_source = FrameSource(args.source, args.width, args.height, args.fps, args.buffer_size, args.capture_process)
+    app.run(port=args.port)
@@ -0,0 +1,273 @@
+import argparse
+import time
+import numpy as np
+
+
+# ---------- COCO Layout ----------
+# Output channels of the MobileNet OpenPose graph: 18 part heatmaps and the background
+# (0-18), then 19 part-affinity fields as x/y channel pairs (19-56). COCO_PAIRS are the
+# limbs in the order skeletons are assembled (outwards from the neck) and PAF_CHANNELS
+# the (x, y) field channels of each limb, counted from PAF_OFFSET.
+
+NUM_PARTS = 18
+PAF_OFFSET = 19
+COCO_PAIRS = [
+    (1, 2), (1, 5), (2, 3), (3, 4), (5, 6), (6, 7), (1, 8), (8, 9), (9, 10), (1, 11),
+    (11, 12), (12, 13), (1, 0), (0, 14), (14, 16), (0, 15), (15, 17), (2, 16), (5, 17),
+]
+PAF_CHANNELS = np.array([
+    (12, 13), (20, 21), (14, 15), (16, 17), (22, 23), (24, 25), (0, 1), (2, 3), (4, 5), (6, 7),
+    (8, 9), (10, 11), (28, 29), (30, 31), (34, 35), (32, 33), (36, 37), (18, 19), (26, 27),
+])
+
+PEAK_THRESHOLD = 0.1  # minimum heatmap value of a part candidate
+PAF_SAMPLES = 10  # points sampled along each candidate limb
+PAF_THRESHOLD = 0.05  # minimum field alignment at a sample
+MIN_ALIGNED_FRACTION = 0.8  # share of samples that must reach PAF_THRESHOLD
+MIN_PARTS = 3
+MIN_MEAN_SCORE = 0.4  # person score per part
+
+
+# ---------- Decoding ----------
+
+def find_peaks(heatmaps, threshold=PEAK_THRESHOLD):
+    """
+    Part candidates: local maxima (3x3 non-maximum suppression) of each heatmap above
+    threshold, for all parts at once. Returns (part, y, x, score) arrays ordered by part.
+    """
+    padded = np.pad(heatmaps, ((0, 0), (1, 1), (1, 1)), constant_values=-np.inf)
+    height, width = heatmaps.shape[1:]
+    neighbourhood = np.maximum.reduce([padded[:, dy:dy + height, dx:dx + width]
+                                       for dy in range(3) for dx in range(3)])
+    part, y, x = np.nonzero((heatmaps >= neighbourhood) & (heatmaps > threshold))
+    return part, y, x, heatmaps[part, y, x]
+
+
+def score_limbs(peaks, pafs):
+    """
+    Every candidate limb (each pair of candidates for the two parts of each limb) scored
+    with the part-affinity line integral, in one vectorized pass: the mean alignment of the
+    field with the limb direction over PAF_SAMPLES points, penalised for limbs longer than
+    half the map. Returns (limb, a, b, score) of the candidates that pass, where a and b
+    index into the peak arrays.
+    """
+    part, y, x, _ = peaks
+    by_part = [np.flatnonzero(part == p) for p in range(NUM_PARTS)]
+    limbs, starts, ends = [], [], []
+    for limb, (part_a, part_b) in enumerate(COCO_PAIRS):
+        a, b = np.meshgrid(by_part[part_a], by_part[part_b], indexing="ij")
+        limbs.append(np.full(a.size, limb))
+        starts.append(a.ravel())
+        ends.append(b.ravel())
+    limb, a, b = np.concatenate(limbs), np.concatenate(starts), np.concatenate(ends)
+    if not len(limb):
+        return limb, a, b, np.zeros(0)
+
+    height, width = pafs.shape[1:]
+    start = np.stack([x[a], y[a]], axis=1).astype(np.float32)
+    vector = np.stack([x[b], y[b]], axis=1).astype(np.float32) - start
+    length = np.linalg.norm(vector, axis=1)
+    unit = vector / np.maximum(length, 1e-6)[:, None]
+
+    steps = np.linspace(0.0, 1.0, PAF_SAMPLES, dtype=np.float32)
+    samples = start[:, None, :] + steps[None, :, None] * vector[:, None, :]  # (candidates, samples, xy)
+    sx = np.clip(np.rint(samples[..., 0]).astype(np.intp), 0, width - 1)
+    sy = np.clip(np.rint(samples[..., 1]).astype(np.intp), 0, height - 1)
+    channels = PAF_CHANNELS[limb]
+    field_x = pafs[channels[:, 0, None], sy, sx]
+    field_y = pafs[channels[:, 1, None], sy, sx]
+    alignment = field_x * unit[:, 0, None] + field_y * unit[:, 1, None]
+
+    score = alignment.mean(axis=1) + np.minimum(0.5 * height / np.maximum(length, 1.0) - 1.0, 0.0)
+    passed = ((alignment > PAF_THRESHOLD).mean(axis=1) >= MIN_ALIGNED_FRACTION) & (score > 0) & (length > 0)
+    return limb[passed], a[passed], b[passed], score[passed]
+
+
+def assemble_people(peaks, limbs):
+    """
+    Greedy assembly: per limb, candidates are taken best first as long as neither end is
+    already used by that limb; limbs are processed outwards from the neck and joined into
+    skeletons through their shared parts. Returns [(peak index per part or -1, score)].
+    """
+    scores = peaks[3]
+    limb, a, b, score = limbs
+    order = np.lexsort((-score, limb))
+    people = []  # [peak index per part, score, live]
+    owner = {}  # peak index -> person
+    used = set()
+    for i in order:
+        k, pa, pb = int(limb[i]), int(a[i]), int(b[i])
+        if (k, "a", pa) in used or (k, "b", pb) in used:
+            continue
+        used.add((k, "a", pa))
+        used.add((k, "b", pb))
+        part_a, part_b = COCO_PAIRS[k]
+        ha, hb = owner.get(pa), owner.get(pb)
+        if ha is None and hb is None:
+            person = np.full(NUM_PARTS, -1)
+            person[part_a], person[part_b] = pa, pb
+            owner[pa] = owner[pb] = len(people)
+            people.append([person, scores[pa] + scores[pb] + score[i], True])
+        elif hb is None:
+            if people[ha][0][part_b] == -1:
+                people[ha][0][part_b] = pb
+                people[ha][1] += scores[pb] + score[i]
+                owner[pb] = ha
+        elif ha is None:
+            if people[hb][0][part_a] == -1:
+                people[hb][0][part_a] = pa
+                people[hb][1] += scores[pa] + score[i]
+                owner[pa] = hb
+        elif ha != hb:
+            first, second = people[ha], people[hb]
+            if not np.any((first[0] >= 0) & (second[0] >= 0)):
+                # Two partial skeletons joined by this limb: merge the second into the first.
+                taken = second[0] >= 0
+                first[0][taken] = second[0][taken]
+                first[1] += second[1] + score[i]
+                second[2] = False
+                for peak in second[0][taken]:
+                    owner[int(peak)] = ha
+        else:
+            people[ha][1] += score[i]
+    result = []
+    for person, total, live in people:
+        parts = int((person >= 0).sum())
+        if live and parts >= MIN_PARTS and total / parts >= MIN_MEAN_SCORE:
+            result.append((person, float(total)))
+    return sorted(result, key=lambda item: -item[1])
+
+
+def decode_people(out, frame_width, frame_height):
+    """
+    Skeletons of everyone in frame from the network output (1, 57, H, W), highest score
+    first. Each is {"points": [(x, y) in frame pixels, or None] for the 18 COCO parts, "score"}.
+    """
+    heatmaps = out[0, :NUM_PARTS]
+    pafs = out[0, PAF_OFFSET:PAF_OFFSET + 2 * len(COCO_PAIRS)]
+    peaks = find_peaks(heatmaps)
+    people = assemble_people(peaks, score_limbs(peaks, pafs))
+    _, y, x, _ = peaks
+    sx, sy = frame_width / out.shape[3], frame_height / out.shape[2]
+    return [
+        {
+            "points": [(int(x[i] * sx), int(y[i] * sy)) if i >= 0 else None for i in person],
+            "score": round(score, 3),
+        }
+        for person, score in people
+    ]
+
+
+# ---------- Tracking ----------
+
+TORSO_PARTS = (2, 5, 8, 11)  # shoulders and hips
+
+
+def _anchor(points):
+    """Neck position, else the centre of the detected shoulders and hips, else None."""
+    if points[1] is not None:
+        return np.array(points[1], dtype=np.float32)
+    torso = [points[i] for i in TORSO_PARTS if points[i] is not None]
+    return np.mean(torso, axis=0) if torso else None
+
+
+class PersonTracker:
+    """
+    Follows one person from frame to frame: update() picks the skeleton whose anchor (neck,
+    else torso centre) is nearest the tracked person's last one, within max_distance (a
+    fraction of the larger frame side). The highest-scoring skeleton is picked only when
+    nobody is tracked yet or the tracked person has gone unmatched for more than `patience`
+    frames; until then update() returns None, so a missed detection does not hand the
+    tracking to someone else in view.
+    """
+
+    def __init__(self, max_distance=0.15, patience=15):
+        self.max_distance = max_distance
+        self.patience = patience
+        self.anchor = None
+        self.missed = 0
+
+    def update(self, people, frame_width, frame_height):
+        """Index into people (as returned by decode_people) of the tracked person, or None."""
+        best = None
+        if self.anchor is not None:
+            limit = self.max_distance * max(frame_width, frame_height)
+            for i, person in enumerate(people):
+                anchor = _anchor(person["points"])
+                if anchor is None:
+                    continue
+                distance = float(np.linalg.norm(anchor - self.anchor))
+                if distance <= limit and (best is None or distance < best[1]):
+                    best = (i, distance)
+        if best is None and (self.anchor is None or self.missed >= self.patience):
+            best = next(((i, 0.0) for i, person in enumerate(people) if _anchor(person["points"]) is not None), None)
+        if best is None:
+            self.missed += 1
+            return None
+        self.anchor = _anchor(people[best[0]]["points"])
+        self.missed = 0
+        return best[0]
+
+
+# ---------- Benchmark ----------
+# Times decode_people on a synthetic output, without the model:
+#   python paf_decoding.py --people 3
+#   python paf_decoding.py --people 3 --map-size 368  # maps upsampled to the input size
+
+# Parts of an upright person facing the camera, as (x, y) cells of a 46x46 map.
+_TEMPLATE = [(10, 5), (10, 9), (7, 9), (6, 14), (6, 19), (13, 9), (14, 14), (14, 19), (8, 20),
+             (8, 28), (8, 36), (12, 20), (12, 28), (12, 36), (9, 4), (11, 4), (8, 4), (12, 4)]
+
+
+def synthetic_output(offsets, amplitudes=None, map_size=46):
+    """
+    Network-shaped output (1, 57, map_size, map_size) with a person at each x offset (in
+    46x46 map cells, scaled with map_size): Gaussian part peaks of the given amplitudes
+    (default 1) and unit part-affinity fields along each limb.
+    """
+    scale = map_size / 46.0
+    out = np.zeros((1, PAF_OFFSET + 2 * len(COCO_PAIRS), map_size, map_size), np.float32)
+    yy, xx = np.mgrid[:map_size, :map_size].astype(np.float32)
+    for offset, amplitude in zip(offsets, amplitudes or [1.0] * len(offsets)):
+        parts = [((x + offset) * scale, y * scale) for x, y in _TEMPLATE]
+        for part, (x, y) in enumerate(parts):
+            peak = amplitude * np.exp(-((xx - x) ** 2 + (yy - y) ** 2) / (2 * scale ** 2))
+            np.maximum(out[0, part], peak, out=out[0, part])
+        for limb, (part_a, part_b) in enumerate(COCO_PAIRS):
+            (xa, ya), (xb, yb) = parts[part_a], parts[part_b]
+            length = np.hypot(xb - xa, yb - ya)
+            ux, uy = (xb - xa) / length, (yb - ya) / length
+            along = (xx - xa) * ux + (yy - ya) * uy
+            across = np.abs((xx - xa) * uy - (yy - ya) * ux)
+            on_limb = (along >= -scale) & (along <= length + scale) & (across <= 1.5 * scale)
+            channel_x, channel_y = PAF_CHANNELS[limb] + PAF_OFFSET
+            out[0, channel_x][on_limb] = ux
+            out[0, channel_y][on_limb] = uy
+    return out
+
+
+def benchmark(people=3, map_size=46, frame_size=368, runs=200):
+    """Mean decode_people time in ms for `people` side by side; returns (ms, people decoded)."""
+    spacing = 30 // max(people - 1, 1)  # the template is 8 cells wide
+    out = synthetic_output([i * spacing for i in range(people)], map_size=map_size)
+    found = len(decode_people(out, frame_size, frame_size))
+    start = time.perf_counter()
+    for _ in range(runs):
+        decode_people(out, frame_size, frame_size)
+    return (time.perf_counter() - start) / runs * 1000, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time multi-person decoding on a synthetic network output")
+    parser.add_argument("--people", type=int, default=3)
+    parser.add_argument("--map-size", type=int, default=46, help="Output map side (46 for a 368x368 input)")
+    parser.add_argument("--frame-size", type=int, default=368)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    ms, found = benchmark(args.people, args.map_size, args.frame_size, args.runs)
+    print(f"decode_people: {ms:.2f} ms per frame ({found} of {args.people} people on "
+          f"{args.map_size}x{args.map_size} maps, {args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
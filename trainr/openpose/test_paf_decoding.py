@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+from paf_decoding import NUM_PARTS, PersonTracker, _TEMPLATE, benchmark, decode_people, synthetic_output
+
+FRAME = 368
+CELL = FRAME // 46  # frame pixels per map cell
+
+
+def _expected_points(offset):
+    return [((x + offset) * CELL, y * CELL) for x, y in _TEMPLATE]
+
+
+def _neck_x(person):
+    return person["points"][1][0]
+
+
+class DecodePeopleTest(unittest.TestCase):
+    def test_two_people_side_by_side(self):
+        people = decode_people(synthetic_output([0, 22]), FRAME, FRAME)
+        self.assertEqual(len(people), 2)
+        decoded = sorted(people, key=_neck_x)
+        for person, offset in zip(decoded, (0, 22)):
+            self.assertEqual(person["points"], _expected_points(offset))
+
+    def test_higher_score_first(self):
+        people = decode_people(synthetic_output([0, 22], [0.6, 1.0]), FRAME, FRAME)
+        self.assertEqual([_neck_x(person) for person in people], [32 * CELL, 10 * CELL])
+        self.assertGreater(people[0]["score"], people[1]["score"])
+
+    def test_nobody_in_frame(self):
+        out = np.zeros((1, 57, 46, 46), np.float32)
+        self.assertEqual(decode_people(out, FRAME, FRAME), [])
+
+    def test_limbs_do_not_join_people(self):
+        # Peaks without part-affinity fields between them are not assembled into anyone.
+        out = synthetic_output([0, 22])
+        out[0, NUM_PARTS + 1:] = 0
+        self.assertEqual(decode_people(out, FRAME, FRAME), [])
+
+    def test_benchmark_runs(self):
+        ms, found = benchmark(people=3, runs=2)
+        self.assertEqual(found, 3)
+        self.assertGreater(ms, 0)
+
+
+class PersonTrackerTest(unittest.TestCase):
+    def _frame(self, offsets, amplitudes=None):
+        return decode_people(synthetic_output(offsets, amplitudes), FRAME, FRAME)
+
+    def test_keeps_the_first_person_when_someone_else_scores_higher(self):
+        tracker = PersonTracker()
+        people = self._frame([0, 22], [1.0, 0.6])
+        self.assertEqual(_neck_x(people[tracker.update(people, FRAME, FRAME)]), 10 * CELL)
+        for _ in range(3):
+            people = self._frame([0, 22], [0.6, 1.0])
+            self.assertEqual(_neck_x(people[0]), 32 * CELL)  # the other person now scores higher
+            self.assertEqual(_neck_x(people[tracker.update(people, FRAME, FRAME)]), 10 * CELL)
+
+    def test_waits_for_a_lost_person_before_switching(self):
+        tracker = PersonTracker(patience=5)
+        people = self._frame([0, 22], [1.0, 0.6])
+        tracker.update(people, FRAME, FRAME)
+        alone = self._frame([22])
+        for _ in range(5):
+            self.assertIsNone(tracker.update(alone, FRAME, FRAME))
+        self.assertEqual(_neck_x(alone[tracker.update(alone, FRAME, FRAME)]), 32 * CELL)
+        # Now following the second person, who stays tracked when the first comes back.
+        people = self._frame([0, 22], [1.0, 0.6])
+        self.assertEqual(_neck_x(people[tracker.update(people, FRAME, FRAME)]), 32 * CELL)
+
+    def test_follows_a_moving_person(self):
+        tracker = PersonTracker()
+        people = self._frame([0, 30], [1.0, 0.6])
+        self.assertEqual(_neck_x(people[tracker.update(people, FRAME, FRAME)]), 10 * CELL)
+        for step in range(1, 6):
+            people = self._frame([step, 30], [0.6, 1.0])
+            self.assertEqual(_neck_x(people[tracker.update(people, FRAME, FRAME)]), (10 + step) * CELL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,441 @@
+"""
+Trims the OpenPose graph to the channels generate_frames() reads.
+
+graph_opt.pb ends in one concat of the heatmap branch (keypoint confidence maps) and the
+part-affinity branch (limb direction fields). The server only reads keypoints from the
+first channels, yet net.forward() computes the whole concat. This step rewrites the
+concat to keep only the first CHANNELS (by default the HEATMAP_CHANNELS: 18 keypoints and
+the background) and drops every node that no longer feeds it. A branch that is only partly needed keeps its last
+convolution, cut down to the needed output channels. Earlier stages are untouched
+(every stage feeds both branches into the next one), so the remaining outputs are
+bit-for-bit the same.
+
+    python trim_graph.py                       # writes graph_opt.channels19.pb beside the model
+    python trim_graph.py --channels 22         # also keep the 3 PAF channels openpose.py draws as a back line
+    python trim_graph.py --benchmark --input workout.mp4
+
+The server loads the trimmed graph (building it on first use) with --keypoint-only or
+OPENPOSE_KEYPOINT_ONLY=1. The GraphDef is edited at the protobuf wire level, so neither
+TensorFlow nor generated protobuf classes are needed.
+"""
+import argparse
+import os
+import time
+import cv2 as cv
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL = os.path.join(HERE, "graph_opt.pb")
+# Ops that keep channel c in channel c; their constant operands are per channel or scalar.
+CHANNELWISE_OPS = ("BiasAdd", "Relu", "Relu6", "Identity", "FusedBatchNorm", "FusedBatchNormV3",
+                   "Add", "AddV2", "Mul", "Sub")
+DT_FLOAT = 1
+HEATMAP_CHANNELS = 19  # the heatmap branch of graph_opt.pb; part-affinity fields follow it
+
+
+# ---------- Protobuf Wire Format ----------
+# A message is kept as a list of (field number, wire type, value): varints as ints,
+# length-delimited fields as bytes (nested messages stay serialized until needed),
+# fixed-width fields as their raw bytes. Unknown fields survive a round trip unchanged.
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _varint(value):
+    value &= (1 << 64) - 1
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def parse_fields(data):
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire == 2:
+            size, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + size], pos + size
+        elif wire == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        fields.append((field, wire, value))
+    return fields
+
+
+def serialize_fields(fields):
+    out = bytearray()
+    for field, wire, value in fields:
+        out += _varint(field << 3 | wire)
+        if wire == 0:
+            out += _varint(value)
+        elif wire == 2:
+            out += _varint(len(value))
+            out += value
+        else:
+            out += value
+    return bytes(out)
+
+
+def _field(fields, number, default=None):
+    return next((value for field, _, value in fields if field == number), default)
+
+
+# ---------- GraphDef ----------
+
+class Node:
+    """A NodeDef: name, op, inputs and attrs (name -> serialized AttrValue); other fields kept as they are."""
+
+    def __init__(self, data):
+        self.inputs = []
+        self.attrs = {}
+        self.other = []
+        for field, wire, value in parse_fields(data):
+            if field == 1:
+                self.name = value.decode()
+            elif field == 2:
+                self.op = value.decode()
+            elif field == 3:
+                self.inputs.append(value.decode())
+            elif field == 5:
+                entry = parse_fields(value)
+                self.attrs[_field(entry, 1).decode()] = _field(entry, 2, b"")
+            else:
+                self.other.append((field, wire, value))
+
+    def serialize(self):
+        fields = [(1, 2, self.name.encode()), (2, 2, self.op.encode())]
+        fields += [(3, 2, name.encode()) for name in self.inputs]
+        fields += self.other
+        fields += [(5, 2, serialize_fields([(1, 2, key.encode()), (2, 2, value)])) for key, value in self.attrs.items()]
+        return serialize_fields(fields)
+
+
+def _node_name(input_name):
+    """NodeDef name behind an input reference ("^ctrl", "name:1")."""
+    return input_name.lstrip("^").split(":")[0]
+
+
+def read_graph(path):
+    with open(path, "rb") as f:
+        fields = parse_fields(f.read())
+    nodes = [Node(value) for field, _, value in fields if field == 1]
+    other = [item for item in fields if item[0] != 1]
+    return nodes, other
+
+
+def write_graph(path, nodes, other):
+    data = serialize_fields([(1, 2, node.serialize()) for node in nodes] + other)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# ---------- Tensors ----------
+
+def read_tensor(attr_value):
+    """(array, TensorProto fields) of a float Const's "value" attr."""
+    tensor = parse_fields(_field(parse_fields(attr_value), 8))
+    if _field(tensor, 1) != DT_FLOAT:
+        raise ValueError("Only float constants can be trimmed")
+    shape = [_field(parse_fields(dim), 1, 0) for field, _, dim in parse_fields(_field(tensor, 2, b"")) if field == 2]
+    content = _field(tensor, 4)
+    if content is not None:
+        values = np.frombuffer(content, np.float32)
+    else:
+        # float_val, packed or one field per value
+        values = np.concatenate([np.frombuffer(value, np.float32) for field, _, value in tensor if field == 5] or
+                                [np.zeros(0, np.float32)])
+    if values.size == 1 and int(np.prod(shape)) > 1:
+        values = np.full(shape, values[0], np.float32)  # a single value fills the tensor
+    return values.reshape(shape), tensor
+
+
+def tensor_attr(array):
+    """Serialized AttrValue holding `array` as a float TensorProto."""
+    array = np.ascontiguousarray(array, np.float32)
+    shape = serialize_fields([(2, 2, serialize_fields([(1, 0, int(size))])) for size in array.shape])
+    tensor = serialize_fields([(1, 0, DT_FLOAT), (2, 2, shape), (4, 2, array.tobytes())])
+    return serialize_fields([(8, 2, tensor)])
+
+
+# ---------- Trimming ----------
+
+def _resolve_const(nodes_by_name, input_name):
+    node = nodes_by_name[_node_name(input_name)]
+    while node.op == "Identity":
+        node = nodes_by_name[_node_name(node.inputs[0])]
+    if node.op != "Const":
+        raise ValueError(f"{node.name} is not a constant")
+    return node
+
+
+def _is_const(nodes_by_name, input_name):
+    try:
+        _resolve_const(nodes_by_name, input_name)
+    except ValueError:
+        return False
+    return True
+
+
+def _branch(nodes_by_name, input_name):
+    """
+    The Conv2D at the end of a concat input and the channelwise nodes between them, as
+    (conv, [nodes from the conv towards the concat]). The conv's filter gives the branch's channels.
+    """
+    chain = []
+    node = nodes_by_name[_node_name(input_name)]
+    while node.op in CHANNELWISE_OPS:
+        chain.append(node)
+        data = [name for name in node.inputs if not name.startswith("^") and not _is_const(nodes_by_name, name)]
+        if len(data) != 1:
+            raise ValueError(f"{node.name} combines several tensors, cannot follow its channels")
+        node = nodes_by_name[_node_name(data[0])]
+    if node.op != "Conv2D":
+        raise ValueError(f"Cannot tell how many channels {input_name} has (it ends in {node.op}, not Conv2D)")
+    return node, chain[::-1]
+
+
+def find_output(nodes):
+    """The graph's output concat: the ConcatV2 that no other node consumes."""
+    consumed = {_node_name(name) for node in nodes for name in node.inputs}
+    outputs = [node for node in nodes if node.op == "ConcatV2" and node.name not in consumed]
+    if len(outputs) != 1:
+        raise ValueError(f"Expected one output concat, found {[node.name for node in outputs]}")
+    return outputs[0]
+
+
+def branch_channels(nodes, output=None):
+    """Channel count of each input of the output concat, in order (the first is the heatmap branch)."""
+    nodes_by_name = {node.name: node for node in nodes}
+    output = output or find_output(nodes)
+    counts = []
+    for name in output.inputs[:-1]:  # the last input is the concat axis
+        conv, _ = _branch(nodes_by_name, name)
+        filter_const = _resolve_const(nodes_by_name, conv.inputs[1])
+        counts.append(read_tensor(filter_const.attrs["value"])[0].shape[3])
+    return counts
+
+
+def trim_graph(nodes, channels=None):
+    """
+    Nodes of a graph whose output keeps only the first `channels` channels of the output
+    concat (default: all of its first input, the heatmaps). Returns (nodes, channels kept).
+    """
+    nodes_by_name = {node.name: node for node in nodes}
+    output = find_output(nodes)
+    counts = branch_channels(nodes, output)
+    if channels is None:
+        channels = counts[0]
+    if not 0 < channels <= sum(counts):
+        raise ValueError(f"Cannot keep {channels} of {sum(counts)} channels")
+
+    kept, start = [], 0
+    for name, count in zip(output.inputs[:-1], counts):
+        if start >= channels:
+            break
+        needed = min(count, channels - start)
+        if needed < count:
+            _slice_branch(nodes, nodes_by_name, name, needed)
+        kept.append(name)
+        start += count
+
+    if len(kept) == 1:
+        output.op = "Identity"  # ConcatV2 needs at least two inputs
+        output.inputs = kept
+        output.attrs = {"T": output.attrs["T"]}
+    else:
+        output.inputs = kept + [output.inputs[-1]]
+        output.attrs["N"] = serialize_fields([(3, 0, len(kept))])
+        output.attrs.pop("_output_shapes", None)
+
+    # Keep what the output still depends on, in the original (topological) order.
+    needed_names, stack = set(), [output.name]
+    while stack:
+        name = stack.pop()
+        if name in needed_names:
+            continue
+        needed_names.add(name)
+        stack.extend(_node_name(i) for i in nodes_by_name[name].inputs)
+    return [node for node in nodes if node.name in needed_names], channels
+
+
+def _slice_branch(nodes, nodes_by_name, input_name, needed):
+    """Cuts a concat input down to its first `needed` channels by slicing its last convolution."""
+    conv, chain = _branch(nodes_by_name, input_name)
+    consumers = {}
+    for node in nodes:
+        for name in node.inputs:
+            consumers[_node_name(name)] = consumers.get(_node_name(name), 0) + 1
+    for node in [conv] + chain:
+        if consumers.get(node.name, 0) > 1:
+            raise ValueError(f"{node.name} is shared with other outputs and cannot be sliced")
+        node.attrs.pop("_output_shapes", None)  # stale after slicing
+    filter_const = _resolve_const(nodes_by_name, conv.inputs[1])
+    weights, _ = read_tensor(filter_const.attrs["value"])
+    count = weights.shape[3]
+    filter_const.attrs["value"] = tensor_attr(weights[..., :needed])
+    filter_const.attrs.pop("_output_shapes", None)
+    # Per-channel operands (biases, batch norm parameters) are cut to match; scalars stay.
+    for node in chain:
+        for name in node.inputs:
+            if name.startswith("^") or not _is_const(nodes_by_name, name):
+                continue
+            const = _resolve_const(nodes_by_name, name)
+            if consumers.get(const.name, 0) > 1:
+                raise ValueError(f"{const.name} is shared with other nodes and cannot be sliced")
+            values, _ = read_tensor(const.attrs["value"])
+            if values.ndim and values.shape[-1] == count:
+                const.attrs["value"] = tensor_attr(values[..., :needed])
+                const.attrs.pop("_output_shapes", None)
+
+
+def trimmed_path(model_path, channels=HEATMAP_CHANNELS):
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.channels{channels}{ext}"
+
+
+def ensure_trimmed(model_path=DEFAULT_MODEL, channels=HEATMAP_CHANNELS):
+    """Path of the trimmed graph beside model_path, (re)building it if missing or older than the model."""
+    path = trimmed_path(model_path, channels)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path):
+        nodes, other = read_graph(model_path)
+        nodes, _ = trim_graph(nodes, channels)
+        write_graph(path, nodes, other)
+    return path
+
+
+# ---------- Benchmark ----------
+
+def _benchmark_frames(input_path, count):
+    if input_path is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+    if os.path.isdir(input_path):
+        names = sorted(os.listdir(input_path))
+        frames = [cv.imread(os.path.join(input_path, name)) for name in names]
+        return [frame for frame in frames if frame is not None][:count]
+    cap = cv.VideoCapture(input_path)
+    step = max(1, int(cap.get(cv.CAP_PROP_FRAME_COUNT) or count) // count)
+    frames = []
+    while len(frames) < count:
+        cap.set(cv.CAP_PROP_POS_FRAMES, len(frames) * step)
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def keypoints(out, width, height, threshold=0.2):
+    """Global-maximum keypoint per channel, as generate_frames() computes them."""
+    points = []
+    for i in range(out.shape[1]):
+        _, conf, _, point = cv.minMaxLoc(out[0, i])
+        x = (width * point[0]) / out.shape[3]
+        y = (height * point[1]) / out.shape[2]
+        points.append((int(x), int(y)) if conf > threshold else None)
+    return points
+
+
+def benchmark(model_path, trimmed, input_path=None, count=20, runs=3, read_channels=HEATMAP_CHANNELS):
+    """
+    Forward-pass time of both graphs on the same frames, and whether the keypoints the
+    server reads (the first read_channels) agree. A part the trimmed graph no longer outputs
+    counts as a mismatch on every frame where the full graph detects it.
+    """
+    full_net = cv.dnn.readNetFromTensorflow(model_path)
+    trimmed_net = cv.dnn.readNetFromTensorflow(trimmed)
+    frames = _benchmark_frames(input_path, count)
+    if not frames:
+        raise ValueError(f"No frames in {input_path}")
+    times = {"full": [], "trimmed": []}
+    mismatches = max_diff = channels = 0
+    for frame in frames:
+        blob = cv.dnn.blobFromImage(frame, 1.0, (368, 368), (127.5, 127.5, 127.5), swapRB=True, crop=False)
+        outs = {}
+        for name, net in (("full", full_net), ("trimmed", trimmed_net)):
+            net.setInput(blob)
+            net.forward()  # warm-up (first run allocates)
+            start = time.perf_counter()
+            for _ in range(runs):
+                net.setInput(blob)
+                outs[name] = net.forward()
+            times[name].append((time.perf_counter() - start) / runs)
+        channels = outs["trimmed"].shape[1]
+        max_diff = max(max_diff, float(np.abs(outs["full"][:, :channels] - outs["trimmed"]).max()))
+        w, h = frame.shape[1], frame.shape[0]
+        read = min(read_channels, outs["full"].shape[1])
+        expected = keypoints(outs["full"][:, :read], w, h)
+        found = keypoints(outs["trimmed"][:, :read], w, h)
+        found += [None] * (read - len(found))  # parts the trimmed graph does not output
+        mismatches += sum(a != b for a, b in zip(expected, found))
+    full_ms = 1000.0 * float(np.median(times["full"]))
+    trimmed_ms = 1000.0 * float(np.median(times["trimmed"]))
+    return {
+        "frames": len(frames),
+        "channels": [outs["full"].shape[1], channels],
+        "dropped_read_channels": max(0, min(read_channels, outs["full"].shape[1]) - channels),
+        "full_ms": round(full_ms, 2),
+        "trimmed_ms": round(trimmed_ms, 2),
+        "saving_percent": round(100.0 * (1.0 - trimmed_ms / full_ms), 1),
+        "max_abs_diff": max_diff,
+        "keypoint_mismatches": mismatches,
+    }
+
+
+# ---------- Command Line ----------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--channels", type=int, default=HEATMAP_CHANNELS,
+                        help=f"Output channels to keep (default: the {HEATMAP_CHANNELS} heatmaps)")
+    parser.add_argument("--read-channels", type=int, default=HEATMAP_CHANNELS,
+                        help="Channels whose keypoints the benchmark compares")
+    parser.add_argument("--benchmark", action="store_true", help="Compare the full and trimmed graphs")
+    parser.add_argument("--input", help="Video or image directory for the benchmark (default: random frames)")
+    parser.add_argument("--frames", type=int, default=20)
+    args = parser.parse_args()
+
+    nodes, _ = read_graph(args.model)
+    counts = branch_channels(nodes)
+    path = ensure_trimmed(args.model, args.channels)
+    trimmed_nodes, _ = read_graph(path)
+    print(f"{args.model}: {len(nodes)} nodes, output branches of {counts} channels")
+    print(f"{path}: {len(trimmed_nodes)} nodes, {args.channels} channels")
+    if args.benchmark:
+        result = benchmark(args.model, path, args.input, args.frames, read_channels=args.read_channels)
+        print(f"Forward pass: {result['full_ms']} ms full, {result['trimmed_ms']} ms trimmed "
+              f"({result['saving_percent']}% saved) over {result['frames']} frames")
+        print(f"Kept channels: max abs difference {result['max_abs_diff']:.3g}, "
+              f"{result['keypoint_mismatches']} keypoint mismatches")
+        if result["dropped_read_channels"]:
+            print(f"Warning: {result['dropped_read_channels']} of the compared channels are not in the "
+                  f"trimmed graph; the server reports those parts as not detected")
+
+
+if __name__ == "__main__":
+    main()